@@ -0,0 +1,14 @@
+"""
+Admin Benchmarks
+Measures the admin server and translator on synthetic data of any size.
+
+    cd admin
+    python -m bench                          # run everything, write bench-results.json
+    python -m bench --baseline base.json     # ...and compare against a saved run
+    python -m bench.generate --out /tmp/big --days 7 --exercises 40
+
+- generate.py: builds routines and diets at a configurable scale
+- micro.py:    load_json, save_json, translate_text, translate_structure
+- load.py:     requests through Flask's test client, per endpoint
+- timing.py:   latency statistics and baseline comparison
+"""
@@ -0,0 +1,104 @@
+"""
+Run the benchmark suite: python -m bench [options]
+
+Generates a dataset in a temporary directory, points the server at it,
+runs the micro-benchmarks and the load driver, and writes the results as
+JSON. With --baseline, a benchmark whose p50 is more than --threshold
+slower than the baseline's is reported as a regression (exit status 1).
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench', description="Benchmark the admin server.")
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--blocks', type=int, default=5)
+    parser.add_argument('--exercises', type=int, default=8)
+    parser.add_argument('--meals', type=int, default=5)
+    parser.add_argument('--foods', type=int, default=4)
+    parser.add_argument('--unknown', type=float, default=0.1, help="share of unknown vocabulary (0-1)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=200, help="runs per micro-benchmark")
+    parser.add_argument('--requests', type=int, default=200, help="requests per endpoint")
+    parser.add_argument('--threads', type=int, default=1, help="concurrent clients per endpoint")
+    parser.add_argument('--storage', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--out', type=Path, default=Path('bench-results.json'))
+    parser.add_argument('--baseline', type=Path, help="results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='fitness-bench-'))
+    try:
+        # The server reads its configuration at import time
+        os.environ.update({
+            'FITNESS_DATA_DIR': str(workdir / 'data'),
+            'FITNESS_DB_PATH': str(workdir / 'bench.sqlite3'),
+            'FITNESS_STORAGE': args.storage,
+            'FITNESS_TM_PATH': '',
+            'FITNESS_FSYNC': '0',
+            'FITNESS_BUILD_STATIC': '0',
+        })
+
+        import translator
+        from bench import generate, load, micro
+        from bench.timing import compare
+
+        # A local backend, so fallback cost is measured without network calls or log noise
+        translator.set_backend(translator.DeterministicBackend())
+        documents = generate.generate(args.days, args.blocks, args.exercises, args.meals,
+                                      args.foods, args.unknown, args.seed)
+        generate.write_dataset(workdir / 'data', documents)
+
+        import server
+
+        print(f"Benchmarking on {args.days} day(s), {args.blocks}x{args.exercises} exercises, "
+              f"{args.meals}x{args.foods} foods, {args.unknown:.0%} unknown vocabulary")
+        results = micro.run(server, documents, args.repeat)
+        if not args.skip_load:
+            results.update(load.run(server, documents, args.requests, args.threads))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'benchmark':<42}{'p50 ms':>10}{'p99 ms':>10}{'ops/s':>12}")
+    for name, stats in results.items():
+        print(f"{name:<42}{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats['ops_per_sec']:>12.1f}")
+
+    report = {
+        "meta": {
+            "time": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "results": results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResults written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.threshold)
+        regressions = [row for row in rows if row[4]]
+        print(f"\nCompared with {args.baseline} (threshold {args.threshold:.0%}):")
+        for name, base, current, change, regressed in rows:
+            marker = '  REGRESSION' if regressed else ''
+            print(f"  {name:<40}{base:>10.3f} -> {current:>10.3f} ms ({change:+.0%}){marker}")
+        if regressions:
+            print(f"\n{len(regressions)} regression(s)")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
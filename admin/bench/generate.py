@@ -0,0 +1,139 @@
+"""
+Synthetic Data Generator
+Builds gym routines and diet plans in the repo's data layout at any scale.
+
+Text fields draw from the translation dictionary (known vocabulary) or from
+made-up words (unknown vocabulary, which reaches the fallback backend); the
+share of unknown strings is configurable. Output is deterministic per seed.
+
+Usage: python -m bench.generate --out DIR [--days 7] [--blocks 5]
+       [--exercises 8] [--meals 5] [--foods 4] [--unknown 0.1] [--seed 1]
+"""
+
+import argparse
+import random
+from pathlib import Path
+
+import storage
+import translator
+from doc_cache import DocumentCache
+from plan_store import DAYS, JsonPlanStore
+
+SYLLABLES = ['ka', 'lo', 'mir', 'zen', 'tor', 'vak', 'bri', 'sul', 'den', 'qua', 'rop', 'fel']
+
+
+class TextSource:
+    """Picks known dictionary terms or invents unknown ones."""
+
+    def __init__(self, rng, unknown_share):
+        self.rng = rng
+        self.unknown_share = unknown_share
+        self.known = sorted(translator.EN_TO_ES)
+
+    def word(self):
+        return ''.join(self.rng.choice(SYLLABLES) for _ in range(self.rng.randint(2, 3))).capitalize()
+
+    def text(self, words=2):
+        if self.rng.random() < self.unknown_share:
+            return ' '.join(self.word() for _ in range(words))
+        return self.rng.choice(self.known)
+
+
+def generate_gym_day(rng, text, blocks, exercises):
+    day = {"focus": f"{text.text()} + {text.text()}", "blocks": []}
+    for order in range(1, blocks + 1):
+        block = {"category": text.text(1), "order": order, "exercises": []}
+        for _ in range(exercises):
+            if rng.random() < 0.2:
+                block["exercises"].append(text.text())
+            else:
+                block["exercises"].append({
+                    "name": text.text(),
+                    "sets": rng.randint(2, 5),
+                    "reps": str(rng.choice([6, 8, 10, 12, 15])),
+                    "weight": str(rng.choice(['', 5, 7.5, 10, 20, 40, 60, 80])),
+                })
+        day["blocks"].append(block)
+    return day
+
+
+def generate_diet_day(rng, text, meals, foods):
+    day = {
+        "focus": text.text(),
+        "total_calories": rng.randrange(1800, 3200, 100),
+        "macros": {"protein": f"{rng.randrange(120, 220, 5)}g",
+                   "carbs": f"{rng.randrange(150, 350, 10)}g",
+                   "fats": f"{rng.randrange(50, 110, 5)}g"},
+        "meals": [],
+    }
+    for index in range(meals):
+        day["meals"].append({
+            "meal": text.text(1),
+            "time": f"{7 + index * 3}:00",
+            "foods": [{"name": text.text(), "portion": f"{rng.randint(1, 300)}g",
+                       "calories": rng.randint(20, 700), "protein": f"{rng.randint(0, 60)}g"}
+                      for _ in range(foods)],
+        })
+    return day
+
+
+def day_names(days):
+    """DAYS, then 'day8', 'day9'... for scales beyond a week."""
+    return DAYS[:days] + [f'day{n}' for n in range(len(DAYS) + 1, days + 1)]
+
+
+def generate(days=7, blocks=5, exercises=8, meals=5, foods=4, unknown=0.1, seed=1):
+    """Return {'gym': {weekly_routine}, 'diet': {weekly_diet}} documents."""
+    rng = random.Random(seed)
+    text = TextSource(rng, unknown)
+    names = day_names(days)
+    return {
+        'gym': {"weekly_routine": {d: generate_gym_day(rng, text, blocks, exercises) for d in names}},
+        'diet': {"weekly_diet": {d: generate_diet_day(rng, text, meals, foods) for d in names}},
+    }
+
+
+def translate_known(data):
+    """Spanish copy using dictionary lookups only (unknown text is left as is)."""
+    if isinstance(data, dict):
+        return {k: translate_known(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [translate_known(v) for v in data]
+    if isinstance(data, str):
+        return translator.lookup(data, 'es') or data
+    return data
+
+
+def write_dataset(out_dir, documents):
+    """Write main and day files for both languages, as the server expects them."""
+    out_dir = Path(out_dir)
+    store = JsonPlanStore(out_dir, DocumentCache())
+    with storage.Transaction(out_dir) as tx:
+        for plan, document in documents.items():
+            for lang, data in (('en', document), ('es', translate_known(document))):
+                tx.write(store.main_path(plan, lang), data)
+                for day, content in next(iter(data.values())).items():
+                    tx.write(store.day_path(plan, lang, day), content)
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic plan data.")
+    parser.add_argument('--out', type=Path, required=True)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--blocks', type=int, default=5)
+    parser.add_argument('--exercises', type=int, default=8)
+    parser.add_argument('--meals', type=int, default=5)
+    parser.add_argument('--foods', type=int, default=4)
+    parser.add_argument('--unknown', type=float, default=0.1, help="share of unknown vocabulary (0-1)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    documents = generate(args.days, args.blocks, args.exercises, args.meals, args.foods,
+                         args.unknown, args.seed)
+    write_dataset(args.out, documents)
+    print(f"Generated {args.days} day(s) of gym and diet data in {args.out}")
+
+
+if __name__ == '__main__':
+    main()
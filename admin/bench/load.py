@@ -0,0 +1,62 @@
+"""
+Load Driver
+Sends requests through Flask's test client and reports latency percentiles
+and throughput per endpoint. With several threads, each thread has its own
+client and they all hit the same endpoint at once.
+"""
+
+import threading
+import time
+
+from bench.timing import summarize
+
+
+def endpoints(documents):
+    """(name, method, path, json body or None) for the routes worth watching."""
+    day = next(iter(documents['gym']['weekly_routine']))
+    gym_day = documents['gym']['weekly_routine'][day]
+    diet_day = next(iter(documents['diet']['weekly_diet']))
+    return [
+        ('GET /api/gym', 'GET', '/api/gym', None),
+        ('GET /api/gym/<day>', 'GET', f'/api/gym/{day}', None),
+        ('GET /api/gym/<day>?lang=es', 'GET', f'/api/gym/{day}?lang=es', None),
+        ('GET /api/diet', 'GET', '/api/diet', None),
+        ('GET /api/diet/<day>', 'GET', f'/api/diet/{diet_day}', None),
+        ('GET /api/diet/summary', 'GET', '/api/diet/summary', None),
+        ('GET /api/changes', 'GET', '/api/changes?since=0', None),
+        ('POST /api/gym/<day>', 'POST', f'/api/gym/{day}', gym_day),
+        ('PATCH /api/gym/<day>', 'PATCH', f'/api/gym/{day}', {"path": "/focus", "value": gym_day["focus"]}),
+    ]
+
+
+def _worker(app, method, path, body, count, samples, errors):
+    client = app.test_client()
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        samples.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+
+
+def run(server, documents, requests=200, threads=1):
+    """Drive every endpoint; returns {'load.<name>': stats}."""
+    results = {}
+    for name, method, path, body in endpoints(documents):
+        _worker(server.app, method, path, body, min(requests, 10), [], [])   # warm up
+        samples, errors = [], []
+        per_thread = max(requests // threads, 1)
+        workers = [threading.Thread(target=_worker,
+                                    args=(server.app, method, path, body, per_thread, samples, errors))
+                   for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        stats = summarize(samples, time.perf_counter() - start)
+        stats["errors"] = len(errors)
+        results[f'load.{name}'] = stats
+        # Let background translation syncs from writes finish between endpoints
+        server.sync_queue.join()
+    return results
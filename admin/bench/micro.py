@@ -0,0 +1,40 @@
+"""
+Micro-benchmarks
+Document loads and saves, and translation of single strings and structures.
+"""
+
+import translator
+
+from bench.timing import measure
+
+
+def run(server, documents, repeat=200):
+    """Time the core helpers against the server's data directory. Returns {name: stats}."""
+    results = {}
+    gym_path = server.json_files.main_path('gym', 'en')
+    day = next(iter(documents['gym']['weekly_routine'].values()))
+    scratch = server.DATA_DIR / 'bench-scratch.json'
+
+    # ----- Storage -----
+    results['load_json.cached'] = measure(lambda: server.load_json(gym_path), repeat)
+    results['load_json.cold'] = measure(lambda: server.load_json(gym_path), repeat,
+                                        setup=lambda: server.document_cache.invalidate(gym_path))
+    results['save_json.day'] = measure(lambda: server.save_json(scratch, day), repeat)
+    results['save_json.plan'] = measure(lambda: server.save_json(scratch, documents['gym']), repeat)
+    scratch.unlink(missing_ok=True)
+
+    # ----- Translation -----
+    known = sorted(translator.EN_TO_ES)[0]
+    results['translate_text.memo'] = measure(lambda: translator.translate_text(known), repeat)
+    results['translate_text.dictionary'] = measure(lambda: translator.translate_text(known), repeat,
+                                                   setup=translator._memo_clear)
+    results['translate_text.fallback'] = measure(lambda: translator.translate_text('Zorvak kamir'),
+                                                 repeat, setup=translator._memo_clear)
+    results['translate_structure.day'] = measure(lambda: translator.translate_structure(day), repeat,
+                                                 setup=translator._memo_clear)
+    results['translate_structure.plan'] = measure(
+        lambda: translator.translate_structure(documents['gym']), max(repeat // 10, 5),
+        setup=translator._memo_clear)
+    results['translate_structure.plan_warm'] = measure(
+        lambda: translator.translate_structure(documents['gym']), max(repeat // 10, 5))
+    return results
@@ -0,0 +1,60 @@
+"""
+Timing Helpers
+Latency samples, their summary statistics and baseline comparison.
+"""
+
+import time
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples, elapsed=None):
+    """Statistics (in milliseconds) for a list of per-operation durations in seconds."""
+    ordered = sorted(samples)
+    total = elapsed if elapsed is not None else sum(ordered)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+        "ops_per_sec": round(len(ordered) / total, 1) if total else 0.0,
+    }
+
+
+def measure(fn, repeat=200, warmup=10, setup=None):
+    """Run fn() `repeat` times (after `warmup` runs) and summarize the timings."""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def compare(current, baseline, threshold=0.2):
+    """
+    Compare two result sets ({name: stats}). A benchmark regresses when its
+    p50 is more than `threshold` slower than the baseline's.
+    Returns a list of (name, baseline p50, current p50, change, regressed).
+    """
+    rows = []
+    for name, stats in current.items():
+        base = baseline.get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        change = stats["p50_ms"] / base["p50_ms"] - 1
+        rows.append((name, base["p50_ms"], stats["p50_ms"], change, change > threshold))
+    return rows
@@ -0,0 +1,170 @@
+"""
+Static Site Build
+Exports the plan data the public app reads as cache-friendly bundles:
+
+- One minified week bundle per language (gym + diet), so the app loads the
+  whole week in a single request.
+- Minified per-day files for each plan and language.
+- Content-hashed filenames (immutable, safe to cache forever), each with
+  precompressed .gz and .br siblings (.br needs the `brotli` package).
+- data/dist/manifest.json mapping languages and days to the current files.
+  The manifest is the only file that must be revalidated by clients.
+
+Bundles are built from the per-day files the site already serves. Files from
+the previous build are kept until the next one, so open tabs holding the old
+manifest never request a file that is gone.
+
+Usage: python build_static.py [output_dir]
+"""
+
+import gzip
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+import storage
+from doc_cache import DocumentCache
+from plan_store import DAYS, LANGS, PLANS, JsonPlanStore
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+BASE_DIR = Path(__file__).parent.parent
+DATA_DIR = BASE_DIR / 'data'
+DIST_DIR = DATA_DIR / 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+HASH_LENGTH = 12
+MANIFEST_FORMAT = 1
+
+
+def minify(data) -> bytes:
+    """Serialize a document compactly, keeping key order for display."""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def hashed_name(stem, body) -> str:
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:HASH_LENGTH]}.json"
+
+
+def load_days(store, plan, lang):
+    """Read a plan's day files in week order, skipping missing days."""
+    days = {}
+    for day in DAYS:
+        path = store.day_path(plan, lang, day)
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data:
+                days[day] = data
+    return days
+
+
+class Build:
+    """Collects the files of one build and writes only those that are new."""
+
+    def __init__(self, out_dir):
+        self.out_dir = Path(out_dir)
+        self.tx = storage.Transaction(self.out_dir)
+        self.files = set()
+        self.written = 0
+        self.bytes = {'json': 0, 'gz': 0, 'br': 0}
+
+    def emit(self, stem, data) -> str:
+        """Write a hashed file and its compressed siblings; returns its relative path."""
+        body = minify(data)
+        directory, _, name = stem.rpartition('/')
+        relative = f"{directory}/{hashed_name(name, body)}" if directory else hashed_name(name, body)
+        variants = {relative: body}
+        variants[relative + '.gz'] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variants[relative + '.br'] = brotli.compress(body, quality=11)
+
+        for name, content in variants.items():
+            self.files.add(name)
+            self.bytes[name.rsplit('.', 1)[-1]] += len(content)
+            target = self.out_dir / name
+            # Same name means same content: nothing to do
+            if not target.exists():
+                self.tx.write(target, content)
+                self.written += 1
+        return relative
+
+
+def read_manifest(out_dir):
+    try:
+        with open(Path(out_dir) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def prune(out_dir, keep):
+    """Remove hashed files that neither this build nor the previous one uses."""
+    removed = 0
+    for path in Path(out_dir).rglob('*.json*'):
+        relative = path.relative_to(out_dir).as_posix()
+        if relative == MANIFEST_NAME or relative in keep:
+            continue
+        path.unlink()
+        removed += 1
+    return removed
+
+
+def build(data_dir=DATA_DIR, out_dir=DIST_DIR):
+    """Build every bundle and write the manifest. Returns the manifest."""
+    store = JsonPlanStore(data_dir, DocumentCache())
+    out = Build(out_dir)
+    previous = read_manifest(out_dir)
+
+    manifest = {"format": MANIFEST_FORMAT, "generated_at": int(time.time()), "langs": {}}
+    for lang in LANGS:
+        week = {plan: load_days(store, plan, lang) for plan in PLANS}
+        entry = {"week": out.emit(f"{lang}/week", week), "days": {}}
+        for plan, days in week.items():
+            entry["days"][plan] = {
+                day: out.emit(f"{lang}/{plan}-{day}", data) for day, data in days.items()
+            }
+        manifest["langs"][lang] = entry
+
+    out.tx.commit()
+
+    keep = set(out.files)
+    keep.update(previous.get("files", []))
+    manifest["files"] = sorted(out.files)
+    removed = prune(out_dir, keep)
+
+    # The manifest goes last: it only ever points at files already in place
+    storage.write_atomic(Path(out_dir) / MANIFEST_NAME, minify(manifest), journal_dir=out_dir)
+
+    print(f"  Files written: {out.written}, unchanged: {len(out.files) - out.written}, "
+          f"pruned: {removed}")
+    print(f"  Size: {out.bytes['json']} bytes JSON, {out.bytes['gz']} gzip"
+          + (f", {out.bytes['br']} brotli" if brotli is not None else " (brotli not installed)"))
+    return manifest
+
+
+def main():
+    out_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else DIST_DIR
+
+    print("=" * 50)
+    print("  BUILD STATIC DATA BUNDLES")
+    print("=" * 50)
+    print(f"\n  Source: {DATA_DIR}")
+    print(f"  Output: {out_dir}\n")
+
+    manifest = build(DATA_DIR, out_dir)
+    for lang, entry in manifest["langs"].items():
+        print(f"  [{lang}] week bundle: {entry['week']}")
+
+    print("\n" + "=" * 50)
+    print("  BUILD COMPLETE!")
+    print("=" * 50)
+
+
+if __name__ == '__main__':
+    main()
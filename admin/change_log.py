@@ -0,0 +1,314 @@
+"""
+Change Log for Incremental Client Sync
+
+An append-only feed of plan edits. Every save appends one entry per changed
+day (or plan-level field set), numbered with an increasing `seq`:
+
+    {"seq": 12, "time": 1730000000.0, "plan": "gym", "lang": "en",
+     "day": "monday", "version": 7, "day_version": 3,
+     "ops": [{"op": "replace", "path": "/blocks/2/exercises/0/weight", "value": "60"}]}
+
+`ops` are JSON Patch operations (see json_patch.py) from the day's previous
+version to this one, as deep as the change: an edited weight ships that
+weight, not the day's blocks. A new day is one "replace" of the root ("");
+a removed day is {"deleted": true}. Entries written before ops existed hold
+the changed top-level fields instead ("fields", "removed"). Every namespace (see tenants.py) has its own log, so
+one busy athlete never compacts away another's entries; entries for an
+athlete other than the default namespace also carry "athlete". Clients
+keep the last seq they saw and ask for what came after it.
+
+The log lives in memory and in a JSON Lines file. Compaction keeps it
+bounded: once it grows past `max_entries`, the entries of each day are merged
+into one (latest seq wins, operations composed), so the feed still brings any client up to date
+but holds at most one entry per athlete, plan, language and day.
+
+The file starts with an epoch header. If the log is lost and restarted,
+clients sending the old epoch are told to reset (refetch the full documents).
+
+Several server processes can share one file (see serve.py): appends and
+compactions take a file lock, and every read first picks up what other
+processes appended, or reloads the file after one of them compacted it.
+"""
+
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import json_patch
+import storage
+
+DEFAULT_MAX_ENTRIES = 1000
+
+# Seconds between checks for entries appended by other processes while waiting
+POLL_INTERVAL = 1.0
+
+
+def diff_day(previous, current):
+    """
+    Changes from `previous` to `current` as {"ops": [JSON Patch operations]},
+    {"deleted": True}, or None if equal.
+    """
+    if current is None:
+        return {"deleted": True} if previous is not None else None
+    ops = json_patch.diff(previous, current)
+    return {"ops": ops} if ops else None
+
+
+def _ops(entry):
+    """An entry's operations (entries from before ops hold top-level fields)."""
+    if "ops" in entry:
+        return entry["ops"]
+    return ([{"op": "remove", "path": f"/{json_patch.escape(key)}"} for key in entry.get("removed") or ()]
+            + [{"op": "add", "path": f"/{json_patch.escape(key)}", "value": value}
+               for key, value in (entry.get("fields") or {}).items()])
+
+
+def _shifts(op):
+    """Whether an operation moves the elements after it in an array."""
+    return op["op"] in ('add', 'remove') and op["path"].rsplit('/', 1)[-1].isdigit()
+
+
+def _compose(ops):
+    """
+    `ops` without those a later operation overwrites (one that replaces,
+    sets or removes the same path or a parent of it; a member added and
+    then replaced is one "add"). Array insertions and removals renumber the
+    paths after them, so nothing before one is dropped for what comes after
+    it.
+    """
+    kept, covering = [], []   # covering: (path, index in kept) of later operations
+    for op in reversed(ops):
+        path = op["path"]
+        cover = next((index for cover, index in reversed(covering)
+                      if path.startswith(cover + '/') or (path == cover and op["op"] != 'remove')), None)
+        if cover is not None:
+            later = kept[cover]
+            if path == later["path"] and op["op"] == 'add':
+                if later["op"] == 'remove' or (_shifts(op) and cover != len(kept) - 1):
+                    # The remove needs what this adds; an insertion only
+                    # moves past nothing
+                    cover = None
+                else:
+                    kept[cover] = {**later, "op": 'add'}
+                    if _shifts(op):
+                        covering = []
+            if cover is not None:
+                continue
+        kept.append(op)
+        if _shifts(op):
+            covering = []
+        if op["op"] in ('replace', 'remove') or (op["op"] == 'add' and not _shifts(op)):
+            covering.append((path, len(kept) - 1))
+    return kept[::-1]
+
+
+def _merge(older, newer):
+    """One entry equivalent to applying `older` and then `newer`."""
+    if newer.get("deleted") or older.get("deleted"):
+        return newer
+    merged = {key: value for key, value in newer.items() if key not in ("fields", "removed")}
+    merged["ops"] = _compose(_ops(older) + _ops(newer))
+    return merged
+
+
+def _key(entry):
+    return (entry.get("athlete"), entry["plan"], entry["lang"], entry["day"])
+
+
+class ChangeLog:
+    """Append-only, compacting change feed, optionally persisted to a file."""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self.epoch = None
+        self._entries = []
+        self._seqs = []
+        self._seq = 0
+        # The file as last read: its header line, inode, bytes consumed and
+        # (inode, size, mtime) signature
+        self._header = None
+        self._inode = None
+        self._offset = 0
+        self._signature = None
+        self._changed = threading.Condition()
+        with self._changed, self._file_lock():
+            self._refresh()
+            if self.epoch is None:
+                self.epoch = uuid.uuid4().hex
+                self._rewrite()
+
+    @property
+    def seq(self):
+        """The latest sequence number (0 for an empty log)."""
+        return self._seq
+
+    # ----- Persistence -----
+
+    def _file_lock(self):
+        """Excludes other processes appending to or rewriting the file."""
+        if self.path is None:
+            return contextlib.nullcontext()
+        return storage.document_lock('changes', lock_dir=self.path.parent)
+
+    def _refresh(self):
+        """Read entries appended since the last read; reload the file if it was replaced."""
+        if self.path is None:
+            return
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if (st.st_ino, st.st_size, st.st_mtime_ns) == self._signature:
+            return
+        with open(self.path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            # Same file unless another process compacted it (new header)
+            current = (self._header is not None and st.st_ino == self._inode
+                       and st.st_size >= self._offset
+                       and f.read(len(self._header)) == self._header)
+            if current:
+                f.seek(self._offset)
+            else:
+                f.seek(0)
+                self._entries, self._seqs, self._offset = [], [], 0
+                self._header = None
+            raw = f.read()
+        self._inode = st.st_ino
+        self._signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+        # Only whole lines: a partial one is still being written, or was torn by a crash
+        end = raw.rfind(b'\n') + 1
+        for line in raw[:end].splitlines(keepends=True):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "epoch" in record:
+                self._header = line
+                self.epoch = record["epoch"]
+                self._seq = record.get("seq", 0)
+            else:
+                self._entries.append(record)
+                self._seqs.append(record["seq"])
+                self._seq = max(self._seq, record["seq"])
+        self._offset += end
+
+    def _rewrite(self):
+        """Atomically replace the file with the header and current entries."""
+        if self.path is None:
+            return
+        # A new generation tells other processes the file was replaced
+        header = {"epoch": self.epoch, "seq": self._seq, "generation": uuid.uuid4().hex}
+        lines = [json.dumps(header)] + [json.dumps(e, ensure_ascii=False) for e in self._entries]
+        body = ('\n'.join(lines) + '\n').encode('utf-8')
+        storage.write_atomic(self.path, body)
+        self._header = (lines[0] + '\n').encode('utf-8')
+        self._offset = len(body)
+        st = os.stat(self.path)
+        self._inode, self._signature = st.st_ino, (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _append_to_file(self, entries):
+        if self.path is None:
+            return
+        if not self.path.exists():
+            # Deleted behind our back: start a new file (the entries are already in memory)
+            return self._rewrite()
+        body = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in entries).encode('utf-8')
+        with open(self.path, 'r+b') as f:
+            # Drop a torn line left by a crash mid-append (we hold the file lock)
+            f.truncate(self._offset)
+            f.seek(self._offset)
+            f.write(body)
+            f.flush()
+            st = os.fstat(f.fileno())
+        self._offset += len(body)
+        self._signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    # ----- Writing -----
+
+    def append(self, changes):
+        """
+        Record changes (dicts with plan, lang, day and the diff) and return
+        them as numbered entries. All of them are written in one append.
+        """
+        if not changes:
+            return []
+        with self._changed, self._file_lock():
+            self._refresh()
+            now = time.time()
+            entries = []
+            for change in changes:
+                self._seq += 1
+                entries.append({"seq": self._seq, "time": now, **change})
+            self._entries.extend(entries)
+            self._seqs.extend(entry["seq"] for entry in entries)
+            if len(self._entries) > self.max_entries:
+                self.compact()
+            else:
+                self._append_to_file(entries)
+            self._changed.notify_all()
+        return entries
+
+    def compact(self):
+        """Merge the entries of each day into one, keeping the latest seq."""
+        with self._changed, self._file_lock():
+            self._refresh()
+            latest = {}
+            for entry in self._entries:
+                key = _key(entry)
+                latest[key] = _merge(latest[key], entry) if key in latest else entry
+            self._entries = sorted(latest.values(), key=lambda entry: entry["seq"])
+            self._seqs = [entry["seq"] for entry in self._entries]
+            self._rewrite()
+
+    # ----- Reading -----
+
+    def since(self, seq, plan=None, lang=None, limit=None, epoch=None, athlete=None):
+        """
+        Entries after `seq` of one athlete (None: the default namespace),
+        optionally filtered by plan and language.
+        Returns {"seq": cursor, "latest", "changes", "more", "reset", "epoch"}:
+        the next request continues from `cursor`. `reset` means the client's
+        position is not in this log and it must refetch the full documents.
+        """
+        with self._changed:
+            self._refresh()
+            latest = self._seq
+            if (epoch is not None and epoch != self.epoch) or seq > latest:
+                return {"seq": latest, "latest": latest, "changes": [], "more": False,
+                        "reset": True, "epoch": self.epoch}
+            start = bisect.bisect_right(self._seqs, seq)
+            candidates = self._entries[start:]
+
+        changes = [entry for entry in candidates
+                   if entry.get("athlete") == athlete
+                   and (plan is None or entry["plan"] == plan)
+                   and (lang is None or entry["lang"] == lang)]
+        more = limit is not None and len(changes) > limit
+        if more:
+            changes = changes[:limit]
+        cursor = changes[-1]["seq"] if more else latest
+        return {"seq": cursor, "latest": latest, "changes": changes, "more": more,
+                "reset": False, "epoch": self.epoch}
+
+    def wait(self, seq, timeout=None):
+        """Block until an entry newer than `seq` exists; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while True:
+                self._refresh()
+                if self._seq > seq:
+                    return True
+                # Appends by this process notify; other processes' are polled for
+                interval = POLL_INTERVAL
+                if deadline is not None:
+                    interval = min(interval, deadline - time.monotonic())
+                    if interval <= 0:
+                        return False
+                self._changed.wait(interval)
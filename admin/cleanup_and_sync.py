@@ -1,80 +1,187 @@
 """
 Cleanup and Sync Script
-1. Reads all English gym routine files
+For the gym routine and the diet plan:
+1. Reads the English plan
 2. Translates any Spanish text found -> English
 3. Saves cleaned English files
 4. Translates English -> Spanish and saves to ES folder
+
+With --incremental, a manifest (data/.sync-manifest.json) records a hash of
+each day's English source and of the files written for it. Only days whose
+source (or output files) changed since the last sync are translated again,
+and they are processed concurrently. In both modes a file is only rewritten
+when its bytes would change, so a sync with nothing to do leaves every file
+(and its mtime) alone.
+
+Usage: python cleanup_and_sync.py [--incremental] [--workers N]
 """
 
+import argparse
+import hashlib
 import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+
+import storage
+import templates
 import translator
+from doc_cache import DocumentCache
+from plan_store import PLANS, JsonPlanStore
 
 BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / 'data'
-GYM_EN_DIR = DATA_DIR / 'gym-routine'
-GYM_ES_DIR = DATA_DIR / 'gym-routine-es'
-GYM_EN_MAIN = DATA_DIR / 'gym-routine.json'
-GYM_ES_MAIN = GYM_ES_DIR / 'gym-routine.json'
+MANIFEST_PATH = DATA_DIR / '.sync-manifest.json'
+
+DEFAULT_WORKERS = 4
+
+
+def digest(data) -> str:
+    """Hash of a JSON value (key order matters, as it does in the files)."""
+    encoded = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def file_digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    # Translations from other dictionaries or backends are stale
+    if manifest.get('translator') != translator.cache_version():
+        return {}
+    return manifest
+
+
+def translate_day(content):
+    """Clean one English day (ES -> EN) and translate it (EN -> ES)."""
+    cleaned = translator.translate_structure(content, target_lang='en')
+    return cleaned, translator.translate_structure(cleaned, target_lang='es')
+
+
+class Writes:
+    """Files to rewrite, staged in one transaction; unchanged bytes are skipped."""
 
-def load_json(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    def __init__(self):
+        self.tx = storage.Transaction(DATA_DIR)
+        self.written = []
+        self.unchanged = 0
+
+    def stage(self, path, data) -> str:
+        """Stage `data` for `path` unless the file already holds it; returns its hash."""
+        body = storage.encode_document(data)
+        body_digest = hashlib.sha256(body).hexdigest()
+        if file_digest(path) == body_digest:
+            self.unchanged += 1
+        else:
+            self.tx.write(path, body)
+            self.written.append(path)
+        return body_digest
+
+
+def sync_plan(store, plan, manifest, writes, incremental, pool):
+    """Clean and translate one plan; returns the plan's new manifest entry."""
+    collection = PLANS[plan]['collection']
+    # As stored: templated days stay templated, shared blocks are translated once
+    full_en = store.read_plan(plan, 'en', raw=True).data
+    days = full_en.get(collection) or {}
+    if not days:
+        print(f"  No {plan} days found, skipping")
+        return manifest.get(plan, {})
+
+    previous = manifest.get(plan, {}) if incremental else {}
+    en_main, es_main = store.main_path(plan, 'en'), store.main_path(plan, 'es')
+    main_current = (previous.get('_main') == [file_digest(en_main), file_digest(es_main)])
+
+    # 1. Which days need translating
+    full_es = store.read_plan(plan, 'es', raw=True).data if incremental else {}
+    es_days = full_es.get(collection) or {}
+    sources = {day: digest(content) for day, content in days.items()}
+    changed = [
+        day for day in days
+        if es_days.get(day) is None
+        or previous.get(day, {}).get('source') != sources[day]
+        or previous[day].get('files') != [file_digest(store.day_path(plan, 'en', day)),
+                                          file_digest(store.day_path(plan, 'es', day))]
+    ]
+    if not changed and main_current:
+        print(f"  {plan}: up to date ({len(days)} day(s))")
+        return previous
+
+    print(f"  {plan}: translating {len(changed)} of {len(days)} day(s)...")
+    results = dict(zip(changed, pool.map(translate_day, [days[day] for day in changed])))
+
+    # 2. Assemble both plan documents: changed days are replaced, the rest kept
+    cleaned_en, translated_es = translate_day({k: v for k, v in full_en.items() if k != collection})
+    cleaned_en[collection], translated_es[collection] = {}, {}
+    for day in days:
+        if day in results:
+            cleaned_en[collection][day], translated_es[collection][day] = results[day]
+        else:
+            cleaned_en[collection][day] = days[day]
+            translated_es[collection][day] = es_days[day]
+
+    # 3. Stage files (only those whose bytes change); day files hold resolved days
+    layout = PLANS[plan]
+    rendered_en = templates.resolve_days(layout, cleaned_en[collection], cleaned_en.get(templates.LIBRARY) or {})
+    rendered_es = templates.resolve_days(layout, translated_es[collection],
+                                         translated_es.get(templates.LIBRARY) or {})
+    entry = {}
+    for day in days:
+        files = [writes.stage(store.day_path(plan, 'en', day), rendered_en[day]),
+                 writes.stage(store.day_path(plan, 'es', day), rendered_es[day])]
+        # The source hash is what this day's English content is after cleaning
+        entry[day] = {"source": digest(cleaned_en[collection][day]), "files": files}
+    entry['_main'] = [writes.stage(en_main, cleaned_en), writes.stage(es_main, translated_es)]
+    return entry
 
-def save_json(path, data):
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-    print(f"  Saved: {path.name}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Clean English plans and sync them to Spanish.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only translate days whose English source changed since the last sync")
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('FITNESS_SYNC_WORKERS', DEFAULT_WORKERS)),
+                        help="days translated concurrently")
+    args = parser.parse_args()
+    started = time.perf_counter()
+
     print("=" * 50)
-    print("  CLEANUP AND SYNC ROUTINE")
+    print("  CLEANUP AND SYNC ROUTINE" + (" (incremental)" if args.incremental else ""))
     print("=" * 50)
-    
-    # ========================================
-    # STEP 1: Clean English files (ES -> EN)
-    # ========================================
-    print("\n[Step 1] Cleaning English files (translating any Spanish to English)...")
-    
-    # Load main EN file
-    full_en = load_json(GYM_EN_MAIN)
-    
-    # Translate any Spanish -> English
-    cleaned_en = translator.translate_structure(full_en, target_lang='en')
-    
-    # Save cleaned main file
-    save_json(GYM_EN_MAIN, cleaned_en)
-    
-    # Save individual day files
-    if 'weekly_routine' in cleaned_en:
-        for day, content in cleaned_en['weekly_routine'].items():
-            day_path = GYM_EN_DIR / f'{day}.json'
-            save_json(day_path, content)
-    
-    print("  English files cleaned!")
-    
-    # ========================================
-    # STEP 2: Sync to Spanish (EN -> ES)
-    # ========================================
-    print("\n[Step 2] Syncing to Spanish (translating English to Spanish)...")
-    
-    # Translate EN -> ES
-    full_es = translator.translate_structure(cleaned_en, target_lang='es')
-    
-    # Save main ES file
-    save_json(GYM_ES_MAIN, full_es)
-    
-    # Save individual day files
-    if 'weekly_routine' in full_es:
-        for day, content in full_es['weekly_routine'].items():
-            day_path = GYM_ES_DIR / f'{day}.json'
-            save_json(day_path, content)
-    
-    print("  Spanish files synced!")
-    
+
+    store = JsonPlanStore(DATA_DIR, DocumentCache())
+    manifest = load_manifest()
+    writes = Writes()
+    new_manifest = {"translator": translator.cache_version()}
+
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+        for plan in PLANS:
+            # Plans are independent, but their day files share one transaction
+            new_manifest[plan] = sync_plan(store, plan, manifest, writes, args.incremental, pool)
+
+    writes.tx.commit()
+    for path in writes.written:
+        print(f"  Saved: {path.relative_to(DATA_DIR)}")
+    if new_manifest != manifest:
+        storage.write_atomic(MANIFEST_PATH, new_manifest)
+
+    print(f"\n  {len(writes.written)} file(s) written, {writes.unchanged} unchanged "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
     print("\n" + "=" * 50)
     print("  COMPLETE!")
     print("=" * 50)
 
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,173 @@
+"""
+Diet Macro Summary
+Totals and sanity checks for diet plan documents.
+
+Diet days declare their targets as a number and strings:
+
+    "total_calories": 2500,
+    "macros": {"protein": "180g", "carbs": "250g", "fats": "80g"}
+
+while each food under meals[].foods[] carries its own `calories` and
+`protein` ("18g"). This module parses every quantity once into numeric
+columns (one array per nutrient, with offsets marking where each meal and
+day starts) and totals meals, days and the week as sums over slices of
+those columns. Days whose foods do not add up to their declared totals
+are flagged.
+
+The result is cached per document version by the server, so the strings
+are only parsed again after a save.
+"""
+
+import math
+import re
+from array import array
+from bisect import bisect_left
+
+# Nutrients carried by each food entry
+FOOD_COLUMNS = ('calories', 'protein')
+
+# Declared macros and their energy (kcal per gram)
+MACRO_CALORIES = {'protein': 4, 'carbs': 4, 'fats': 9}
+
+# Relative difference tolerated between declared and computed totals
+TOLERANCE = 0.05
+
+_QUANTITY = re.compile(r'^\s*(-?\d+(?:[.,]\d+)?)\s*([a-zA-Z]*)\s*$')
+
+
+def parse_quantity(value):
+    """
+    Numeric value of a quantity: 210 -> 210.0, "180g" -> 180.0,
+    "2,5 g" -> 2.5. Returns None for anything else ("", "1/2", None).
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _QUANTITY.match(value)
+        if match:
+            return float(match.group(1).replace(',', '.'))
+    return None
+
+
+class DietColumns:
+    """A diet plan's food quantities as numeric columns."""
+
+    def __init__(self, weekly_diet: dict):
+        self.days = []          # day names, in document order
+        self.meals = []         # (day index, meal name)
+        self.meal_offsets = array('l', [0])
+        self.day_offsets = array('l', [0])   # in meals
+        self.columns = {name: array('d') for name in FOOD_COLUMNS}
+        self.missing = {name: array('l') for name in FOOD_COLUMNS}   # food indexes
+        self.declared = []      # per day: {"calories": x, "protein": x, ...}
+
+        foods = 0
+        for day, data in (weekly_diet or {}).items():
+            if not isinstance(data, dict):
+                continue
+            day_index = len(self.days)
+            self.days.append(day)
+            macros = data.get('macros') if isinstance(data.get('macros'), dict) else {}
+            declared = {"calories": parse_quantity(data.get('total_calories'))}
+            declared.update({name: parse_quantity(macros.get(name)) for name in MACRO_CALORIES})
+            self.declared.append(declared)
+
+            for meal in data.get('meals') or []:
+                if not isinstance(meal, dict):
+                    continue
+                self.meals.append((day_index, meal.get('meal', '')))
+                for food in meal.get('foods') or []:
+                    if not isinstance(food, dict):
+                        continue
+                    for name in FOOD_COLUMNS:
+                        value = parse_quantity(food.get(name))
+                        if value is None:
+                            self.missing[name].append(foods)
+                            value = 0.0
+                        self.columns[name].append(value)
+                    foods += 1
+                self.meal_offsets.append(foods)
+            self.day_offsets.append(len(self.meals))
+
+    def total(self, name, start, end):
+        """Sum of a column over foods [start, end)."""
+        return math.fsum(self.columns[name][start:end])
+
+    def meal_totals(self, meal):
+        start, end = self.meal_offsets[meal], self.meal_offsets[meal + 1]
+        return {name: self.total(name, start, end) for name in FOOD_COLUMNS}
+
+    def day_totals(self, day):
+        first, last = self.day_offsets[day], self.day_offsets[day + 1]
+        start, end = self.meal_offsets[first], self.meal_offsets[last]
+        return {name: self.total(name, start, end) for name in FOOD_COLUMNS}
+
+    def missing_in(self, name, start, end):
+        missing = self.missing[name]
+        return bisect_left(missing, end) - bisect_left(missing, start)
+
+
+def _mismatch(field, declared, computed):
+    if declared is None:
+        return None
+    if abs(computed - declared) <= TOLERANCE * max(abs(declared), 1.0):
+        return None
+    return {"field": field, "declared": declared, "computed": round(computed, 1),
+            "difference": round(computed - declared, 1)}
+
+
+def _round(totals):
+    return {name: round(value, 1) for name, value in totals.items()}
+
+
+def summarize(plan_data: dict) -> dict:
+    """Per-meal, per-day and weekly totals of a diet plan, with mismatches."""
+    columns = DietColumns((plan_data or {}).get('weekly_diet'))
+    days = {}
+    week = dict.fromkeys(FOOD_COLUMNS, 0.0)
+    mismatched_days = 0
+
+    for index, day in enumerate(columns.days):
+        first, last = columns.day_offsets[index], columns.day_offsets[index + 1]
+        totals = columns.day_totals(index)
+        declared = columns.declared[index]
+        start, end = columns.meal_offsets[first], columns.meal_offsets[last]
+
+        checks = [
+            _mismatch('calories', declared['calories'], totals['calories']),
+            _mismatch('protein', declared['protein'], totals['protein']),
+        ]
+        # Calories implied by the declared macros
+        if all(declared[name] is not None for name in MACRO_CALORIES):
+            implied = sum(declared[name] * kcal for name, kcal in MACRO_CALORIES.items())
+            checks.append(_mismatch('macro_calories', declared['calories'], implied))
+        mismatches = [check for check in checks if check is not None]
+        mismatched_days += bool(mismatches)
+
+        for name in FOOD_COLUMNS:
+            week[name] += totals[name]
+        days[day] = {
+            "declared": declared,
+            "computed": _round(totals),
+            "meals": [
+                {"meal": columns.meals[meal][1], **_round(columns.meal_totals(meal))}
+                for meal in range(first, last)
+            ],
+            "unparsed": {name: columns.missing_in(name, start, end) for name in FOOD_COLUMNS},
+            "mismatches": mismatches,
+        }
+
+    count = len(columns.days)
+    return {
+        "days": days,
+        "week": {
+            "computed": _round(week),
+            "daily_average": _round({name: week[name] / count for name in FOOD_COLUMNS})
+            if count else dict.fromkeys(FOOD_COLUMNS, 0.0),
+            "declared_calories": math.fsum(
+                d['calories'] for d in columns.declared if d['calories'] is not None),
+            "mismatched_days": mismatched_days,
+        },
+    }
@@ -0,0 +1,113 @@
+"""
+Document Cache for the Admin Server
+
+Keeps parsed JSON documents in memory so repeated reads are served from RAM
+instead of the disk and the JSON parser.
+
+- Entries are revalidated with a single os.stat() (mtime, size, inode), so
+  edits made by other processes or by hand are picked up on the next read.
+- Saves made by this process update the cache directly (write-through).
+- Memory is bounded with LRU eviction.
+
+Cached documents are shared between readers: treat them as read-only and copy
+before mutating.
+"""
+
+import itertools
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import metrics
+
+DEFAULT_MAX_ENTRIES = 64
+
+_version_counter = itertools.count(1)
+
+
+class CacheEntry:
+    """A parsed document plus the file signature it was read from."""
+
+    __slots__ = ('signature', 'data', 'version')
+
+    def __init__(self, signature, data):
+        self.signature = signature
+        self.data = data
+        # Monotonic per-process version, bumped every time the entry changes
+        self.version = next(_version_counter)
+
+
+def file_signature(filepath):
+    """Return a cheap (mtime_ns, size, inode) signature for a file."""
+    st = os.stat(filepath)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class DocumentCache:
+    """Thread-safe LRU cache of parsed JSON documents keyed by path."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_entry(self, filepath):
+        """
+        Return the CacheEntry for a file, loading it on a miss.
+        Raises FileNotFoundError / json.JSONDecodeError like open()/json.load().
+        """
+        key = str(filepath)
+        try:
+            signature = file_signature(filepath)
+        except FileNotFoundError:
+            self.invalidate(key)
+            raise
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        with metrics.span('load_json'):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+        with self._lock:
+            self.misses += 1
+            return self._store(key, signature, data)
+
+    def get(self, filepath):
+        """Return the parsed document for a file (see get_entry)."""
+        return self.get_entry(filepath).data
+
+    def put(self, filepath, data):
+        """Record a document this process has just written to disk."""
+        key = str(filepath)
+        try:
+            signature = file_signature(filepath)
+        except FileNotFoundError:
+            self.invalidate(key)
+            return None
+        with self._lock:
+            return self._store(key, signature, data)
+
+    def invalidate(self, filepath=None):
+        """Drop one path from the cache, or everything when no path is given."""
+        with self._lock:
+            if filepath is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(filepath), None)
+
+    def _store(self, key, signature, data):
+        entry = CacheEntry(signature, data)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
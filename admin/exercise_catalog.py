@@ -0,0 +1,391 @@
+"""
+Exercise Catalog
+One record per distinct exercise, shared by every routine and athlete
+(data/exercises.json):
+
+    {"exercises": {"romanian-deadlift-rdl": {
+        "name": {"en": "Romanian Deadlift (RDL)", "es": "Peso muerto rumano (RDL)"},
+        "category": "Strength"}}}
+
+IDs are stable: made once from the first name an exercise was saved under
+(the same key workout_history.py files its series under) and never changed
+by renames. Routine exercises reference the catalog with an "id" field next
+to their name, which stays in the routine files for the public site.
+
+A name first seen in a translation sync is only as good as the translator:
+unless it is the dictionary's translation it is marked with the translator
+version that made it ("synced": {"es": "<translator.cache_version()>"}).
+Once the dictionaries change, detach() translates the exercise again
+instead of using the marked name, and a save in that language with another
+name replaces it.
+
+- link_day() gives every exercise of a gym day its id, matching names in
+  either language and registering exercises the catalog does not know.
+- detach() / attach() let the translation sync take linked names straight
+  from the catalog instead of translating them as text (marked names from
+  an older translator version are translated again).
+- search() answers autocomplete queries from an in-memory prefix trie over
+  the words of every name in both languages (case and accent-insensitive).
+
+Usage (build the catalog from the current routines):
+    python exercise_catalog.py extract
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import unicodedata
+from pathlib import Path
+
+import storage
+import translator
+from doc_cache import DocumentCache
+from plan_store import LANGS, JsonPlanStore
+from workout_history import exercise_key
+
+CATALOG_NAME = 'exercises.json'
+
+# Trie node key holding the ids under that prefix (never a character)
+_IDS = ''
+
+_WORD = re.compile(r'\w+')
+
+
+def fold(text: str) -> str:
+    """Case- and accent-insensitive form of a name, for matching."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    folded = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(folded.split())
+
+
+class PrefixTrie:
+    """Words -> ids; every node keeps the ids of all words below it."""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, text, item):
+        for word in _WORD.findall(fold(text)):
+            node = self.root
+            for ch in word:
+                node = node.setdefault(ch, {})
+                node.setdefault(_IDS, set()).add(item)
+
+    def find(self, prefix):
+        """Ids with a word starting with `prefix` (already folded)."""
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return set()
+        return node.get(_IDS, set())
+
+
+class ExerciseCatalog:
+    """The catalog file plus its name and search indexes (reloaded when the file changes)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._exercises = {}
+        self._names = {lang: {} for lang in LANGS}   # lang -> folded name -> id
+        self._trie = None
+        self._signature = None
+        self._lock = threading.RLock()
+        self._refresh()
+
+    # ----- Persistence -----
+
+    def _file_lock(self):
+        return storage.document_lock('exercises', lock_dir=self.path.parent / '.locks')
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if signature == self._signature:
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            exercises = json.load(f).get('exercises') or {}
+        self._signature = signature
+        self._exercises = exercises
+        self._names = {lang: {} for lang in LANGS}
+        for exercise_id, entry in exercises.items():
+            self._index(exercise_id, entry)
+        self._trie = None
+
+    def _index(self, exercise_id, entry):
+        for lang, name in (entry.get('name') or {}).items():
+            if name and lang in self._names:
+                self._names[lang].setdefault(fold(name), exercise_id)
+
+    def _save(self):
+        storage.write_atomic(self.path, {"exercises": self._exercises}, journal_dir=self.path.parent)
+        st = os.stat(self.path)
+        self._signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    # ----- Lookups -----
+
+    def get(self, exercise_id):
+        with self._lock:
+            self._refresh()
+            entry = self._exercises.get(exercise_id)
+            return {"id": exercise_id, **entry} if entry is not None else None
+
+    def __len__(self):
+        return len(self._exercises)
+
+    def resolve(self, name, lang=None):
+        """The id of an exercise called `name` (in `lang` first, then any language), or None."""
+        key = fold(name)
+        langs = [lang] if lang in self._names else []
+        langs += [other for other in LANGS if other != lang]
+        for candidate in langs:
+            exercise_id = self._names[candidate].get(key)
+            if exercise_id is not None:
+                return exercise_id
+        return None
+
+    def name(self, exercise_id, lang):
+        entry = self._exercises.get(exercise_id)
+        return (entry.get('name') or {}).get(lang) if entry is not None else None
+
+    def _machine_made(self, exercise_id, lang):
+        """The translator version a name came from, if a translation sync (not the dictionary) made it."""
+        return (self._exercises[exercise_id].get('synced') or {}).get(lang)
+
+    def search(self, query, lang=None, limit=10):
+        """Exercises with a name whose words start with every word of `query`, best first."""
+        with self._lock:
+            self._refresh()
+            if self._trie is None:
+                self._trie = PrefixTrie()
+                for exercise_id, entry in self._exercises.items():
+                    for name in (entry.get('name') or {}).values():
+                        if name:
+                            self._trie.add(name, exercise_id)
+            words = _WORD.findall(fold(query or ''))
+            if words:
+                ids = set.intersection(*(self._trie.find(word) for word in words))
+            else:
+                ids = set(self._exercises)
+            folded = fold(query or '')
+
+            def rank(exercise_id):
+                names = self._exercises[exercise_id].get('name') or {}
+                shown = fold(names.get(lang) or next(iter(names.values()), ''))
+                return (not shown.startswith(folded), shown)
+
+            return [self.get(exercise_id) for exercise_id in sorted(ids, key=rank)[:limit]]
+
+    # ----- Linking -----
+
+    def _register(self, name, lang, category):
+        base = exercise_key(name)
+        exercise_id, n = base, 2
+        while exercise_id in self._exercises:
+            exercise_id, n = f'{base}-{n}', n + 1
+        entry = {"name": {lang: name}, "category": category or ''}
+        self._exercises[exercise_id] = entry
+        self._index(exercise_id, entry)
+        self._trie = None
+        return exercise_id
+
+    def _learn(self, exercise_id, lang, name, synced):
+        """Set an exercise's name in `lang`; names from a translation sync are marked unless the dictionary's."""
+        entry = self._exercises[exercise_id]
+        names = entry.setdefault('name', {})
+        old = names.get(lang)
+        if old is not None and self._names[lang].get(fold(old)) == exercise_id:
+            del self._names[lang][fold(old)]
+        names[lang] = name
+        machine_made = entry.setdefault('synced', {})
+        source = next((names.get(other) for other in LANGS if other != lang and names.get(other)), None)
+        if synced and (source is None or translator.lookup(source.strip(), lang) != name.strip()):
+            machine_made[lang] = translator.cache_version()
+        else:
+            machine_made.pop(lang, None)
+        if not machine_made:
+            del entry['synced']
+        self._index(exercise_id, entry)
+        self._trie = None
+
+    def _link(self, exercise, lang, category, register, synced):
+        """(linked exercise, catalog changed); unlinked exercises come back unchanged."""
+        if isinstance(exercise, str):
+            name, fields = exercise, None
+        elif isinstance(exercise, dict) and isinstance(exercise.get('name'), str):
+            name, fields = exercise['name'], exercise
+        else:
+            return exercise, False
+        if not name.strip():
+            return exercise, False
+
+        changed = False
+        exercise_id = fields.get('id') if fields else None
+        if exercise_id in self._exercises and lang is not None:
+            known = self.name(exercise_id, lang)
+            machine_made = self._machine_made(exercise_id, lang)
+            if known is None:
+                # First name seen in this language (e.g. from a translation sync)
+                self._learn(exercise_id, lang, name, synced)
+                changed = True
+            elif fold(known) != fold(name):
+                other = self.resolve(name, lang)
+                if machine_made is not None and other in (None, exercise_id):
+                    # A better translation than the marked one
+                    self._learn(exercise_id, lang, name, synced)
+                    changed = True
+                else:
+                    exercise_id = None      # renamed to another exercise: match again
+            elif synced and machine_made is not None and machine_made != translator.cache_version():
+                # Translated again by a newer translator, with the same result
+                self._learn(exercise_id, lang, name, synced)
+                changed = True
+        elif exercise_id not in self._exercises:
+            exercise_id = None
+
+        if exercise_id is None:
+            exercise_id = self.resolve(name, lang)
+        if exercise_id is None:
+            if not register or lang is None:
+                return exercise, changed
+            exercise_id = self._register(name, lang, category)
+            changed = True
+
+        if fields is None:
+            return {"id": exercise_id, "name": name}, changed
+        if fields.get('id') == exercise_id:
+            return exercise, changed
+        return {"id": exercise_id, **{k: v for k, v in fields.items() if k != 'id'}}, changed
+
+    def link_day(self, day, lang=None, register=True, synced=False):
+        """
+        A copy of a gym day whose exercises carry catalog ids (plain-string
+        exercises become {"id", "name"} objects). Unknown exercises are
+        registered when `register` and `lang` are given, otherwise left
+        unlinked. `synced` says the day is a translation sync's output, whose
+        new names are marked (see above). Returns the day unchanged (same
+        object) if nothing changed.
+        """
+        if not isinstance(day, dict) or not isinstance(day.get('blocks'), list):
+            return day
+        with self._lock, self._file_lock():
+            self._refresh()
+            catalog_changed = False
+            blocks = []
+            for block in day['blocks']:
+                if not isinstance(block, dict) or not isinstance(block.get('exercises'), list):
+                    blocks.append(block)
+                    continue
+                exercises = []
+                for exercise in block['exercises']:
+                    linked, changed = self._link(exercise, lang, block.get('category'), register, synced)
+                    exercises.append(linked)
+                    catalog_changed |= changed
+                if any(new is not old for new, old in zip(exercises, block['exercises'])):
+                    block = {**block, 'exercises': exercises}
+                blocks.append(block)
+            if catalog_changed:
+                self._save()
+        if all(new is old for new, old in zip(blocks, day['blocks'])):
+            return day
+        return {**day, 'blocks': blocks}
+
+    # ----- Translation -----
+
+    def detach(self, day, target_lang):
+        """
+        Copy of a linked gym day with the names the catalog has in
+        `target_lang` blanked (so translation skips them), plus those names
+        as {(block index, exercise index): name} for attach(). Names marked
+        by an older translator version are translated again from the day.
+        """
+        names = {}
+        if not isinstance(day, dict) or not isinstance(day.get('blocks'), list):
+            return day, names
+        stale = {}
+        version = translator.cache_version()
+        with self._lock:
+            self._refresh()
+            blocks = []
+            for b, block in enumerate(day['blocks']):
+                if isinstance(block, dict) and isinstance(block.get('exercises'), list):
+                    exercises = []
+                    for e, exercise in enumerate(block['exercises']):
+                        exercise_id = exercise.get('id') if isinstance(exercise, dict) else None
+                        name = self.name(exercise_id, target_lang)
+                        if name and self._machine_made(exercise_id, target_lang) not in (None, version):
+                            if isinstance(exercise.get('name'), str) and exercise['name'].strip():
+                                stale[(b, e)] = exercise['name']
+                                exercise = {**exercise, 'name': ''}
+                        elif name:
+                            names[(b, e)] = name
+                            exercise = {**exercise, 'name': ''}
+                        exercises.append(exercise)
+                    block = {**block, 'exercises': exercises}
+                blocks.append(block)
+        if stale:
+            translations = translator.translate_batch(stale.values(), target_lang)
+            names.update({position: translations[name] for position, name in stale.items()})
+        return {**day, 'blocks': blocks}, names
+
+    @staticmethod
+    def attach(day, names):
+        """Put the names from detach() back into a (translated) day, in place."""
+        for (b, e), name in names.items():
+            day['blocks'][b]['exercises'][e]['name'] = name
+        return day
+
+    # ----- Extraction -----
+
+    def extract(self, data_dir):
+        """
+        Add every exercise of the default routines, pairing English and
+        Spanish names by position (same day, block and index). Returns how
+        many exercises were added.
+        """
+        store = JsonPlanStore(data_dir, DocumentCache())
+        en = store.read_plan('gym', 'en').data.get('weekly_routine') or {}
+        es = store.read_plan('gym', 'es').data.get('weekly_routine') or {}
+        with self._lock, self._file_lock():
+            self._refresh()
+            before = len(self._exercises)
+            for day, en_day in en.items():
+                es_blocks = (es.get(day) or {}).get('blocks') or []
+                for b, block in enumerate(en_day.get('blocks') or []):
+                    es_block = es_blocks[b] if b < len(es_blocks) and isinstance(es_blocks[b], dict) else {}
+                    es_exercises = es_block.get('exercises') or []
+                    for e, exercise in enumerate(block.get('exercises') or []):
+                        name = exercise if isinstance(exercise, str) else (exercise or {}).get('name')
+                        if not isinstance(name, str) or not name.strip():
+                            continue
+                        exercise_id = self.resolve(name, 'en') or self._register(name, 'en', block.get('category'))
+                        if self.name(exercise_id, 'es') is None:
+                            es_item = es_exercises[e] if e < len(es_exercises) else None
+                            es_name = es_item if isinstance(es_item, str) else (es_item or {}).get('name')
+                            es_name = es_name or translator.lookup(name, 'es')
+                            if es_name:
+                                self._exercises[exercise_id]['name']['es'] = es_name
+                                self._index(exercise_id, self._exercises[exercise_id])
+            self._trie = None
+            self._save()
+            return len(self._exercises) - before
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    data_dir = Path(os.environ.get('FITNESS_DATA_DIR', Path(__file__).parent.parent / 'data'))
+    if command != 'extract':
+        print("Usage: python exercise_catalog.py extract")
+        sys.exit(1)
+    catalog = ExerciseCatalog(data_dir / CATALOG_NAME)
+    added = catalog.extract(data_dir)
+    print(f"Added {added} exercise(s); the catalog has {len(catalog)} in {catalog.path}")
+
+
+if __name__ == '__main__':
+    main()
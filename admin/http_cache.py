@@ -0,0 +1,157 @@
+"""
+HTTP Response Cache for the Admin Server
+
+Serializes each API payload once per document version and keeps the body
+ready to send, together with:
+
+- A strong ETag (content hash) so polls can be answered with 304.
+- A Last-Modified date taken from the source files.
+- Lazily built gzip / brotli variants, compressed once per version.
+
+Brotli is optional: install the `brotli` package to enable it.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Response
+from werkzeug.http import http_date
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+DEFAULT_MAX_ENTRIES = 128
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+def encode_json(payload) -> bytes:
+    """Serialize a payload the way every cached API response is sent."""
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def content_etag(payload) -> str:
+    """Unquoted strong ETag of a payload, as sent by the cached GET routes."""
+    return hashlib.sha256(encode_json(payload)).hexdigest()[:32]
+
+
+def etag_matches(etags, etag) -> bool:
+    """True if a werkzeug ETags header set names `etag` in any of its encodings."""
+    return any(etags.contains_raw(f'"{etag}{suffix}"') for suffix in ('', '-gzip', '-br'))
+
+
+class CachedBody:
+    """A serialized response body and its precompressed variants."""
+
+    __slots__ = ('version', 'etag', 'last_modified', 'identity', '_encoded', '_lock')
+
+    def __init__(self, version, identity, last_modified=None):
+        self.version = version
+        self.identity = identity
+        self.etag = hashlib.sha256(identity).hexdigest()[:32]
+        self.last_modified = last_modified
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def variant_etag(self, encoding=None):
+        """Strong ETag for one representation (quoted)."""
+        if encoding:
+            return f'"{self.etag}-{encoding}"'
+        return f'"{self.etag}"'
+
+    def encoded(self, encoding):
+        """Return the body compressed with `encoding`, building it once."""
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    if encoding == 'br':
+                        body = brotli.compress(self.identity)
+                    else:
+                        body = gzip.compress(self.identity, compresslevel=6, mtime=0)
+                    self._encoded[encoding] = body
+        return body
+
+
+class ResponseCache:
+    """LRU cache of CachedBody objects keyed by route and document version."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build, last_modified=None) -> CachedBody:
+        """
+        Return the cached body for `key` at `version`.
+        `build` is only called (and its result serialized) on a version change.
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached.version == version:
+                self._entries.move_to_end(key)
+                return cached
+
+        with metrics.span('encode_json'):
+            cached = CachedBody(version, encode_json(build()), last_modified)
+        with self._lock:
+            self._entries[key] = cached
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cached
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _choose_encoding(req, size):
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    accepted = req.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _not_modified(req, cached):
+    if req.if_none_match:
+        return req.if_none_match.star_tag or etag_matches(req.if_none_match, cached.etag)
+    if req.if_modified_since and cached.last_modified is not None:
+        return int(cached.last_modified) <= int(req.if_modified_since.timestamp())
+    return False
+
+
+def make_response(req, cached: CachedBody, headers=None) -> Response:
+    """Build the Flask response for a cached body, honoring conditional headers."""
+    encoding = _choose_encoding(req, len(cached.identity))
+
+    if _not_modified(req, cached):
+        response = Response(status=304)
+    else:
+        body = cached.encoded(encoding) if encoding else cached.identity
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.headers['ETag'] = cached.variant_etag(encoding)
+    if cached.last_modified is not None:
+        response.headers['Last-Modified'] = http_date(cached.last_modified)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    if headers:
+        response.headers.update(headers)
+    return response
@@ -0,0 +1,243 @@
+"""
+JSON Patch for Plan Documents
+
+Applies RFC 6902 JSON Patch operations (add, remove, replace, move, copy,
+test) to plan documents, plus a simpler path/value form:
+
+    {"path": "/blocks/2/exercises/0/weight", "value": "60"}
+
+A path/value item without "op" is a "set": it creates or overwrites an
+object member, replaces an existing array element, or appends with "-".
+
+Patches never mutate their input. Only the containers along each patched
+path are copied; every other subtree is shared with the original document.
+
+diff() goes the other way: the operations that turn one document into
+another, as deep as the change (an edited weight is one "replace").
+"""
+
+
+class PatchError(ValueError):
+    """The patch is malformed or cannot be applied to the document."""
+
+
+class PatchConflict(PatchError):
+    """A "test" operation did not match the document."""
+
+
+OPERATIONS = ('add', 'remove', 'replace', 'move', 'copy', 'test', 'set')
+
+_MISSING = object()
+
+
+def escape(token):
+    """Escape one reference token for a JSON Pointer."""
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def parse_pointer(pointer):
+    """Split an RFC 6901 JSON Pointer into unescaped reference tokens."""
+    if not isinstance(pointer, str):
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise PatchError(f"JSON pointer must start with '/': {pointer!r}")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def normalize(patch):
+    """
+    Validate a request body and return it as a list of operation dicts.
+    Accepts a JSON Patch array, a single operation, or the path/value form.
+    """
+    if isinstance(patch, dict):
+        patch = [patch]
+    if not isinstance(patch, list) or not patch:
+        raise PatchError("Patch must be a non-empty list of operations")
+
+    ops = []
+    for item in patch:
+        if not isinstance(item, dict) or 'path' not in item:
+            raise PatchError(f"Invalid patch operation: {item!r}")
+        op = dict(item)
+        op.setdefault('op', 'set')
+        if op['op'] not in OPERATIONS:
+            raise PatchError(f"Unsupported patch operation: {op['op']!r}")
+        if op['op'] in ('add', 'replace', 'test', 'set') and 'value' not in op:
+            raise PatchError(f"'{op['op']}' operation requires a value")
+        if op['op'] in ('move', 'copy') and 'from' not in op:
+            raise PatchError(f"'{op['op']}' operation requires 'from'")
+        parse_pointer(op['path'])
+        if 'from' in op:
+            parse_pointer(op['from'])
+        ops.append(op)
+    return ops
+
+
+def _index(container, token, allow_end=False):
+    if token == '-' and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == '0'):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if index > limit:
+        raise PatchError(f"Array index out of range: {token}")
+    return index
+
+
+def get(doc, pointer):
+    """Return the value at a JSON pointer."""
+    node = doc
+    for token in parse_pointer(pointer):
+        if isinstance(node, dict):
+            if token not in node:
+                raise PatchError(f"Path not found: {pointer}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_index(node, token)]
+        else:
+            raise PatchError(f"Path not found: {pointer}")
+    return node
+
+
+def _copy_to_parent(doc, tokens):
+    """Copy the containers from the root down to the parent of `tokens`."""
+    root = doc.copy() if isinstance(doc, (dict, list)) else doc
+    node = root
+    for token in tokens[:-1]:
+        if isinstance(node, dict):
+            if token not in node:
+                raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+            child = node[token]
+            key = token
+        elif isinstance(node, list):
+            key = _index(node, token)
+            child = node[key]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+        if not isinstance(child, (dict, list)):
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+        child = child.copy()
+        node[key] = child
+        node = child
+    return root, node
+
+
+def _add(doc, pointer, value, mode='add'):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        return value
+    root, parent = _copy_to_parent(doc, tokens)
+    token = tokens[-1]
+    if isinstance(parent, dict):
+        if mode == 'replace' and token not in parent:
+            raise PatchError(f"Path not found: {pointer}")
+        parent[token] = value
+    elif isinstance(parent, list):
+        if mode == 'add':
+            parent.insert(_index(parent, token, allow_end=True), value)
+        elif mode == 'set' and token == '-':
+            parent.append(value)
+        else:
+            parent[_index(parent, token)] = value
+    else:
+        raise PatchError(f"Path not found: {pointer}")
+    return root
+
+
+def _remove(doc, pointer):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise PatchError("Cannot remove the document root")
+    root, parent = _copy_to_parent(doc, tokens)
+    token = tokens[-1]
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchError(f"Path not found: {pointer}")
+        del parent[token]
+    elif isinstance(parent, list):
+        del parent[_index(parent, token)]
+    else:
+        raise PatchError(f"Path not found: {pointer}")
+    return root
+
+
+def apply_operation(doc, op):
+    """Apply one normalized operation and return the new document."""
+    kind = op['op']
+    if kind in ('add', 'replace', 'set'):
+        return _add(doc, op['path'], op['value'], kind)
+    if kind == 'remove':
+        return _remove(doc, op['path'])
+    if kind == 'copy':
+        return _add(doc, op['path'], get(doc, op['from']))
+    if kind == 'move':
+        if op['path'].startswith(op['from'] + '/'):
+            raise PatchError("Cannot move a value into one of its children")
+        value = get(doc, op['from'])
+        return _add(_remove(doc, op['from']), op['path'], value)
+    if kind == 'test':
+        if get(doc, op['path']) != op['value']:
+            raise PatchConflict(f"Test failed at {op['path']}")
+        return doc
+    raise PatchError(f"Unsupported patch operation: {kind!r}")
+
+
+def apply_patch(doc, ops):
+    """Apply a list of operations atomically: all of them, or none (PatchError)."""
+    for op in ops:
+        doc = apply_operation(doc, op)
+    return doc
+
+
+def _equal(a, b):
+    """JSON equality (Python's has True == 1)."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_equal(value, b[key]) for key, value in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(map(_equal, a, b))
+    return a == b
+
+
+def _diff(old, new, pointer, ops):
+    if _equal(old, new):
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{pointer}/{escape(key)}"})
+        for key, value in new.items():
+            path = f"{pointer}/{escape(key)}"
+            if key in old:
+                _diff(old[key], value, path, ops)
+            else:
+                ops.append({"op": "add", "path": path, "value": value})
+    elif isinstance(old, list) and isinstance(new, list):
+        # Elements kept at the start and end are left alone, so an insertion
+        # or removal is one operation
+        start = 0
+        while start < min(len(old), len(new)) and _equal(old[start], new[start]):
+            start += 1
+        old_end, new_end = len(old), len(new)
+        while old_end > start and new_end > start and _equal(old[old_end - 1], new[new_end - 1]):
+            old_end, new_end = old_end - 1, new_end - 1
+        common = min(old_end, new_end) - start
+        for i in range(start, start + common):
+            _diff(old[i], new[i], f"{pointer}/{i}", ops)
+        for i in reversed(range(start + common, old_end)):
+            ops.append({"op": "remove", "path": f"{pointer}/{i}"})
+        for i in range(start + common, new_end):
+            ops.append({"op": "add", "path": f"{pointer}/{i}", "value": new[i]})
+    else:
+        ops.append({"op": "replace", "path": pointer, "value": new})
+
+
+def diff(old, new):
+    """Operations that turn `old` into `new` (apply_patch(old, diff(old, new)) == new)."""
+    ops = []
+    _diff(old, new, '', ops)
+    return ops
@@ -0,0 +1,250 @@
+"""
+Data Migrations
+Numbered, idempotent schema migrations for the plan documents.
+
+Every migration has a number and applies to one plan ('gym' or 'diet').
+It receives one day object at a time (from a main plan file or a day file)
+and the MigrationContext of the run, changes the day in place and returns
+True if it changed anything. Running a migration twice must be harmless.
+
+Each document records the schema it is at as a top-level "schema_version".
+A run brings every document, the default data and every athlete's (see
+tenants.py), up to SCHEMA_VERSION:
+
+- Files that have not changed since the last run (per the content-hash
+  manifest in data/.migrations.json) are skipped without being parsed.
+- Every other file is parsed once, passed through all its pending
+  migrations and serialized once. Files are processed in parallel in a
+  process pool.
+- All rewritten files are committed as one transaction.
+
+Usage: python migrate.py [--dry-run] [--force] [--jobs N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import storage
+import templates
+from doc_cache import DocumentCache
+from exercise_catalog import CATALOG_NAME, ExerciseCatalog
+from plan_store import DAYS, LANGS, PLANS, JsonPlanStore
+from tenants import namespaces
+
+BASE_DIR = Path(__file__).parent.parent
+DATA_DIR = BASE_DIR / 'data'
+MANIFEST_NAME = '.migrations.json'
+
+# Below this many files a process pool costs more than it saves
+MIN_PARALLEL_FILES = 8
+
+MIGRATIONS = []
+
+
+def migration(number, plan, description):
+    """Register a migration (numbers must be unique and increasing)."""
+    def register(fn):
+        if MIGRATIONS and number <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {number} is out of order")
+        MIGRATIONS.append((number, plan, description, fn))
+        return fn
+    return register
+
+
+class MigrationContext:
+    """What migrations may need besides the day: the run's data directory and catalog."""
+
+    def __init__(self, data_dir):
+        self.data_dir = Path(data_dir)
+
+    @property
+    def catalog(self):
+        return _open_catalog(self.data_dir / CATALOG_NAME)
+
+
+@lru_cache(maxsize=4)
+def _open_catalog(path):
+    # One per worker process; reloads by itself if the file changes
+    return ExerciseCatalog(path)
+
+
+# ===== Migrations =====
+
+STRENGTH_CATEGORIES = ['Strength', 'Fuerza']
+
+
+@migration(1, 'gym', "Exercises get a weight field; strength block strings become objects")
+def add_exercise_weights(day, context):
+    changed = False
+    for block in day.get('blocks') or []:
+        if not isinstance(block, dict) or 'exercises' not in block:
+            continue
+        is_strength = block.get('category') in STRENGTH_CATEGORIES
+        exercises = []
+        for exercise in block['exercises']:
+            if isinstance(exercise, dict):
+                if 'weight' not in exercise:
+                    exercise['weight'] = ""
+                    changed = True
+            elif isinstance(exercise, str) and is_strength:
+                exercise = {"name": exercise, "sets": "", "reps": "", "weight": ""}
+                changed = True
+            exercises.append(exercise)
+        block['exercises'] = exercises
+    return changed
+
+
+@migration(2, 'gym', "Exercises reference the exercise catalog by id")
+def link_exercise_catalog(day, context):
+    # Only exercises the catalog knows (python exercise_catalog.py extract);
+    # the rest are linked, and registered, the next time their day is saved
+    linked = context.catalog.link_day(day, register=False)
+    if linked is day:
+        return False
+    day['blocks'] = linked['blocks']
+    return True
+
+
+SCHEMA_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# ===== Runner =====
+
+def documents(data_dir):
+    """Every existing plan document as (path, plan, is_main)."""
+    found = []
+    for directory in namespaces(data_dir):
+        store = JsonPlanStore(directory, DocumentCache())
+        for plan in PLANS:
+            for lang in LANGS:
+                candidates = [(store.main_path(plan, lang), True)]
+                candidates += [(store.day_path(plan, lang, day), False) for day in DAYS]
+                found += [(path, plan, is_main) for path, is_main in candidates if path.exists()]
+    return found
+
+
+def migrate_document(path, plan, is_main, target=SCHEMA_VERSION, force=False, data_dir=DATA_DIR):
+    """
+    Bring one file up to `target` (runs in a worker process). `data_dir` is
+    the root data directory, also for files of an athlete.
+    Returns (path, new bytes or None, sha256 of the final content, applied numbers).
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw)
+    current = 0 if force else data.get('schema_version', 0)
+    if current >= target:
+        return path, None, hashlib.sha256(raw).hexdigest(), []
+
+    shared = None
+    if is_main:
+        days = [d for d in (data.get(PLANS[plan]['collection']) or {}).values() if isinstance(d, dict)]
+        library = data.get(templates.LIBRARY)
+        if isinstance(library, dict) and library:
+            # Shared blocks (see templates.py) are migrated as the blocks of one more day
+            shared = {PLANS[plan]['blocks']: list(library.values())}
+            days.append(shared)
+    else:
+        days = [data]
+
+    context = MigrationContext(data_dir)
+    applied = []
+    for number, migration_plan, _, fn in MIGRATIONS:
+        if current < number <= target and migration_plan == plan:
+            if any([fn(day, context) for day in days]):
+                applied.append(number)
+    if shared is not None:
+        data[templates.LIBRARY] = dict(zip(library, shared[PLANS[plan]['blocks']]))
+    data['schema_version'] = target
+    body = storage.encode_document(data)
+    return path, body, hashlib.sha256(body).hexdigest(), applied
+
+
+def _signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_manifest(data_dir):
+    try:
+        with open(Path(data_dir) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _up_to_date(path, entry):
+    """True if the manifest says `path` is at SCHEMA_VERSION and it has not changed since."""
+    if not entry or entry.get('schema_version') != SCHEMA_VERSION:
+        return False
+    if entry.get('signature') == _signature(path):
+        return True
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest() == entry.get('sha256')
+
+
+def run(data_dir=DATA_DIR, dry_run=False, force=False, jobs=None):
+    """Migrate every document; returns {relative path: applied migration numbers}."""
+    data_dir = Path(data_dir)
+    manifest = {} if force else load_manifest(data_dir)
+    found = documents(data_dir)
+    pending = [(path, plan, is_main) for path, plan, is_main in found
+               if not _up_to_date(path, manifest.get(path.relative_to(data_dir).as_posix()))]
+    print(f"  {len(pending)} file(s) to check, {len(found) - len(pending)} unchanged since the last run")
+
+    args = [(path, plan, is_main, SCHEMA_VERSION, force, data_dir) for path, plan, is_main in pending]
+    if len(args) >= MIN_PARALLEL_FILES and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(migrate_document, *zip(*args)))
+    else:
+        results = [migrate_document(*a) for a in args]
+
+    changes = {}
+    tx = storage.Transaction(data_dir)
+    for path, body, digest, applied in results:
+        relative = path.relative_to(data_dir).as_posix()
+        if body is not None:
+            changes[relative] = applied
+            tx.write(path, body)
+            detail = ', '.join(f'#{n}' for n in applied) or 'version stamp'
+            print(f"  {'Would migrate' if dry_run else 'Migrated'} {relative} ({detail})")
+        manifest[relative] = {"schema_version": SCHEMA_VERSION, "sha256": digest}
+
+    if dry_run:
+        return changes
+
+    tx.commit()
+    for path, _, _, _ in results:
+        manifest[path.relative_to(data_dir).as_posix()]["signature"] = _signature(path)
+    storage.write_atomic(data_dir / MANIFEST_NAME, manifest)
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate plan documents to the current schema.")
+    parser.add_argument('--dry-run', action='store_true', help="show what would change, write nothing")
+    parser.add_argument('--force', action='store_true', help="ignore stamps and the manifest, rerun everything")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--data-dir', type=Path, default=DATA_DIR)
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print(f"  DATA MIGRATIONS (schema version {SCHEMA_VERSION})")
+    print("=" * 50)
+    for number, plan, description, _ in MIGRATIONS:
+        print(f"  #{number} [{plan}] {description}")
+    print()
+
+    changes = run(args.data_dir, dry_run=args.dry_run, force=args.force, jobs=args.jobs)
+
+    print(f"\n  {len(changes)} file(s) {'would be ' if args.dry_run else ''}rewritten")
+    print("=" * 50)
+
+
+if __name__ == '__main__':
+    main()
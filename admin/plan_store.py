@@ -0,0 +1,706 @@
+"""
+Plan Storage Backends
+
+The admin server reads and writes plans through a small store interface so
+the on-disk representation can change without touching the routes:
+
+- JsonPlanStore: the original layout. Each plan is kept as a main file plus
+  one file per day, per language (e.g. gym-routine.json, gym-routine/<day>.json,
+  gym-routine-es/gym-routine.json, gym-routine-es/<day>.json).
+- SqlitePlanStore: a single SQLite database as the source of truth, with
+  rows per plan, day, block and item. Saving a day rewrites only that day's
+  rows. The JSON layout becomes an export target (export_plan).
+
+Both stores expose:
+
+    read_plan(plan, lang, raw=False) / read_day(plan, lang, day, raw=False) -> StoredDocument
+    versions(plan, lang) -> {"version": n, "days": {day: n}}
+    write(plan, lang, days, plan_data=None, shared_blocks=None) -> new versions (call under lock)
+    write_many([(plan, lang, days, plan_data, shared_blocks), ...]) -> {(plan, lang): new versions}
+    lock(plan, lang)
+    close()   (release connections; the store reconnects if used again)
+
+Days may be templated (see templates.py). Reads return them resolved
+unless raw=True; a write also bumps the versions of the days that depend on
+what it changed. In the JSON layout the main file keeps the days as written
+and the day files, which the public site reads, hold them resolved.
+
+Usage (copy the JSON data into SQLite, or export it back):
+    python plan_store.py import
+    python plan_store.py export
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import storage
+import templates
+
+# Layout of each plan: main file name, day folder, weekly key, and the
+# block / item lists inside a day (diet meals and foods map onto them)
+PLANS = {
+    'gym': {'main': 'gym-routine.json', 'folder': 'gym-routine', 'collection': 'weekly_routine',
+            'blocks': 'blocks', 'items': 'exercises'},
+    'diet': {'main': 'diet-plan.json', 'folder': 'diet-plan', 'collection': 'weekly_diet',
+             'blocks': 'meals', 'items': 'foods'},
+}
+
+LANGS = ('en', 'es')
+
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+class StoredDocument:
+    """
+    A document read from a store.
+    `tag` is a hashable token that changes whenever the content changes (used
+    to key response caches); `last_modified` is an epoch timestamp or None.
+    """
+
+    __slots__ = ('data', 'tag', 'last_modified')
+
+    def __init__(self, data, tag, last_modified=None):
+        self.data = data
+        self.tag = tag
+        self.last_modified = last_modified
+
+
+def other_lang(lang):
+    return 'en' if lang == 'es' else 'es'
+
+
+def update_library(plan_data, shared_blocks):
+    """The plan's template library with `shared_blocks` ({id: block or None}) applied."""
+    library = dict(plan_data.get(templates.LIBRARY) or {})
+    for block_id, block in shared_blocks.items():
+        if block is None:
+            library.pop(block_id, None)
+        else:
+            library[block_id] = block
+    return library
+
+
+# ===== JSON Files =====
+
+def _check_writes(writes):
+    keys = [(plan, lang) for plan, lang, *_ in writes]
+    if len(set(keys)) != len(keys):
+        raise ValueError("write_many() takes each plan and language once")
+    for plan, lang, days, plan_data, _ in writes:
+        if lang not in LANGS:
+            raise ValueError(f"Unknown language: {lang}")
+        # A day name is a file name (see JsonPlanStore.day_path)
+        if plan_data is not None:
+            days = plan_data.get(PLANS[plan]['collection']) or {}
+        unknown = [day for day in days if day not in DAYS]
+        if unknown:
+            raise ValueError(f"Unknown day(s) for {plan}: {', '.join(map(str, unknown))}")
+
+
+class JsonPlanStore:
+    """The main-file + day-file layout under the data directory."""
+
+    name = 'json'
+
+    def __init__(self, data_dir, cache):
+        self.data_dir = Path(data_dir)
+        self.cache = cache
+        self._resolved = {}   # (plan, lang) -> (main file cache entry version, resolved days)
+
+    # ----- Paths -----
+
+    def main_path(self, plan, lang):
+        """Path of a plan's main (weekly) file for a language."""
+        layout = PLANS[plan]
+        if lang == 'es':
+            return self.data_dir / f"{layout['folder']}-es" / layout['main']
+        return self.data_dir / layout['main']
+
+    def day_path(self, plan, lang, day):
+        """Path of a plan's individual day file for a language."""
+        layout = PLANS[plan]
+        folder = f"{layout['folder']}-es" if lang == 'es' else layout['folder']
+        return self.data_dir / folder / f'{day}.json'
+
+    def versions_path(self, plan, lang):
+        return self.data_dir / '.versions' / f'{plan}-{lang}.json'
+
+    def lock(self, plan, lang):
+        """Lock for read-modify-write of one plan in one language (threads and processes)."""
+        return storage.document_lock(plan, lang, lock_dir=self.data_dir / '.locks')
+
+    def close(self):
+        pass
+
+    # ----- Reads -----
+
+    def _entry(self, filepath):
+        try:
+            return self.cache.get_entry(filepath)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError as e:
+            print(f"Error decoding JSON from {filepath}: {e}")
+            return None
+
+    def _load(self, filepath):
+        entry = self._entry(filepath)
+        return entry.data if entry is not None else {}
+
+    @staticmethod
+    def _tag(entries):
+        return tuple(entry.version if entry is not None else 0 for entry in entries)
+
+    @staticmethod
+    def _last_modified(entries):
+        mtimes = [entry.signature[0] for entry in entries if entry is not None]
+        return max(mtimes) / 1e9 if mtimes else None
+
+    def _resolved_days(self, plan, lang, entry):
+        """The days of a main file entry with templates resolved, memoized per entry version."""
+        memo = self._resolved.get((plan, lang))
+        if memo is not None and memo[0] == entry.version:
+            return memo[1]
+        days = entry.data.get(PLANS[plan]['collection']) or {}
+        try:
+            days = templates.resolve_days(PLANS[plan], days, entry.data.get(templates.LIBRARY) or {})
+        except templates.TemplateError as e:
+            # Only a hand-edited file gets here: writes check references
+            print(f"Error resolving {plan} ({lang}) templates: {e}")
+        self._resolved[(plan, lang)] = (entry.version, days)
+        return days
+
+    def read_plan(self, plan, lang, raw=False):
+        entry = self._entry(self.main_path(plan, lang))
+        if entry is not None and entry.data:
+            data = entry.data
+            if not raw:
+                collection = PLANS[plan]['collection']
+                days = self._resolved_days(plan, lang, entry)
+                if days is not data.get(collection, days):
+                    data = {**data, collection: days}
+            return StoredDocument(data, ('main',) + self._tag([entry]),
+                                  self._last_modified([entry]))
+
+        # Fallback: assemble the plan from individual day files (stored resolved)
+        day_entries = [self._entry(self.day_path(plan, lang, day)) for day in DAYS]
+        data = {PLANS[plan]['collection']: {
+            day: e.data for day, e in zip(DAYS, day_entries) if e is not None and e.data
+        }}
+        return StoredDocument(data, ('days',) + self._tag(day_entries),
+                              self._last_modified(day_entries))
+
+    def read_day(self, plan, lang, day, raw=False):
+        entry = self._entry(self.main_path(plan, lang))
+        collection = (entry.data.get(PLANS[plan]['collection']) or {}) if entry is not None else {}
+        if day in collection:
+            data = collection[day] if raw else self._resolved_days(plan, lang, entry)[day]
+            return StoredDocument(data, ('main',) + self._tag([entry]),
+                                  self._last_modified([entry]))
+
+        # Fallback to individual day file
+        entry = self._entry(self.day_path(plan, lang, day))
+        data = entry.data if entry is not None and entry.data else None
+        return StoredDocument(data, ('file',) + self._tag([entry]), self._last_modified([entry]))
+
+    def versions(self, plan, lang):
+        data = self._load(self.versions_path(plan, lang))
+        return {"version": data.get("version", 0), "days": dict(data.get("days") or {})}
+
+    # ----- Writes -----
+
+    def _bump(self, plan, lang, days):
+        versions = self.versions(plan, lang)
+        versions["version"] += 1
+        for day in days:
+            versions["days"][day] = versions["days"].get(day, 0) + 1
+        return versions
+
+    def write(self, plan, lang, days, plan_data=None, shared_blocks=None):
+        """
+        Commit days ({day: data}) of a plan, or replace the whole plan document
+        with `plan_data`, as one atomic transaction together with its version
+        record. `shared_blocks` ({id: block, or None to delete}) updates the
+        plan's template library. Days depending on what changed get new
+        versions and re-rendered day files. Returns the new versions. Call
+        under lock(plan, lang); raises TemplateError before writing anything
+        if a reference would be left dangling.
+        """
+        return self.write_many([(plan, lang, days, plan_data, shared_blocks)])[plan, lang]
+
+    def write_many(self, writes):
+        """
+        write() for several plans and languages, (plan, lang, days, plan_data,
+        shared_blocks) each, committed as one transaction: every file of
+        every plan is replaced, or none. Call under the lock of each.
+        """
+        _check_writes(writes)
+        files, versions = {}, {}
+        for plan, lang, days, plan_data, shared_blocks in writes:
+            versions[plan, lang] = self._stage(files, plan, lang, days, plan_data, shared_blocks)
+        try:
+            with storage.Transaction(self.data_dir, on_commit=self.cache.put) as tx:
+                for filepath, data in files.items():
+                    if data is None:
+                        tx.delete(filepath)
+                    else:
+                        tx.write(filepath, data)
+        except Exception:
+            for filepath in files:
+                self.cache.invalidate(filepath)
+            raise
+        return versions
+
+    def _stage(self, files, plan, lang, days, plan_data, shared_blocks):
+        """Add the files a write() changes (None: deleted) to `files`; returns the new versions."""
+        layout = PLANS[plan]
+        collection = layout['collection']
+        if plan_data is not None:
+            main_data = plan_data
+            days = dict(plan_data.get(collection) or {})
+        else:
+            # Copy the cached document before changing it
+            main_data = dict(self._load(self.main_path(plan, lang)))
+            main_data[collection] = dict(main_data.get(collection) or {})
+            main_data[collection].update(days)
+        if shared_blocks:
+            main_data = {**main_data, templates.LIBRARY: update_library(main_data, shared_blocks)}
+
+        stored = main_data.get(collection) or {}
+        library = main_data.get(templates.LIBRARY) or {}
+        changed = list(days) + sorted(templates.dependents(layout, stored, days, shared_blocks or ()))
+        memo = {}
+        rendered = {day: templates.resolve_day(layout, stored, library, day, memo) for day in changed}
+
+        versions = self._bump(plan, lang, rendered)
+        files[self.main_path(plan, lang)] = main_data
+        for day, day_data in rendered.items():
+            files[self.day_path(plan, lang, day)] = day_data
+        if plan_data is not None:
+            # Days left out of a whole-plan save are dropped, day files included
+            for day in DAYS:
+                path = self.day_path(plan, lang, day)
+                if day not in stored and path.exists():
+                    files[path] = None
+        files[self.versions_path(plan, lang)] = versions
+        return versions
+
+
+# ===== SQLite =====
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    plan       TEXT NOT NULL,
+    lang       TEXT NOT NULL,
+    version    INTEGER NOT NULL,
+    fields     TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (plan, lang)
+);
+CREATE TABLE IF NOT EXISTS days (
+    plan       TEXT NOT NULL,
+    lang       TEXT NOT NULL,
+    day        TEXT NOT NULL,
+    position   INTEGER NOT NULL,
+    version    INTEGER NOT NULL,
+    fields     TEXT NOT NULL,
+    block_key  TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (plan, lang, day)
+);
+-- Last version of days a whole-plan save dropped, so a day created again
+-- continues from it (day versions never repeat)
+CREATE TABLE IF NOT EXISTS dropped_days (
+    plan       TEXT NOT NULL,
+    lang       TEXT NOT NULL,
+    day        TEXT NOT NULL,
+    version    INTEGER NOT NULL,
+    PRIMARY KEY (plan, lang, day)
+);
+CREATE INDEX IF NOT EXISTS days_by_day ON days (day, lang);
+CREATE INDEX IF NOT EXISTS days_by_lang ON days (lang, plan, position);
+CREATE TABLE IF NOT EXISTS blocks (
+    plan       TEXT NOT NULL,
+    lang       TEXT NOT NULL,
+    day        TEXT NOT NULL,
+    position   INTEGER NOT NULL,
+    fields     TEXT NOT NULL,
+    item_key   TEXT,
+    PRIMARY KEY (plan, lang, day, position)
+);
+CREATE TABLE IF NOT EXISTS items (
+    plan       TEXT NOT NULL,
+    lang       TEXT NOT NULL,
+    day        TEXT NOT NULL,
+    block      INTEGER NOT NULL,
+    position   INTEGER NOT NULL,
+    value      TEXT NOT NULL,
+    PRIMARY KEY (plan, lang, day, block, position)
+);
+"""
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+class SqlitePlanStore:
+    """
+    Plans stored as rows: plans -> days -> blocks -> items (gym blocks and
+    exercises, diet meals and foods). Every row keeps its remaining fields
+    as JSON, with the child list replaced by null to preserve key order.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path, lock_dir=None):
+        self.db_path = str(db_path)
+        self.lock_dir = lock_dir
+        self._local = threading.local()
+        self._memo_lock = threading.Lock()
+        self._connections = []   # every thread's connection, for close()
+        self._generation = 0     # bumped by close(); older thread connections are reopened
+        self._plan_memo = {}   # (plan, lang, raw) -> (version, data)
+        self._day_memo = {}    # (plan, lang, day) -> (version, data as stored)
+        self._resolved_memo = {}   # (plan, lang, day) -> (version, resolved data)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.generation != self._generation:
+            # Used by this thread only; close() may close it from another
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._memo_lock:
+                self._connections.append(conn)
+                self._local.conn, self._local.generation = conn, self._generation
+        return conn
+
+    def lock(self, plan, lang):
+        return storage.document_lock('db', plan, lang, lock_dir=self.lock_dir)
+
+    def close(self):
+        """Close every thread's connection; a thread using the store again opens a new one."""
+        with self._memo_lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for conn in connections:
+            conn.close()
+
+    def is_empty(self):
+        return self._connect().execute("SELECT COUNT(*) FROM plans").fetchone()[0] == 0
+
+    # ----- Row encoding -----
+
+    @staticmethod
+    def _split_day(layout, day_data):
+        """Return (fields_json, block_key, [(fields_json, item_key, [item_json])])."""
+        block_key, item_key = layout['blocks'], layout['items']
+        if not isinstance(day_data, dict) or not isinstance(day_data.get(block_key), list):
+            return _dumps(day_data), None, []
+        fields = dict(day_data)
+        blocks = fields[block_key]
+        fields[block_key] = None
+        rows = []
+        for block in blocks:
+            if isinstance(block, dict) and isinstance(block.get(item_key), list):
+                block_fields = dict(block)
+                items = block_fields[item_key]
+                block_fields[item_key] = None
+                rows.append((_dumps(block_fields), item_key, [_dumps(item) for item in items]))
+            else:
+                rows.append((_dumps(block), None, []))
+        return _dumps(fields), block_key, rows
+
+    def _assemble_day(self, fields, block_key, block_rows, item_rows):
+        day_data = json.loads(fields)
+        if block_key is None:
+            return day_data
+        items_by_block = {}
+        for block, value in item_rows:
+            items_by_block.setdefault(block, []).append(json.loads(value))
+        blocks = []
+        for position, block_fields, item_key in block_rows:
+            block = json.loads(block_fields)
+            if item_key is not None:
+                block[item_key] = items_by_block.get(position, [])
+            blocks.append(block)
+        day_data[block_key] = blocks
+        return day_data
+
+    # ----- Reads -----
+
+    def versions(self, plan, lang):
+        conn = self._connect()
+        row = conn.execute("SELECT version FROM plans WHERE plan = ? AND lang = ?", (plan, lang)).fetchone()
+        # Like the JSON store's versions file, dropped days keep their last version
+        days = dict(conn.execute("SELECT day, version FROM dropped_days WHERE plan = ? AND lang = ?",
+                                 (plan, lang)))
+        days.update(conn.execute("SELECT day, version FROM days WHERE plan = ? AND lang = ?", (plan, lang)))
+        return {"version": row[0] if row else 0, "days": days}
+
+    def _templates(self, plan, lang):
+        """(days as stored, library) of a plan, for resolving templates."""
+        conn = self._connect()
+        row = conn.execute("SELECT fields FROM plans WHERE plan = ? AND lang = ?", (plan, lang)).fetchone()
+        library = (json.loads(row[0]).get(templates.LIBRARY) or {}) if row else {}
+        days = {day: self.read_day(plan, lang, day, raw=True).data for (day,) in conn.execute(
+            "SELECT day FROM days WHERE plan = ? AND lang = ?", (plan, lang)).fetchall()}
+        return days, library
+
+    def read_day(self, plan, lang, day, raw=False):
+        doc = self._read_stored_day(plan, lang, day)
+        if raw or not templates.is_templated(PLANS[plan], doc.data):
+            return doc
+        version = doc.tag[1]
+        key = (plan, lang, day)
+        with self._memo_lock:
+            memo = self._resolved_memo.get(key)
+        if memo is not None and memo[0] == version:
+            return StoredDocument(memo[1], doc.tag, doc.last_modified)
+
+        days, library = self._templates(plan, lang)
+        data = templates.resolve_day(PLANS[plan], days, library, day)
+        with self._memo_lock:
+            self._resolved_memo[key] = (version, data)
+        return StoredDocument(data, doc.tag, doc.last_modified)
+
+    def _read_stored_day(self, plan, lang, day):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT version, fields, block_key, updated_at FROM days WHERE plan = ? AND lang = ? AND day = ?",
+            (plan, lang, day)).fetchone()
+        if row is None:
+            return StoredDocument(None, ('sqlite', 0))
+        version, fields, block_key, updated_at = row
+        key = (plan, lang, day)
+        with self._memo_lock:
+            memo = self._day_memo.get(key)
+        if memo is not None and memo[0] == version:
+            return StoredDocument(memo[1], ('sqlite', version), updated_at)
+
+        block_rows = conn.execute(
+            "SELECT position, fields, item_key FROM blocks WHERE plan = ? AND lang = ? AND day = ? "
+            "ORDER BY position", key).fetchall()
+        item_rows = conn.execute(
+            "SELECT block, value FROM items WHERE plan = ? AND lang = ? AND day = ? "
+            "ORDER BY block, position", key).fetchall()
+        data = self._assemble_day(fields, block_key, block_rows, item_rows)
+        with self._memo_lock:
+            self._day_memo[key] = (version, data)
+        return StoredDocument(data, ('sqlite', version), updated_at)
+
+    def read_plan(self, plan, lang, raw=False):
+        conn = self._connect()
+        row = conn.execute("SELECT version, fields, updated_at FROM plans WHERE plan = ? AND lang = ?",
+                           (plan, lang)).fetchone()
+        if row is None:
+            return StoredDocument({}, ('sqlite', 0))
+        version, fields, updated_at = row
+        with self._memo_lock:
+            memo = self._plan_memo.get((plan, lang, raw))
+        if memo is not None and memo[0] == version:
+            return StoredDocument(memo[1], ('sqlite', version), updated_at)
+
+        data = json.loads(fields)
+        days = conn.execute("SELECT day FROM days WHERE plan = ? AND lang = ? ORDER BY position",
+                            (plan, lang)).fetchall()
+        data[PLANS[plan]['collection']] = {day: self.read_day(plan, lang, day, raw=raw).data for (day,) in days}
+        with self._memo_lock:
+            self._plan_memo[(plan, lang, raw)] = (version, data)
+        return StoredDocument(data, ('sqlite', version), updated_at)
+
+    # ----- Writes -----
+
+    def write(self, plan, lang, days, plan_data=None, shared_blocks=None):
+        """
+        Write days ({day: data}), or replace the whole plan with `plan_data`,
+        in one SQLite transaction. Only the rows of the given days change;
+        `shared_blocks` ({id: block, or None to delete}) updates the template
+        library, and days depending on what changed only get new versions.
+        Returns the new versions; raises TemplateError (and writes nothing)
+        if a reference would be left dangling.
+        """
+        return self.write_many([(plan, lang, days, plan_data, shared_blocks)])[plan, lang]
+
+    def write_many(self, writes):
+        """
+        write() for several plans and languages, (plan, lang, days, plan_data,
+        shared_blocks) each, in one SQLite transaction.
+        """
+        _check_writes(writes)
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for plan, lang, days, plan_data, shared_blocks in writes:
+                self._write_plan_rows(conn, now, plan, lang, days, plan_data, shared_blocks)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return {(plan, lang): self.versions(plan, lang) for plan, lang, *_ in writes}
+
+    def _write_plan_rows(self, conn, now, plan, lang, days, plan_data, shared_blocks):
+        layout = PLANS[plan]
+        collection = layout['collection']
+        row = conn.execute("SELECT version, fields FROM plans WHERE plan = ? AND lang = ?",
+                           (plan, lang)).fetchone()
+        if plan_data is not None:
+            days = dict(plan_data.get(collection) or {})
+            fields = dict(plan_data)
+            fields[collection] = None
+            fields = _dumps(fields)
+            # Days missing from the new document are dropped
+            existing = [d for (d,) in conn.execute(
+                "SELECT day FROM days WHERE plan = ? AND lang = ?", (plan, lang))]
+            for day in existing:
+                if day not in days:
+                    self._delete_day_rows(conn, plan, lang, day, including_day=True)
+        else:
+            fields = row[1] if row else _dumps({collection: None})
+        if shared_blocks:
+            fields = json.loads(fields)
+            fields[templates.LIBRARY] = update_library(fields, shared_blocks)
+            fields = _dumps(fields)
+
+        # Check every reference to what changed before writing rows
+        if plan_data is not None:
+            stored = days
+        else:
+            stored, _ = self._templates(plan, lang)
+            stored.update(days)
+        library = json.loads(fields).get(templates.LIBRARY) or {}
+        affected = templates.dependents(layout, stored, days, shared_blocks or ())
+        memo = {}
+        for day in list(days) + sorted(affected):
+            templates.resolve_day(layout, stored, library, day, memo)
+
+        conn.execute(
+            "INSERT INTO plans (plan, lang, version, fields, updated_at) VALUES (?, ?, 1, ?, ?) "
+            "ON CONFLICT (plan, lang) DO UPDATE SET version = version + 1, "
+            "fields = excluded.fields, updated_at = excluded.updated_at",
+            (plan, lang, fields, now))
+
+        positions = dict(conn.execute(
+            "SELECT day, position FROM days WHERE plan = ? AND lang = ?", (plan, lang)))
+        next_position = max(positions.values(), default=-1) + 1
+        for index, (day, day_data) in enumerate(days.items()):
+            if plan_data is not None:
+                position = index
+            elif day in positions:
+                position = positions[day]
+            else:
+                position, next_position = next_position, next_position + 1
+            self._write_day_rows(conn, layout, plan, lang, day, position, day_data, now)
+        conn.executemany(
+            "UPDATE days SET version = version + 1, updated_at = ? WHERE plan = ? AND lang = ? AND day = ?",
+            [(now, plan, lang, day) for day in sorted(affected)])
+
+    @staticmethod
+    def _delete_day_rows(conn, plan, lang, day, including_day=False):
+        key = (plan, lang, day)
+        conn.execute("DELETE FROM items WHERE plan = ? AND lang = ? AND day = ?", key)
+        conn.execute("DELETE FROM blocks WHERE plan = ? AND lang = ? AND day = ?", key)
+        if including_day:
+            conn.execute("INSERT OR REPLACE INTO dropped_days (plan, lang, day, version) "
+                         "SELECT plan, lang, day, version FROM days WHERE plan = ? AND lang = ? AND day = ?", key)
+            conn.execute("DELETE FROM days WHERE plan = ? AND lang = ? AND day = ?", key)
+
+    def _write_day_rows(self, conn, layout, plan, lang, day, position, day_data, now):
+        fields, block_key, block_rows = self._split_day(layout, day_data)
+        self._delete_day_rows(conn, plan, lang, day)
+        key = (plan, lang, day)
+        dropped = conn.execute("SELECT version FROM dropped_days WHERE plan = ? AND lang = ? AND day = ?",
+                               key).fetchone()
+        conn.execute(
+            "INSERT INTO days (plan, lang, day, position, version, fields, block_key, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (plan, lang, day) DO UPDATE SET position = excluded.position, "
+            "version = version + 1, fields = excluded.fields, block_key = excluded.block_key, "
+            "updated_at = excluded.updated_at",
+            (plan, lang, day, position, (dropped[0] if dropped else 0) + 1, fields, block_key, now))
+        if dropped:
+            conn.execute("DELETE FROM dropped_days WHERE plan = ? AND lang = ? AND day = ?", key)
+        conn.executemany(
+            "INSERT INTO blocks (plan, lang, day, position, fields, item_key) VALUES (?, ?, ?, ?, ?, ?)",
+            [(plan, lang, day, b, block_fields, item_key)
+             for b, (block_fields, item_key, _) in enumerate(block_rows)])
+        conn.executemany(
+            "INSERT INTO items (plan, lang, day, block, position, value) VALUES (?, ?, ?, ?, ?, ?)",
+            [(plan, lang, day, b, i, value)
+             for b, (_, _, items) in enumerate(block_rows) for i, value in enumerate(items)])
+
+    # ----- Import / Export -----
+
+    def import_from(self, source):
+        """Copy every plan and language from another store (e.g. the JSON files)."""
+        imported = 0
+        for plan in PLANS:
+            for lang in LANGS:
+                data = source.read_plan(plan, lang, raw=True).data
+                if data and data.get(PLANS[plan]['collection']):
+                    with self.lock(plan, lang):
+                        self.write(plan, lang, {}, plan_data=data)
+                    imported += 1
+        return imported
+
+    def export_plan(self, plan, lang, target):
+        """Write one plan from the database to another store (e.g. the JSON files)."""
+        data = self.read_plan(plan, lang, raw=True).data
+        if not data:
+            return False
+        with target.lock(plan, lang):
+            if target.read_plan(plan, lang, raw=True).data == data:
+                return False
+            target.write(plan, lang, {}, plan_data=data)
+        return True
+
+
+def open_store(kind, data_dir, cache, db_path=None):
+    """Create the configured store ('json' or 'sqlite')."""
+    if kind == 'sqlite':
+        store = SqlitePlanStore(db_path or Path(__file__).parent / 'fitness.sqlite3',
+                                lock_dir=Path(data_dir) / '.locks')
+        if store.is_empty():
+            count = store.import_from(JsonPlanStore(data_dir, cache))
+            if count:
+                print(f"Imported {count} plan document(s) from {data_dir} into {store.db_path}")
+        return store
+    if kind == 'json':
+        return JsonPlanStore(data_dir, cache)
+    raise ValueError(f"Unknown storage backend: {kind!r}")
+
+
+def main():
+    from doc_cache import DocumentCache
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    data_dir = Path(os.environ.get('FITNESS_DATA_DIR', Path(__file__).parent.parent / 'data'))
+    db_path = os.environ.get('FITNESS_DB_PATH', Path(__file__).parent / 'fitness.sqlite3')
+    json_store = JsonPlanStore(data_dir, DocumentCache())
+    db = SqlitePlanStore(db_path, lock_dir=data_dir / '.locks')
+
+    if command == 'import':
+        print(f"Imported {db.import_from(json_store)} plan document(s) into {db_path}")
+    elif command == 'export':
+        for plan in PLANS:
+            for lang in LANGS:
+                if db.export_plan(plan, lang, json_store):
+                    print(f"  Exported {plan} ({lang})")
+        print("Export complete!")
+    else:
+        print("Usage: python plan_store.py import|export")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Field Projection for Plan Documents
+
+Cuts day objects down to the fields a client asked for. A field spec is a
+comma-separated list of dotted paths; lists along a path are traversed, so
+one path selects a field in every block, exercise, meal or food:
+
+    focus,blocks.exercises.name,blocks.exercises.weight
+
+A path may be limited to one plan with a prefix, e.g. "gym:blocks.category"
+or "diet:meals.foods.calories"; unprefixed paths apply to every plan. A
+plan with no applicable path projects each day to {}. Items that are not
+objects (exercises given as plain strings) are kept as they are.
+
+A spec is parsed and compiled into nested closures once (compile_spec is
+memoized on the normalized spec), so projecting a document is a single walk
+over the selected fields.
+"""
+
+from functools import lru_cache
+
+from plan_store import PLANS
+
+MAX_PATHS = 64
+
+
+class ProjectionError(ValueError):
+    """The field spec is malformed."""
+
+
+def normalize(spec: str) -> str:
+    """Canonical form of a spec (sorted, deduplicated), used as the cache key."""
+    paths = set()
+    for raw in (spec or '').split(','):
+        path = raw.strip()
+        if not path:
+            continue
+        plan, _, dotted = path.rpartition(':')
+        if plan and plan not in PLANS:
+            raise ProjectionError(f"Unknown plan in field spec: {plan!r}")
+        if any(not part for part in dotted.split('.')):
+            raise ProjectionError(f"Invalid field path: {path!r}")
+        paths.add(path)
+    if len(paths) > MAX_PATHS:
+        raise ProjectionError(f"Too many fields (at most {MAX_PATHS})")
+    return ','.join(sorted(paths))
+
+
+def _tree(paths):
+    """{field: subtree, or None for the whole value} from dotted paths."""
+    tree = {}
+    for path in paths:
+        node = tree
+        parts = path.split('.')
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                break   # an ancestor is already selected whole
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def _compile(tree):
+    """A function projecting a value down to `tree`."""
+    fields = [(name, None if sub is None else _compile(sub)) for name, sub in tree.items()]
+
+    def project(value):
+        if isinstance(value, list):
+            return [project(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        return {name: value[name] if sub is None else sub(value[name])
+                for name, sub in fields if name in value}
+
+    return project
+
+
+def _identity(value):
+    return value
+
+
+@lru_cache(maxsize=256)
+def _compile_normalized(spec):
+    if not spec:
+        return {plan: _identity for plan in PLANS}
+    paths = spec.split(',')
+    shared = [path for path in paths if ':' not in path]
+    compiled = {}
+    for plan in PLANS:
+        own = [path.partition(':')[2] for path in paths if path.startswith(f'{plan}:')]
+        compiled[plan] = _compile(_tree(shared + own))
+    return compiled
+
+
+def compile_spec(spec: str) -> dict:
+    """{plan: function projecting one day}; an empty spec keeps days whole."""
+    return _compile_normalized(normalize(spec))
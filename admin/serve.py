@@ -0,0 +1,123 @@
+"""
+Production Server for the Admin App
+Serves the routes of server.py with a production WSGI server instead of
+Flask's development server (python server.py).
+
+- waitress (any platform): one process with FITNESS_THREADS request threads
+- gunicorn (Linux/macOS): FITNESS_WORKERS processes with FITNESS_THREADS
+  request threads each
+
+Every request runs on a pool thread, so a slow save only holds up its own
+thread and the saves to the same plan: reads are served from the document
+cache without taking the save locks, and translation, the JSON export and
+bundle builds run on the background sync queue (see sync_jobs.py). Each open
+change stream (/api/changes/stream) holds a thread, so keep FITNESS_THREADS
+above the number of admin tabs you expect.
+
+With several workers, saves are serialized across processes by the lock
+files of storage.py, and the change feed and workout history read each
+other's appends from disk. Background job status (/api/jobs/<id>) is only
+known to the worker that took the save, which is why one worker is the
+default.
+
+Configuration (environment):
+    FITNESS_HOST      interface to listen on (default 127.0.0.1)
+    FITNESS_PORT      port (default 5000)
+    FITNESS_SERVER    waitress, gunicorn or auto (default auto: gunicorn
+                      for more than one worker, waitress otherwise)
+    FITNESS_WORKERS   processes, gunicorn only (default 1)
+    FITNESS_THREADS   request threads per process (default 8)
+    FITNESS_TIMEOUT   seconds before gunicorn restarts a silent worker (default 120)
+plus the settings read by server.py (FITNESS_DATA_DIR, FITNESS_STORAGE...).
+
+Usage: python serve.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import tenants
+
+BASE_DIR = Path(__file__).parent.parent
+# Same default as server.py, which is only imported by the workers
+DATA_DIR = Path(os.environ.get('FITNESS_DATA_DIR', BASE_DIR / 'data'))
+
+HOST = os.environ.get('FITNESS_HOST', '127.0.0.1')
+PORT = int(os.environ.get('FITNESS_PORT', 5000))
+SERVER = os.environ.get('FITNESS_SERVER', 'auto')
+WORKERS = max(int(os.environ.get('FITNESS_WORKERS', 1)), 1)
+THREADS = max(int(os.environ.get('FITNESS_THREADS', 8)), 1)
+TIMEOUT = int(os.environ.get('FITNESS_TIMEOUT', 120))
+
+
+def choose_server(name=SERVER, workers=WORKERS) -> str:
+    if name == 'auto':
+        return 'gunicorn' if workers > 1 else 'waitress'
+    if name not in ('waitress', 'gunicorn'):
+        raise SystemExit(f"Unknown FITNESS_SERVER '{name}' (use waitress, gunicorn or auto)")
+    return name
+
+
+def run_waitress():
+    try:
+        from waitress import serve
+    except ImportError:
+        raise SystemExit("waitress is not installed: pip install waitress")
+    if WORKERS > 1:
+        print(f"  waitress runs one process; FITNESS_WORKERS={WORKERS} is ignored (use gunicorn)")
+
+    from server import app
+    serve(app, host=HOST, port=PORT, threads=THREADS)
+
+
+def run_gunicorn():
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("gunicorn is not installed (Linux/macOS only): pip install gunicorn")
+
+    class AdminApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{HOST}:{PORT}')
+            self.cfg.set('workers', WORKERS)
+            self.cfg.set('threads', THREADS)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', TIMEOUT)
+
+        def load(self):
+            # Imported in each worker after the fork: the server starts
+            # threads and opens SQLite connections that must not be shared
+            from server import app
+            return app
+
+    AdminApplication().run()
+
+
+def main():
+    server = choose_server()
+
+    # Before any worker starts, so no save runs against a half-committed state
+    recovered = tenants.recover(DATA_DIR)
+    if recovered:
+        print(f"Recovered {recovered} file(s) from an interrupted save")
+
+    print("\n" + "="*50)
+    print("  🏋️ Fitness App Admin Server (production)")
+    print("="*50)
+    print(f"\n  📂 Data directory: {DATA_DIR}")
+    processes = WORKERS if server == 'gunicorn' else 1
+    print(f"  ⚙️  {server}: {processes} process(es) x {THREADS} thread(s)")
+    print(f"  🌐 Admin URL: http://{HOST}:{PORT}")
+    print("\n  Press Ctrl+C to stop the server\n")
+    print("="*50 + "\n")
+    sys.stdout.flush()
+
+    if server == 'gunicorn':
+        run_gunicorn()
+    else:
+        run_waitress()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,25 +5,109 @@ A local Flask server for managing gym routines and diet plans.
 
 import json
 import os
+import re
+from contextlib import ExitStack
 from pathlib import Path
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
 import translator
+from doc_cache import DocumentCache
+import http_cache
+from sync_jobs import SyncQueue
+import storage
+import json_patch
+import plan_store
+import build_static
+import metrics
+import diet_summary
+import projection
+import tenants
+import templates
+from change_log import ChangeLog, diff_day
+from exercise_catalog import CATALOG_NAME, ExerciseCatalog
+from snapshots import SnapshotStore, UnknownSnapshot
+from workout_history import WorkoutHistory
+from plan_store import DAYS, LANGS, PLANS, other_lang
 
 app = Flask(__name__, static_folder='static')
 CORS(app)
+# Per-request timing, Server-Timing headers and optional profiling (see metrics.py)
+metrics.init_app(app)
 
 # Get the data directory path (relative to admin folder)
 BASE_DIR = Path(__file__).parent.parent
-DATA_DIR = BASE_DIR / 'data'
+DATA_DIR = Path(os.environ.get('FITNESS_DATA_DIR', BASE_DIR / 'data'))
+
+# Parsed documents kept in memory between requests (see doc_cache.py)
+document_cache = DocumentCache(max_entries=int(os.environ.get('FITNESS_CACHE_ENTRIES', 64)))
+
+metrics.registry.function_counter('fitness_document_cache_hits_total', 'Document cache hits',
+                                  lambda: document_cache.hits)
+metrics.registry.function_counter('fitness_document_cache_misses_total', 'Document cache misses',
+                                  lambda: document_cache.misses)
+
+# Serialized (and precompressed) GET bodies, one per route and document version
+response_cache = http_cache.ResponseCache()
+
+# Background translation sync for per-day saves (see sync_jobs.py)
+sync_queue = SyncQueue(
+    workers=int(os.environ.get('FITNESS_SYNC_WORKERS', 2)),
+    max_queue=int(os.environ.get('FITNESS_SYNC_QUEUE', 64)),
+)
+
+# Plan storage (see plan_store.py): 'json' files (default) or 'sqlite'.
+# With SQLite as the source of truth the JSON files are kept as an export.
+json_files = plan_store.JsonPlanStore(DATA_DIR, document_cache)
+store = plan_store.open_store(os.environ.get('FITNESS_STORAGE', 'json'), DATA_DIR, document_cache,
+                              db_path=os.environ.get('FITNESS_DB_PATH'))
+EXPORT_JSON = store.name != 'json' and os.environ.get('FITNESS_EXPORT_JSON', '1') != '0'
+
+# Feed of saved changes for incremental client sync (see change_log.py);
+# every athlete has its own, bounded separately
+CHANGE_LOG_ENTRIES = int(os.environ.get('FITNESS_CHANGE_LOG_ENTRIES', 1000))
+change_log = ChangeLog(DATA_DIR / '.changes' / 'changes.jsonl', max_entries=CHANGE_LOG_ENTRIES)
+
+# Logged weights per exercise, appended when a save changes them (see workout_history.py)
+workout_history = WorkoutHistory(DATA_DIR / '.history')
+
+# Every saved version of every day, for diffs and rollback (see snapshots.py)
+snapshot_store = SnapshotStore(DATA_DIR / '.snapshots')
+
+# Exercises with stable ids and names in both languages, shared by every
+# athlete; gym days are linked to it on save (see exercise_catalog.py)
+exercise_catalog = ExerciseCatalog(DATA_DIR / CATALOG_NAME)
+
+# Athletes (see tenants.py): the data above is the default namespace; other
+# athletes live under data/athletes/ and are opened on demand (LRU)
+tenant_registry = tenants.Tenants(
+    tenants.Tenant(None, DATA_DIR, document_cache, store, json_files, workout_history, snapshot_store,
+                   change_log),
+    DATA_DIR / 'athletes', store.name,
+    max_tenants=int(os.environ.get('FITNESS_TENANTS', tenants.DEFAULT_MAX_TENANTS)),
+    cache_entries=int(os.environ.get('FITNESS_TENANT_CACHE_ENTRIES', tenants.DEFAULT_CACHE_ENTRIES)),
+    change_log_entries=CHANGE_LOG_ENTRIES,
+)
+metrics.registry.function_counter('fitness_tenant_evictions_total', 'Athletes evicted from memory',
+                                  lambda: tenant_registry.evictions)
+
+# Seconds between keep-alive comments on idle change streams
+CHANGE_STREAM_HEARTBEAT = 15
+
+# Public site bundles (see build_static.py), rebuilt after saves once the site
+# has been built; FITNESS_BUILD_STATIC=1/0 forces it on or off.
+DIST_DIR = DATA_DIR / 'dist'
+BUILD_STATIC = os.environ.get(
+    'FITNESS_BUILD_STATIC', '1' if (DIST_DIR / build_static.MANIFEST_NAME).exists() else '0') != '0'
 
 # ===== Helper Functions =====
 
 def load_json(filepath: Path) -> dict:
-    """Load JSON file and return data."""
+    """
+    Load JSON file and return data.
+    Served from the document cache; the result is shared, copy before mutating.
+    """
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return document_cache.get(filepath)
     except FileNotFoundError:
         return {}
     except json.JSONDecodeError as e:
@@ -32,16 +116,802 @@ def load_json(filepath: Path) -> dict:
 
 
 def save_json(filepath: Path, data: dict) -> bool:
-    """Save data to JSON file with pretty formatting."""
+    """Atomically save data to JSON file with pretty formatting."""
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        with storage.Transaction(DATA_DIR, on_commit=document_cache.put) as tx:
+            tx.write(filepath, data)
         return True
     except Exception as e:
+        document_cache.invalidate(filepath)
         print(f"Error saving JSON to {filepath}: {e}")
         return False
 
 
+def commit_days(tenant, plan: str, lang: str, days: dict, plan_data: dict = None,
+                shared_blocks: dict = None, synced: bool = False) -> dict:
+    """
+    Write days (or a whole plan document) to the tenant's store as one unit
+    and return the new versions. Call under tenant.store.lock(plan, lang).
+    Gym days are linked to the exercise catalog first; the linked days
+    replace the values of `days`, so callers read them back from there.
+    `shared_blocks` ({id: block, or None to delete}) changes the plan's
+    template library the same way; the days that use what changed are
+    recorded in the change log with their resolved content. Every day
+    written is recorded in the snapshot history as stored. `synced` marks
+    a translation sync's output, whose exercise names the catalog only
+    takes as provisional (see exercise_catalog.py).
+    """
+    return commit_plans(tenant, [(plan, lang, days, plan_data, shared_blocks, synced)])[plan, lang]
+
+
+def commit_plans(tenant, writes: list) -> dict:
+    """
+    commit_days() for several plans and languages at once: `writes` is a
+    list of (plan, lang, days, plan_data, shared_blocks[, synced]), one per
+    plan and language, all committed in one store transaction. Call under the lock
+    of each. Returns {(plan, lang): new versions}.
+    """
+    pending = [prepare_commit(tenant, *write) for write in writes]
+    with metrics.span('store_write'):
+        versions = tenant.store.write_many([(c["plan"], c["lang"], c["days"], c["plan_data"], c["shared_blocks"])
+                                            for c in pending])
+    for commit in pending:
+        finish_commit(tenant, commit, versions[commit["plan"], commit["lang"]])
+    return versions
+
+
+def prepare_commit(tenant, plan: str, lang: str, days: dict, plan_data: dict = None,
+                   shared_blocks: dict = None, synced: bool = False) -> dict:
+    """Link a write to the exercise catalog and read what it replaces (before the store write)."""
+    store = tenant.store
+    layout = PLANS[plan]
+    collection = layout['collection']
+    if plan == 'gym':
+        for day, data in days.items():
+            days[day] = exercise_catalog.link_day(data, lang, synced=synced)
+        if plan_data is not None and isinstance(plan_data.get(collection), dict):
+            plan_data = {**plan_data, collection: {day: exercise_catalog.link_day(data, lang, synced=synced)
+                                                   for day, data in plan_data[collection].items()}}
+        for block_id, block in (shared_blocks or {}).items():
+            if block is not None:
+                shared_blocks[block_id] = exercise_catalog.link_day({'blocks': [block]}, lang,
+                                                                    synced=synced)['blocks'][0]
+    commit = {"plan": plan, "lang": lang, "days": days, "plan_data": plan_data, "shared_blocks": shared_blocks}
+    if plan_data is not None:
+        commit["before"] = store.read_plan(plan, lang).data or {}
+        commit["previous"] = dict(commit["before"].get(collection) or {})
+        commit["touched"] = set(commit["previous"]) | set(plan_data.get(collection) or {})
+    else:
+        commit["stored"] = store.read_plan(plan, lang, raw=True).data or {}
+        commit["touched"] = set(days) | templates.dependents(layout, commit["stored"].get(collection) or {},
+                                                             days, shared_blocks or ())
+        commit["previous"] = {day: load_plan_day(tenant, plan, lang, day) for day in commit["touched"]}
+    return commit
+
+
+def finish_commit(tenant, commit: dict, versions: dict):
+    """Record a committed write: athlete index, change log, workout history, snapshots, export."""
+    store = tenant.store
+    plan, lang, days, plan_data = commit["plan"], commit["lang"], commit["days"], commit["plan_data"]
+    shared_blocks, previous, touched = commit["shared_blocks"], commit["previous"], commit["touched"]
+    layout = PLANS[plan]
+    collection = layout['collection']
+
+    if plan_data is None and touched == set(days) and not any(
+            templates.is_templated(layout, data) for data in days.values()):
+        current = days
+    else:
+        # What clients now read: templates resolved, dropped days as None
+        week = store.read_plan(plan, lang).data.get(collection) or {}
+        current = {day: week.get(day) for day in touched}
+    if tenant.athlete is not None:
+        tenant_registry.index.touch(tenant.athlete, plan, lang, versions["version"])
+    record_changes(tenant, plan, lang, previous, current, versions)
+    if plan == 'gym' and lang == 'en':
+        # History is kept under the English exercise names; Spanish edits
+        # arrive here through their translation sync
+        for day, data in current.items():
+            if data is not None:
+                try:
+                    tenant.history.record_day(previous.get(day), data)
+                except Exception as e:
+                    # The day is saved already; only its history entry is lost
+                    print(f"Error logging workout history for {day}: {e}")
+    if plan_data is not None:
+        # Fields of the plan document outside the weekly collection
+        before = commit["before"]
+        record_changes(tenant, plan, lang,
+                       {None: {k: v for k, v in before.items() if k != collection}},
+                       {None: {k: v for k, v in plan_data.items() if k != collection}},
+                       versions)
+    elif shared_blocks:
+        stored = commit["stored"]
+        record_changes(tenant, plan, lang,
+                       {None: {templates.LIBRARY: stored.get(templates.LIBRARY) or {}}},
+                       {None: {templates.LIBRARY: plan_store.update_library(stored, shared_blocks)}},
+                       versions)
+    # Snapshots keep days as written (a whole plan: every day, dropped ones as None)
+    saved = days
+    if plan_data is not None:
+        written = plan_data.get(collection) or {}
+        saved = {day: written.get(day) for day in touched}
+    with metrics.span('snapshot'):
+        tenant.snapshots.record(plan, lang, saved, versions)
+    queue_snapshot_prune(tenant)
+    if EXPORT_JSON:
+        # Coalesced: a burst of saves exports the plan once
+        def export(job):
+            store.export_plan(plan, lang, tenant.json_files)
+            # Bundles are built from the JSON files, so only after the export
+            queue_static_build(tenant)
+
+        sync_queue.submit(('export', tenant.athlete, plan, lang), export,
+                          description=f"export {plan} ({lang}) to JSON")
+    else:
+        queue_static_build(tenant)
+
+
+def record_changes(tenant, plan: str, lang: str, previous: dict, days: dict, versions: dict):
+    """Append the differences between `previous` and `days` to the change log."""
+    # Entries of the default namespace carry no athlete
+    scope = {"athlete": tenant.athlete} if tenant.athlete is not None else {}
+    changes = []
+    for day, data in days.items():
+        delta = diff_day(previous.get(day), data)
+        if delta is not None:
+            changes.append({**scope, "plan": plan, "lang": lang, "day": day,
+                            "version": versions["version"],
+                            "day_version": versions["days"].get(day), **delta})
+    tenant.changes.append(changes)
+
+
+def queue_static_build(tenant):
+    """Rebuild the public site bundles in the background (coalesced)."""
+    # The public site only serves the default namespace
+    if BUILD_STATIC and tenant.athlete is None:
+        sync_queue.submit(('build-static',), lambda job: build_static.build(DATA_DIR, DIST_DIR),
+                          description="build static data bundles")
+
+
+def queue_snapshot_prune(tenant):
+    """Thin the tenant's snapshot history in the background, at most every snapshots.PRUNE_INTERVAL."""
+    if tenant.snapshots.prune_due():
+        sync_queue.submit(('prune-snapshots', tenant.athlete), lambda job: tenant.snapshots.prune(),
+                          description="prune snapshot history")
+
+
+def load_plan_day(tenant, plan: str, lang: str, day: str, raw: bool = False):
+    """Current version of a day (templates resolved unless `raw`), or None."""
+    return tenant.store.read_day(plan, lang, day, raw=raw).data
+
+
+def check_if_match(current, version: int):
+    """
+    Optimistic concurrency check for POST/PUT/PATCH (call under store.lock).
+    Passes when there is no If-Match header, or it names the resource's
+    current ETag (as sent by GET) or its version tag "v<version>".
+    Returns a 412 response on conflict, otherwise None.
+    """
+    if_match = request.if_match
+    if not if_match or if_match.star_tag:
+        return None
+    if if_match.contains_raw(f'"v{version}"'):
+        return None
+    if http_cache.etag_matches(if_match, http_cache.content_etag(current)):
+        return None
+    return jsonify({
+        "success": False,
+        "message": "The document was modified by another request; reload and try again",
+        "version": version,
+    }), 412
+
+
+def document_response(tenant, key, doc, headers=None, build=None):
+    """
+    Return a JSON response for a stored document, or for `build(data)`.
+    The body is built, serialized and compressed once per document version;
+    clients revalidate with If-None-Match / If-Modified-Since.
+    """
+    data = doc.data if doc.data is not None else {}
+    cached = response_cache.get(key + (tenant.athlete, tenant.store.name), doc.tag,
+                                (lambda: build(data)) if build else (lambda: data),
+                                doc.last_modified)
+    return http_cache.make_response(request, cached, headers)
+
+
+def version_headers(tenant, plan: str, lang: str, day: str = None) -> dict:
+    """X-Version headers for GET responses (used with If-Match on save)."""
+    versions = tenant.store.versions(plan, lang)
+    if day is not None:
+        return {'X-Version': str(versions["days"].get(day, 0))}
+    return {
+        'X-Version': str(versions["version"]),
+        'X-Day-Versions': ','.join(f'{d}={v}' for d, v in sorted(versions["days"].items())),
+    }
+
+
+# ===== Translation Sync =====
+
+# (athlete, plan, day or "shared:<block id>", target_lang) keys whose last
+# translation sync failed
+_unsynced_days = set()
+
+
+def translate_day_data(plan: str, data: dict, target_lang: str, baseline=None, existing=None):
+    """
+    Translate a day (or a shared block wrapped as {"blocks": [block]}).
+    With a baseline (the source `existing` was translated from) only the
+    text fields that changed are translated. Exercises the catalog knows in
+    the target language take that name instead of a translation.
+    """
+    source, names = exercise_catalog.detach(data, target_lang) if plan == 'gym' else (data, {})
+    if baseline is not None and existing is not None:
+        translated_data, changed = translator.translate_changes(source, baseline, existing, target_lang)
+        print(f"Syncing {plan} translation to {target_lang} ({changed} changed text field(s))...")
+    else:
+        print(f"Syncing {plan} translation to {target_lang}...")
+        translated_data = translator.translate_structure(source, target_lang)
+    return exercise_catalog.attach(translated_data, names)
+
+
+def translate_shared_block(plan: str, block: dict, target_lang: str, baseline=None, existing=None):
+    """Translate one shared block, as a day holding only that block."""
+    key = PLANS[plan]['blocks']
+    translated = translate_day_data(plan, {key: [block]}, target_lang,
+                                    {key: [baseline]} if baseline is not None else None,
+                                    {key: [existing]} if existing is not None else None)
+    return translated[key][0]
+
+
+def translate_plans(plans: dict, target_lang: str, baselines: dict, existing: dict, blocks: dict = None):
+    """
+    translate_day_data() for the days of several plans ({plan: {day: data}},
+    `baselines` and `existing` keyed the same way) in one pass: the changed
+    text of every day is translated together, each distinct string once.
+    `blocks` ({plan: {id: block}}) are shared blocks translated along with
+    them. Returns (translated days, translated blocks).
+    """
+    prefix = f'{templates.SHARED}:'
+    sources, names = {}, {}
+    for plan, days in plans.items():
+        key = PLANS[plan]['blocks']
+        items = {**days, **{prefix + block_id: {key: [block]}
+                            for block_id, block in ((blocks or {}).get(plan) or {}).items()}}
+        for name, data in items.items():
+            if plan == 'gym':
+                data, names[plan, name] = exercise_catalog.detach(data, target_lang)
+            sources.setdefault(plan, {})[name] = data
+
+    translated, changed = translator.translate_changes(sources, baselines, existing, target_lang)
+    print(f"Syncing {', '.join(plans)} translation to {target_lang} ({changed} changed text field(s))...")
+    translated_days, translated_blocks = {}, {}
+    for plan, items in translated.items():
+        for name, data in items.items():
+            exercise_catalog.attach(data, names.get((plan, name), {}))
+            if name.startswith(prefix):
+                translated_blocks.setdefault(plan, {})[name[len(prefix):]] = data[PLANS[plan]['blocks']][0]
+            else:
+                translated_days.setdefault(plan, {})[name] = data
+    return translated_days, translated_blocks
+
+
+def missing_shared_blocks(tenant, plan: str, source_lang: str, data: dict) -> dict:
+    """Translations of the shared blocks a day uses that the other language does not have yet."""
+    target_lang = other_lang(source_lang)
+    _, used = templates.references(PLANS[plan], data)
+    if not used:
+        return {}
+    target = tenant.store.read_plan(plan, target_lang, raw=True).data.get(templates.LIBRARY) or {}
+    source = tenant.store.read_plan(plan, source_lang, raw=True).data.get(templates.LIBRARY) or {}
+    return {block_id: translate_shared_block(plan, source[block_id], target_lang)
+            for block_id in sorted(used) if block_id not in target and block_id in source}
+
+
+def sync_day_translation(job, tenant, plan: str, day: str, source_lang: str, data: dict):
+    """
+    Translate a saved day (as stored, so templated days stay templated)
+    into the other language and store it. When the job has a baseline (the
+    source the stored translation was made from), only the text fields that
+    changed are re-translated.
+    """
+    target_lang = other_lang(source_lang)
+    key = (tenant.athlete, plan, day, target_lang)
+
+    try:
+        job.report('translating', 0.1)
+        existing = load_plan_day(tenant, plan, target_lang, day, raw=True)
+        baseline = None if key in _unsynced_days else job.baseline
+        translated_data = translate_day_data(plan, data, target_lang, baseline, existing)
+        shared_blocks = missing_shared_blocks(tenant, plan, source_lang, translated_data)
+
+        if translated_data == existing and not shared_blocks:
+            _unsynced_days.discard(key)
+            print(f"{plan.capitalize()} translation for {day} ({target_lang}) already up to date")
+            return
+
+        job.report('saving', 0.6)
+        with tenant.store.lock(plan, target_lang):
+            commit_days(tenant, plan, target_lang, {day: translated_data}, shared_blocks=shared_blocks or None,
+                        synced=True)
+    except Exception:
+        _unsynced_days.add(key)
+        raise
+
+    _unsynced_days.discard(key)
+    print(f"Successfully synced {plan} translation for {day} ({target_lang})")
+
+
+def queue_day_translation(tenant, plan: str, day: str, source_lang: str, data: dict, previous=None):
+    """
+    Hand the translation sync of a saved day to the background queue.
+    `previous` is the day as stored before this save, used to diff.
+    """
+    target_lang = other_lang(source_lang)
+    return sync_queue.submit(
+        (tenant.athlete, plan, day, target_lang),
+        lambda job: sync_day_translation(job, tenant, plan, day, source_lang, data),
+        description=f"{plan} {day} -> {target_lang}",
+        baseline=previous,
+    )
+
+
+def sync_block_translation(job, tenant, plan: str, block_id: str, source_lang: str, block):
+    """
+    Translate a saved shared block into the other language and store it
+    there (None deletes it there too). Days using it are not translated
+    again: they only reference the block.
+    """
+    target_lang = other_lang(source_lang)
+    key = (tenant.athlete, plan, f'{templates.SHARED}:{block_id}', target_lang)
+
+    try:
+        job.report('translating', 0.1)
+        library = tenant.store.read_plan(plan, target_lang, raw=True).data.get(templates.LIBRARY) or {}
+        existing = library.get(block_id)
+        if block is None:
+            translated = None
+        else:
+            baseline = None if key in _unsynced_days else job.baseline
+            translated = translate_shared_block(plan, block, target_lang, baseline, existing)
+
+        if translated == existing:
+            _unsynced_days.discard(key)
+            print(f"Shared block {block_id} ({target_lang}) already up to date")
+            return
+
+        job.report('saving', 0.6)
+        with tenant.store.lock(plan, target_lang):
+            commit_days(tenant, plan, target_lang, {}, shared_blocks={block_id: translated}, synced=True)
+    except Exception:
+        _unsynced_days.add(key)
+        raise
+
+    _unsynced_days.discard(key)
+    print(f"Successfully synced shared block {block_id} ({target_lang})")
+
+
+def queue_block_translation(tenant, plan: str, block_id: str, source_lang: str, block, previous=None):
+    """Hand the translation sync of a saved (or deleted) shared block to the background queue."""
+    target_lang = other_lang(source_lang)
+    return sync_queue.submit(
+        (tenant.athlete, plan, f'{templates.SHARED}:{block_id}', target_lang),
+        lambda job: sync_block_translation(job, tenant, plan, block_id, source_lang, block),
+        description=f"{plan} shared block {block_id} -> {target_lang}",
+        baseline=previous,
+    )
+
+
+# A field of one exercise other than its name (sets, reps, weight...)
+EXERCISE_FIELD = re.compile(r'/exercises/\d+/(?!name$)[^/]+$')
+
+
+def mirrors_exercises(op) -> bool:
+    """Whether a gym PATCH operation can be mirrored without the catalog."""
+    if isinstance(op.get('value'), (dict, list)):
+        return False    # may add exercises
+    return '/exercises' not in op['path'] or bool(EXERCISE_FIELD.search(op['path']))
+
+
+def sync_day_patch(job, tenant, plan: str, day: str, source_lang: str, ops: list, data: dict):
+    """
+    Mirror a PATCH into the other language by applying the same operations,
+    with text values translated. Falls back to a diff-based sync when the
+    job replaced other queued jobs or the target cannot take the patch.
+    """
+    target_lang = other_lang(source_lang)
+    if job.coalesced or (tenant.athlete, plan, day, target_lang) in _unsynced_days:
+        return sync_day_translation(job, tenant, plan, day, source_lang, data)
+    if templates.is_templated(PLANS[plan], data):
+        # The operations address the resolved day, not the stored template
+        return sync_day_translation(job, tenant, plan, day, source_lang, data)
+    if plan == 'gym' and not all(mirrors_exercises(op) for op in ops):
+        # Exercise names come from the catalog, which a mirrored patch would bypass
+        return sync_day_translation(job, tenant, plan, day, source_lang, data)
+
+    job.report('translating', 0.1)
+    mirrored = translator.translate_patch(ops, target_lang)
+
+    job.report('saving', 0.6)
+    with tenant.store.lock(plan, target_lang):
+        existing = load_plan_day(tenant, plan, target_lang, day, raw=True)
+        try:
+            if existing is None:
+                raise json_patch.PatchError(f"no {target_lang} version of {day}")
+            if templates.is_templated(PLANS[plan], existing):
+                raise json_patch.PatchError(f"the {target_lang} version of {day} is templated")
+            translated_data = json_patch.apply_patch(existing, mirrored)
+        except json_patch.PatchError as e:
+            print(f"Could not mirror {plan} patch for {day} ({e}), syncing the whole day")
+            translated_data = None
+        else:
+            commit_days(tenant, plan, target_lang, {day: translated_data}, synced=True)
+
+    if translated_data is None:
+        return sync_day_translation(job, tenant, plan, day, source_lang, data)
+    print(f"Successfully mirrored {plan} patch for {day} ({target_lang})")
+
+
+# ===== Shared Route Handlers =====
+
+def rebase_days(tenant, plan: str, lang: str, days: dict) -> dict:
+    """Keep the references of templated days that a client sends back resolved (see templates.py)."""
+    stored = tenant.store.read_plan(plan, lang, raw=True).data or {}
+    collection = stored.get(PLANS[plan]['collection']) or {}
+    library = stored.get(templates.LIBRARY) or {}
+    return {day: templates.rebase(PLANS[plan], collection, library, day, data) for day, data in days.items()}
+
+
+def template_error(e):
+    return jsonify({"success": False, "message": str(e)}), 422
+
+
+def lang_param():
+    """The ?lang= of a plan request, or an error response for an unknown language."""
+    lang = request.args.get('lang', 'en')
+    if lang not in LANGS:
+        return None, (jsonify({"success": False, "message": f"Unknown language: {lang}"}), 400)
+    return lang, None
+
+
+def day_errors(plan: str, day: str, data) -> list:
+    """What is wrong with a day's data; empty if nothing."""
+    if not isinstance(data, dict):
+        return [f"{plan} {day}: expected an object"]
+    if not isinstance(data.get(PLANS[plan]['blocks'], []), list):
+        return [f"{plan} {day}: {PLANS[plan]['blocks']} must be a list"]
+    return []
+
+
+def days_errors(plan: str, days: dict) -> list:
+    """day_errors() for every day of {day: data}, plus unknown day names."""
+    errors = []
+    for day, data in days.items():
+        if day not in DAYS:
+            errors.append(f"{plan}: unknown day: {day}")
+        else:
+            errors += day_errors(plan, day, data)
+    return errors
+
+
+def plan_errors(plan: str, data) -> list:
+    """What is wrong with a whole-plan save body; empty if nothing."""
+    collection = PLANS[plan]['collection']
+    if not isinstance(data, dict):
+        return [f"{plan}: expected an object"]
+    if not isinstance(data.get(collection, {}), dict):
+        return [f"{plan}: {collection} must be an object of days"]
+    return days_errors(plan, data.get(collection) or {})
+
+
+def invalid(message: str, errors: list, status=400):
+    return jsonify({"success": False, "message": message, "errors": errors}), status
+
+
+def day_params(day: str):
+    """The ?lang= of a day request, or an error response for an unknown day or language."""
+    if day not in DAYS:
+        return None, (jsonify({"success": False, "message": f"Unknown day: {day}"}), 404)
+    return lang_param()
+
+
+def get_plan(tenant, plan: str):
+    lang, error = lang_param()
+    if error:
+        return error
+    return document_response(tenant, (plan, lang), tenant.store.read_plan(plan, lang),
+                             version_headers(tenant, plan, lang))
+
+
+def save_plan(tenant, plan: str, title: str):
+    lang, error = lang_param()
+    if error:
+        return error
+    data = request.get_json(silent=True)
+    store = tenant.store
+    collection = PLANS[plan]['collection']
+    errors = plan_errors(plan, data)
+    if errors:
+        return invalid(f"Invalid {title.lower()}", errors)
+    
+    # Whole plan: main document and every day, committed together
+    with store.lock(plan, lang):
+        versions = store.versions(plan, lang)
+        conflict = check_if_match(store.read_plan(plan, lang).data, versions["version"])
+        if conflict:
+            return conflict
+        try:
+            if data.get(collection):
+                data = {**data, collection: rebase_days(tenant, plan, lang, data[collection])}
+            versions = commit_days(tenant, plan, lang, {}, plan_data=data)
+        except templates.TemplateError as e:
+            return template_error(e)
+        except Exception as e:
+            print(f"Error saving {plan} plan ({lang}): {e}")
+            return jsonify({"success": False, "message": f"Error saving {title.lower()}"}), 500
+    
+    return jsonify({"success": True, "message": f"{title} saved successfully",
+                    "version": versions["version"]})
+
+
+def get_plan_day(tenant, plan: str, day: str):
+    """A day as clients use it, or with ?raw=1 as stored (template references kept)."""
+    lang, error = day_params(day)
+    if error:
+        return error
+    raw = request.args.get('raw', '0') not in ('', '0')
+    return document_response(tenant, (plan, lang, day, raw), tenant.store.read_day(plan, lang, day, raw=raw),
+                             version_headers(tenant, plan, lang, day))
+
+
+def save_plan_day(tenant, plan: str, day: str, label: str):
+    lang, error = day_params(day)
+    if error:
+        return error
+    data = request.get_json(silent=True)
+    errors = day_errors(plan, day, data)
+    if errors:
+        return invalid(f"Invalid {day} {label}", errors)
+    store = tenant.store
+    
+    with store.lock(plan, lang):
+        previous = load_plan_day(tenant, plan, lang, day)
+        conflict = check_if_match(previous or {}, store.versions(plan, lang)["days"].get(day, 0))
+        if conflict:
+            return conflict
+        # Translation works on days as stored (templates unresolved)
+        baseline = load_plan_day(tenant, plan, lang, day, raw=True)
+        try:
+            days = rebase_days(tenant, plan, lang, {day: data})
+            versions = commit_days(tenant, plan, lang, days)
+            data = days[day]
+        except templates.TemplateError as e:
+            return template_error(e)
+        except Exception as e:
+            print(f"Error saving {plan} {day} ({lang}): {e}")
+            return jsonify({"success": False, "message": f"Error saving {day} {label}"}), 500
+    
+    # ===== AUTO-TRANSLATION SYNC =====
+    # Runs in the background; poll /api/jobs/<job_id> for its status
+    job = queue_day_translation(tenant, plan, day, lang, data, baseline)
+    
+    return jsonify({"success": True, "message": f"{day.capitalize()} {label} saved, translation sync queued",
+                    "job_id": job.id, "version": versions["version"],
+                    "day_version": versions["days"][day]}), 202
+
+
+def patch_plan_day(tenant, plan: str, day: str):
+    """Apply a JSON Patch (or path/value form) to one day of a plan."""
+    lang, error = day_params(day)
+    if error:
+        return error
+    store = tenant.store
+    try:
+        ops = json_patch.normalize(request.get_json(silent=True))
+    except json_patch.PatchError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    with store.lock(plan, lang):
+        previous = load_plan_day(tenant, plan, lang, day)
+        if previous is None:
+            return jsonify({"success": False, "message": f"No {plan} plan for {day}"}), 404
+        conflict = check_if_match(previous, store.versions(plan, lang)["days"].get(day, 0))
+        if conflict:
+            return conflict
+        try:
+            data = json_patch.apply_patch(previous, ops)
+        except json_patch.PatchConflict as e:
+            return jsonify({"success": False, "message": str(e)}), 409
+        except json_patch.PatchError as e:
+            return jsonify({"success": False, "message": str(e)}), 422
+        errors = day_errors(plan, day, data)
+        if errors:
+            return invalid(f"The patch leaves {day} invalid", errors, 422)
+        baseline = load_plan_day(tenant, plan, lang, day, raw=True)
+        try:
+            days = rebase_days(tenant, plan, lang, {day: data})
+            versions = commit_days(tenant, plan, lang, days)
+            data = days[day]
+        except templates.TemplateError as e:
+            return template_error(e)
+        except Exception as e:
+            print(f"Error patching {plan} {day} ({lang}): {e}")
+            return jsonify({"success": False, "message": f"Error patching {day}"}), 500
+
+    # Mirror the patch into the other language in the background
+    target_lang = other_lang(lang)
+    job = sync_queue.submit(
+        (tenant.athlete, plan, day, target_lang),
+        lambda job: sync_day_patch(job, tenant, plan, day, lang, ops, data),
+        description=f"{plan} {day} patch -> {target_lang}",
+        baseline=baseline,
+    )
+
+    return jsonify({"success": True, "message": f"{day.capitalize()} patched, translation sync queued",
+                    "job_id": job.id, "version": versions["version"],
+                    "day_version": versions["days"][day]}), 202
+
+
+def get_shared_blocks(tenant, plan: str):
+    """The plan's shared blocks and, per block, the days using it."""
+    lang, error = lang_param()
+    if error:
+        return error
+    layout = PLANS[plan]
+
+    def build(data):
+        return {"blocks": data.get(templates.LIBRARY) or {},
+                "used_by": templates.usage(layout, data.get(layout['collection']) or {})}
+
+    return document_response(tenant, ('shared-blocks', plan, lang), tenant.store.read_plan(plan, lang, raw=True),
+                             version_headers(tenant, plan, lang), build=build)
+
+
+def get_shared_block(tenant, plan: str, block_id: str):
+    lang, error = lang_param()
+    if error:
+        return error
+    library = tenant.store.read_plan(plan, lang, raw=True).data.get(templates.LIBRARY) or {}
+    if block_id not in library:
+        return jsonify({"success": False, "message": f"No shared block {block_id}"}), 404
+    return jsonify(library[block_id]), 200, version_headers(tenant, plan, lang)
+
+
+def save_shared_block(tenant, plan: str, block_id: str):
+    """Save a shared block once; every day using it changes with it."""
+    lang, error = lang_param()
+    if error:
+        return error
+    block = request.get_json(silent=True)
+    if not templates.BLOCK_ID.match(block_id):
+        return jsonify({"success": False,
+                        "message": "Block id must be 1-64 lowercase letters, digits, '-' or '_'"}), 400
+    if not isinstance(block, dict) or templates.SHARED in block:
+        return jsonify({"success": False, "message": "A shared block must be an object without a reference"}), 400
+    store = tenant.store
+    layout = PLANS[plan]
+
+    with store.lock(plan, lang):
+        stored = store.read_plan(plan, lang, raw=True).data or {}
+        previous = (stored.get(templates.LIBRARY) or {}).get(block_id)
+        conflict = check_if_match(previous or {}, store.versions(plan, lang)["version"])
+        if conflict:
+            return conflict
+        try:
+            shared_blocks = {block_id: block}
+            versions = commit_days(tenant, plan, lang, {}, shared_blocks=shared_blocks)
+            block = shared_blocks[block_id]
+        except Exception as e:
+            print(f"Error saving {plan} shared block {block_id} ({lang}): {e}")
+            return jsonify({"success": False, "message": f"Error saving shared block {block_id}"}), 500
+
+    job = queue_block_translation(tenant, plan, block_id, lang, block, previous)
+    used_by = templates.usage(layout, stored.get(layout['collection']) or {}).get(block_id, [])
+    return jsonify({"success": True, "message": f"Shared block {block_id} saved, translation sync queued",
+                    "job_id": job.id, "version": versions["version"], "used_by": used_by}), 202
+
+
+def delete_shared_block(tenant, plan: str, block_id: str):
+    lang, error = lang_param()
+    if error:
+        return error
+    store = tenant.store
+    layout = PLANS[plan]
+
+    with store.lock(plan, lang):
+        stored = store.read_plan(plan, lang, raw=True).data or {}
+        previous = (stored.get(templates.LIBRARY) or {}).get(block_id)
+        if previous is None:
+            return jsonify({"success": False, "message": f"No shared block {block_id}"}), 404
+        used_by = templates.usage(layout, stored.get(layout['collection']) or {}).get(block_id)
+        if used_by:
+            return jsonify({"success": False, "used_by": used_by,
+                            "message": f"Shared block {block_id} is used by {', '.join(used_by)}"}), 409
+        try:
+            versions = commit_days(tenant, plan, lang, {}, shared_blocks={block_id: None})
+        except Exception as e:
+            print(f"Error deleting {plan} shared block {block_id} ({lang}): {e}")
+            return jsonify({"success": False, "message": f"Error deleting shared block {block_id}"}), 500
+
+    job = queue_block_translation(tenant, plan, block_id, lang, None, previous)
+    return jsonify({"success": True, "message": f"Shared block {block_id} deleted",
+                    "job_id": job.id, "version": versions["version"]}), 202
+
+
+def get_day_versions(tenant, plan: str, day: str):
+    """A day's saved versions, newest first (?limit=N)."""
+    lang, error = day_params(day)
+    if error:
+        return error
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    return jsonify({"success": True, "day": day, "lang": lang,
+                    "versions": tenant.snapshots.versions(plan, lang, day, limit)})
+
+
+def get_day_version(tenant, plan: str, day: str, snapshot_id: int):
+    """A saved version of a day, as stored (template references kept)."""
+    lang, error = day_params(day)
+    if error:
+        return error
+    try:
+        data = tenant.snapshots.load(plan, lang, day, snapshot_id)
+    except UnknownSnapshot as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    return jsonify({"success": True, "id": snapshot_id, "deleted": data is None, "data": data})
+
+
+def diff_day_versions(tenant, plan: str, day: str):
+    """What changed between two versions of a day (?from=<id>&to=<id>, default: the latest)."""
+    lang, error = day_params(day)
+    if error:
+        return error
+    from_id = request.args.get('from', type=int)
+    if from_id is None:
+        return jsonify({"success": False, "message": "Missing ?from=<version id>"}), 400
+    try:
+        diff = tenant.snapshots.diff(plan, lang, day, from_id, request.args.get('to', type=int))
+    except UnknownSnapshot as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    return jsonify({"success": True, "day": day, "lang": lang, **diff})
+
+
+def restore_day_version(tenant, plan: str, day: str, snapshot_id: int, label: str):
+    """Save a day as it was in an earlier version (recorded as a new version)."""
+    lang, error = day_params(day)
+    if error:
+        return error
+    store = tenant.store
+    try:
+        data = tenant.snapshots.load(plan, lang, day, snapshot_id)
+    except UnknownSnapshot as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    if data is None:
+        return jsonify({"success": False, "message": f"Version {snapshot_id} of {day} is a deletion"}), 409
+
+    with store.lock(plan, lang):
+        previous = load_plan_day(tenant, plan, lang, day)
+        conflict = check_if_match(previous or {}, store.versions(plan, lang)["days"].get(day, 0))
+        if conflict:
+            return conflict
+        baseline = load_plan_day(tenant, plan, lang, day, raw=True)
+        try:
+            days = {day: data}
+            versions = commit_days(tenant, plan, lang, days)
+            data = days[day]
+        except templates.TemplateError as e:
+            # e.g. the version uses a shared block deleted since
+            return template_error(e)
+        except Exception as e:
+            print(f"Error restoring {plan} {day} ({lang}) to version {snapshot_id}: {e}")
+            return jsonify({"success": False, "message": f"Error restoring {day} {label}"}), 500
+
+    job = queue_day_translation(tenant, plan, day, lang, data, baseline)
+    return jsonify({"success": True,
+                    "message": f"{day.capitalize()} {label} restored to version {snapshot_id}, "
+                               "translation sync queued",
+                    "job_id": job.id, "version": versions["version"],
+                    "day_version": versions["days"][day]}), 202
+
+
 # ===== Static Routes =====
 
 @app.route('/')
@@ -56,257 +926,525 @@ def serve_static(filename):
     return send_from_directory('static', filename)
 
 
+# ===== Athletes =====
+
+def tenant_route(rule, **options):
+    """
+    Register a view under /api<rule> (the default namespace) and under
+    /api/athletes/<athlete><rule>; the view gets the tenant as `tenant`.
+    """
+    def register(view):
+        def scoped(athlete=None, **kwargs):
+            return view(tenant_registry.get(athlete), **kwargs)
+        scoped.__name__ = view.__name__
+        scoped.__doc__ = view.__doc__
+        app.route(f'/api{rule}', **options)(scoped)
+        app.route(f'/api/athletes/<athlete>{rule}', **options)(scoped)
+        return scoped
+    return register
+
+
+@app.errorhandler(tenants.UnknownAthlete)
+def unknown_athlete(e):
+    return jsonify({"success": False, "message": str(e)}), 404
+
+
+@app.route('/api/athletes', methods=['GET'])
+def list_athletes():
+    """Athletes in id order, ?after=<id>&limit=N per page."""
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    athletes = tenant_registry.index.list(request.args.get('after', ''), limit)
+    return jsonify({"success": True, "athletes": athletes,
+                    "next": athletes[-1]["id"] if len(athletes) == limit else None})
+
+
+@app.route('/api/athletes', methods=['POST'])
+def create_athlete():
+    """Register an athlete: {"id": "jane-doe", "name": "Jane Doe"}."""
+    data = request.get_json(silent=True) or {}
+    athlete = data.get('id')
+    try:
+        created = tenant_registry.create(athlete, data.get('name') or athlete)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    if not created:
+        return jsonify({"success": False, "message": f"Athlete {athlete} already exists"}), 409
+    return jsonify({"success": True, "message": f"Athlete {athlete} created",
+                    "athlete": tenant_registry.index.get(athlete)}), 201
+
+
+@app.route('/api/athletes/<athlete>', methods=['GET'])
+def get_athlete(athlete):
+    """An athlete's index entry: plan versions and last-modified times."""
+    entry = tenant_registry.index.get(athlete)
+    if entry is None:
+        raise tenants.UnknownAthlete(f"Unknown athlete: {athlete}")
+    return jsonify({"success": True, "athlete": entry})
+
+
 # ===== API Routes - Gym Routines =====
 
-@app.route('/api/gym', methods=['GET'])
-def get_gym_routine():
+@tenant_route('/gym', methods=['GET'])
+def get_gym_routine(tenant):
     """Get the complete gym routine."""
-    lang = request.args.get('lang', 'en')
-    if lang == 'es':
-        data = load_json(DATA_DIR / 'gym-routine-es' / 'gym-routine.json')
-        if not data:
-            # Fallback: try loading individual day files
-            data = {"weekly_routine": {}}
-            for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday']:
-                day_data = load_json(DATA_DIR / 'gym-routine-es' / f'{day}.json')
-                if day_data:
-                    data["weekly_routine"][day] = day_data
-    else:
-        data = load_json(DATA_DIR / 'gym-routine.json')
-    return jsonify(data)
+    return get_plan(tenant, 'gym')
 
 
-@app.route('/api/gym', methods=['POST'])
-def save_gym_routine():
+@tenant_route('/gym', methods=['POST', 'PUT'])
+def save_gym_routine(tenant):
     """Save the complete gym routine."""
-    lang = request.args.get('lang', 'en')
-    data = request.json
-    
-    if lang == 'es':
-        filepath = DATA_DIR / 'gym-routine-es' / 'gym-routine.json'
-    else:
-        filepath = DATA_DIR / 'gym-routine.json'
-    
-    if save_json(filepath, data):
-        # Also save individual day files for compatibility
-        if 'weekly_routine' in data:
-            for day, day_data in data['weekly_routine'].items():
-                if lang == 'es':
-                    day_filepath = DATA_DIR / 'gym-routine-es' / f'{day}.json'
-                else:
-                    day_filepath = DATA_DIR / 'gym-routine' / f'{day}.json'
-                save_json(day_filepath, day_data)
-        return jsonify({"success": True, "message": "Gym routine saved successfully"})
-    return jsonify({"success": False, "message": "Error saving gym routine"}), 500
-
-
-@app.route('/api/gym/<day>', methods=['GET'])
-def get_gym_day(day):
+    return save_plan(tenant, 'gym', 'Gym routine')
+
+
+@tenant_route('/gym/blocks', methods=['GET'])
+def get_gym_blocks(tenant):
+    """List the gym shared blocks."""
+    return get_shared_blocks(tenant, 'gym')
+
+
+@tenant_route('/gym/blocks/<block_id>', methods=['GET'])
+def get_gym_block(tenant, block_id):
+    """Get a gym shared block."""
+    return get_shared_block(tenant, 'gym', block_id)
+
+
+@tenant_route('/gym/blocks/<block_id>', methods=['POST', 'PUT'])
+def save_gym_block(tenant, block_id):
+    """Save a gym shared block."""
+    return save_shared_block(tenant, 'gym', block_id)
+
+
+@tenant_route('/gym/blocks/<block_id>', methods=['DELETE'])
+def delete_gym_block(tenant, block_id):
+    """Delete a gym shared block that no day uses."""
+    return delete_shared_block(tenant, 'gym', block_id)
+
+
+@tenant_route('/gym/<day>', methods=['GET'])
+def get_gym_day(tenant, day):
     """Get a specific day's gym routine."""
-    lang = request.args.get('lang', 'en')
-    
-    # Try loading from main file first
-    if lang == 'es':
-        main_data = load_json(DATA_DIR / 'gym-routine-es' / 'gym-routine.json')
-    else:
-        main_data = load_json(DATA_DIR / 'gym-routine.json')
-    
-    if main_data and 'weekly_routine' in main_data and day in main_data['weekly_routine']:
-        return jsonify(main_data['weekly_routine'][day])
-    
-    # Fallback to individual day file
-    if lang == 'es':
-        data = load_json(DATA_DIR / 'gym-routine-es' / f'{day}.json')
-    else:
-        data = load_json(DATA_DIR / 'gym-routine' / f'{day}.json')
-    
-    return jsonify(data)
+    return get_plan_day(tenant, 'gym', day)
 
 
-@app.route('/api/gym/<day>', methods=['POST'])
-def save_gym_day(day):
+@tenant_route('/gym/<day>', methods=['POST', 'PUT'])
+def save_gym_day(tenant, day):
     """Save a specific day's gym routine."""
+    return save_plan_day(tenant, 'gym', day, 'routine')
+
+
+@tenant_route('/gym/<day>', methods=['PATCH'])
+def patch_gym_day(tenant, day):
+    """Patch fields of a specific day's gym routine (JSON Patch or path/value)."""
+    return patch_plan_day(tenant, 'gym', day)
+
+
+# ===== API Routes - Exercise Catalog =====
+
+@app.route('/api/exercises', methods=['GET'])
+def search_exercises():
+    """Autocomplete: exercises whose name words start with the words of ?q=."""
     lang = request.args.get('lang', 'en')
-    data = request.json
-    
-    # Update main file
-    if lang == 'es':
-        main_filepath = DATA_DIR / 'gym-routine-es' / 'gym-routine.json'
-        day_filepath = DATA_DIR / 'gym-routine-es' / f'{day}.json'
-    else:
-        main_filepath = DATA_DIR / 'gym-routine.json'
-        day_filepath = DATA_DIR / 'gym-routine' / f'{day}.json'
-    
-    # Update main routine file (current lang)
-    main_data = load_json(main_filepath)
-    if 'weekly_routine' not in main_data:
-        main_data['weekly_routine'] = {}
-    main_data['weekly_routine'][day] = data
-    save_json(main_filepath, main_data)
-    
-    # Also save individual day file (current lang)
-    save_json(day_filepath, data)
-    
-    # ===== AUTO-TRANSLATION SYNC =====
     try:
-        # Determine target language and paths
-        target_lang = 'en' if lang == 'es' else 'es'
-        
-        if target_lang == 'es':
-            target_main_filepath = DATA_DIR / 'gym-routine-es' / 'gym-routine.json'
-            target_day_filepath = DATA_DIR / 'gym-routine-es' / f'{day}.json'
-        else:
-            target_main_filepath = DATA_DIR / 'gym-routine.json'
-            target_day_filepath = DATA_DIR / 'gym-routine' / f'{day}.json'
-            
-        # Translate Data
-        print(f"Syncing translation to {target_lang}...")
-        translated_data = translator.translate_structure(data, target_lang)
-        
-        # Save Translated Individual File
-        save_json(target_day_filepath, translated_data)
-        
-        # Save Translated Main File
-        target_main_data = load_json(target_main_filepath)
-        if 'weekly_routine' not in target_main_data:
-            target_main_data['weekly_routine'] = {}
-        target_main_data['weekly_routine'][day] = translated_data
-        save_json(target_main_filepath, target_main_data)
-        
-        print(f"Successfully synced translation for {day} ({target_lang})")
-        
-    except Exception as e:
-        print(f"Error syncing translation: {e}")
-        # Note: We don't return 500 here because the primary save succeeded
-    
-    return jsonify({"success": True, "message": f"{day.capitalize()} routine saved and synced successfully"})
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+    except ValueError:
+        return jsonify({"success": False, "message": "limit must be a number"}), 400
+    results = exercise_catalog.search(request.args.get('q', ''), lang, limit)
+    return jsonify({"exercises": [{"id": entry["id"], "name": entry["name"].get(lang) or entry["name"].get('en'),
+                                   "names": entry["name"], "category": entry.get("category", '')}
+                                  for entry in results]})
+
+
+@app.route('/api/exercises/<exercise_id>', methods=['GET'])
+def get_exercise(exercise_id):
+    entry = exercise_catalog.get(exercise_id)
+    if entry is None:
+        return jsonify({"success": False, "message": f"Unknown exercise: {exercise_id}"}), 404
+    return jsonify(entry)
 
 
 # ===== API Routes - Diet Plans =====
 
-@app.route('/api/diet', methods=['GET'])
-def get_diet_plan():
+@tenant_route('/diet', methods=['GET'])
+def get_diet_plan(tenant):
     """Get the complete diet plan."""
-    lang = request.args.get('lang', 'en')
-    if lang == 'es':
-        data = load_json(DATA_DIR / 'diet-plan-es' / 'diet-plan.json')
-        if not data:
-            data = {"weekly_diet": {}}
-            for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']:
-                day_data = load_json(DATA_DIR / 'diet-plan-es' / f'{day}.json')
-                if day_data:
-                    data["weekly_diet"][day] = day_data
-    else:
-        data = load_json(DATA_DIR / 'diet-plan.json')
-    return jsonify(data)
+    return get_plan(tenant, 'diet')
 
 
-@app.route('/api/diet', methods=['POST'])
-def save_diet_plan():
+@tenant_route('/diet', methods=['POST', 'PUT'])
+def save_diet_plan(tenant):
     """Save the complete diet plan."""
-    lang = request.args.get('lang', 'en')
-    data = request.json
-    
-    if lang == 'es':
-        filepath = DATA_DIR / 'diet-plan-es' / 'diet-plan.json'
-    else:
-        filepath = DATA_DIR / 'diet-plan.json'
-    
-    if save_json(filepath, data):
-        if 'weekly_diet' in data:
-            for day, day_data in data['weekly_diet'].items():
-                if lang == 'es':
-                    day_filepath = DATA_DIR / 'diet-plan-es' / f'{day}.json'
-                else:
-                    day_filepath = DATA_DIR / 'diet-plan' / f'{day}.json'
-                save_json(day_filepath, day_data)
-        return jsonify({"success": True, "message": "Diet plan saved successfully"})
-    return jsonify({"success": False, "message": "Error saving diet plan"}), 500
-
-
-@app.route('/api/diet/<day>', methods=['GET'])
-def get_diet_day(day):
+    return save_plan(tenant, 'diet', 'Diet plan')
+
+
+@tenant_route('/diet/summary', methods=['GET'])
+def get_diet_summary(tenant):
+    """Per-meal, per-day and weekly diet totals, with mismatches against declared totals."""
+    lang, error = lang_param()
+    if error:
+        return error
+    return document_response(tenant, ('diet-summary', lang), tenant.store.read_plan('diet', lang),
+                             version_headers(tenant, 'diet', lang), build=diet_summary.summarize)
+
+
+@tenant_route('/diet/blocks', methods=['GET'])
+def get_diet_blocks(tenant):
+    """List the diet shared blocks."""
+    return get_shared_blocks(tenant, 'diet')
+
+
+@tenant_route('/diet/blocks/<block_id>', methods=['GET'])
+def get_diet_block(tenant, block_id):
+    """Get a diet shared block."""
+    return get_shared_block(tenant, 'diet', block_id)
+
+
+@tenant_route('/diet/blocks/<block_id>', methods=['POST', 'PUT'])
+def save_diet_block(tenant, block_id):
+    """Save a diet shared block."""
+    return save_shared_block(tenant, 'diet', block_id)
+
+
+@tenant_route('/diet/blocks/<block_id>', methods=['DELETE'])
+def delete_diet_block(tenant, block_id):
+    """Delete a diet shared block that no day uses."""
+    return delete_shared_block(tenant, 'diet', block_id)
+
+
+@tenant_route('/diet/<day>', methods=['GET'])
+def get_diet_day(tenant, day):
     """Get a specific day's diet plan."""
-    lang = request.args.get('lang', 'en')
-    
-    if lang == 'es':
-        main_data = load_json(DATA_DIR / 'diet-plan-es' / 'diet-plan.json')
-    else:
-        main_data = load_json(DATA_DIR / 'diet-plan.json')
-    
-    if main_data and 'weekly_diet' in main_data and day in main_data['weekly_diet']:
-        return jsonify(main_data['weekly_diet'][day])
-    
-    if lang == 'es':
-        data = load_json(DATA_DIR / 'diet-plan-es' / f'{day}.json')
-    else:
-        data = load_json(DATA_DIR / 'diet-plan' / f'{day}.json')
-    
-    return jsonify(data)
+    return get_plan_day(tenant, 'diet', day)
 
 
-@app.route('/api/diet/<day>', methods=['POST'])
-def save_diet_day(day):
+@tenant_route('/diet/<day>', methods=['POST', 'PUT'])
+def save_diet_day(tenant, day):
     """Save a specific day's diet plan."""
+    return save_plan_day(tenant, 'diet', day, 'diet')
+
+
+@tenant_route('/diet/<day>', methods=['PATCH'])
+def patch_diet_day(tenant, day):
+    """Patch fields of a specific day's diet plan (JSON Patch or path/value)."""
+    return patch_plan_day(tenant, 'diet', day)
+
+
+# ===== API Routes - Bulk Save =====
+
+def bulk_errors(body) -> list:
+    """What is wrong with a bulk save body ({plan: {day: data}}); empty if nothing."""
+    if not isinstance(body, dict) or not body:
+        return ["Expected an object of plans: {\"gym\": {day: data}, \"diet\": {day: data}}"]
+    errors = []
+    for plan, days in body.items():
+        if plan not in PLANS:
+            errors.append(f"Unknown plan: {plan}")
+        elif not isinstance(days, dict) or not days:
+            errors.append(f"{plan}: expected an object of days")
+        else:
+            errors += days_errors(plan, days)
+    return errors
+
+
+def check_templates(tenant, plan: str, lang: str, days: dict):
+    """Raise TemplateError if saving `days` would leave a template reference dangling."""
+    layout = PLANS[plan]
+    stored = tenant.store.read_plan(plan, lang, raw=True).data or {}
+    collection = {**(stored.get(layout['collection']) or {}), **days}
+    library = stored.get(templates.LIBRARY) or {}
+    memo = {}
+    for day in list(days) + sorted(templates.dependents(layout, collection, days)):
+        templates.resolve_day(layout, collection, library, day, memo)
+
+
+@tenant_route('/bulk', methods=['POST', 'PUT'])
+def save_bulk(tenant):
+    """
+    Save any days of both plans at once ({"gym": {day: data}, "diet":
+    {day: data}}), e.g. a coach's full program. Everything is checked
+    before anything is written; the other language is translated in one
+    pass over the text of all the days, and both languages of every plan
+    are committed in one transaction.
+    """
     lang = request.args.get('lang', 'en')
-    data = request.json
-    
-    if lang == 'es':
-        main_filepath = DATA_DIR / 'diet-plan-es' / 'diet-plan.json'
-        day_filepath = DATA_DIR / 'diet-plan-es' / f'{day}.json'
-    else:
-        main_filepath = DATA_DIR / 'diet-plan.json'
-        day_filepath = DATA_DIR / 'diet-plan' / f'{day}.json'
-    
-    main_data = load_json(main_filepath)
-    if 'weekly_diet' not in main_data:
-        main_data['weekly_diet'] = {}
-    main_data['weekly_diet'][day] = data
-    save_json(main_filepath, main_data)
-    save_json(day_filepath, data)
-    
-    # ===== AUTO-TRANSLATION SYNC =====
+    if lang not in LANGS:
+        return jsonify({"success": False, "message": f"Unknown language: {lang}"}), 400
+    target_lang = other_lang(lang)
+    body = request.get_json(silent=True)
+    errors = bulk_errors(body)
+    if errors:
+        return invalid("Invalid bulk save", errors)
+    store = tenant.store
+
+    with ExitStack() as locks:
+        for plan, plan_lang in sorted((plan, plan_lang) for plan in body for plan_lang in (lang, target_lang)):
+            locks.enter_context(store.lock(plan, plan_lang))
+        try:
+            plans = {}
+            for plan, days in body.items():
+                days = rebase_days(tenant, plan, lang, days)
+                if plan == 'gym':
+                    # Linked first, so translation takes catalog names
+                    days = {day: exercise_catalog.link_day(data, lang) for day, data in days.items()}
+                check_templates(tenant, plan, lang, days)
+                plans[plan] = days
+        except templates.TemplateError as e:
+            return template_error(e)
+
+        baselines, existing, blocks = {}, {}, {}
+        for plan, days in plans.items():
+            baselines[plan] = {day: None if (tenant.athlete, plan, day, target_lang) in _unsynced_days
+                               else load_plan_day(tenant, plan, lang, day, raw=True) for day in days}
+            existing[plan] = {day: load_plan_day(tenant, plan, target_lang, day, raw=True) for day in days}
+            used = set().union(*(templates.references(PLANS[plan], data)[1] for data in days.values()))
+            if used:
+                source = store.read_plan(plan, lang, raw=True).data.get(templates.LIBRARY) or {}
+                target = store.read_plan(plan, target_lang, raw=True).data.get(templates.LIBRARY) or {}
+                blocks[plan] = {block_id: source[block_id] for block_id in sorted(used)
+                                if block_id in source and block_id not in target}
+
+        try:
+            translated, translated_blocks = translate_plans(plans, target_lang, baselines, existing, blocks)
+            writes = [(plan, lang, days, None, None) for plan, days in plans.items()]
+            writes += [(plan, target_lang, translated.get(plan) or {}, None,
+                        translated_blocks.get(plan) or None, True) for plan in plans]
+            versions = commit_plans(tenant, writes)
+        except templates.TemplateError as e:
+            return template_error(e)
+        except Exception as e:
+            print(f"Error in bulk save ({lang}): {e}")
+            return jsonify({"success": False, "message": "Error saving days"}), 500
+
+    for plan, days in plans.items():
+        for day in days:
+            _unsynced_days.discard((tenant.athlete, plan, day, target_lang))
+    saved = sum(len(days) for days in plans.values())
+    return jsonify({
+        "success": True,
+        "message": f"{saved} day(s) saved in {lang} and {target_lang}",
+        "versions": {plan: {plan_lang: {"version": versions[plan, plan_lang]["version"],
+                                        "days": {day: versions[plan, plan_lang]["days"][day] for day in days}}
+                            for plan_lang in (lang, target_lang)}
+                     for plan, days in plans.items()},
+    })
+
+
+# ===== API Routes - Combined Bundle =====
+
+def list_param(name, default, allowed=None):
+    """A comma-separated query parameter as a tuple; raises ValueError for unknown values."""
+    raw = request.args.get(name)
+    values = tuple(dict.fromkeys(v.strip() for v in raw.split(',') if v.strip())) if raw else tuple(default)
+    unknown = [v for v in values if allowed is not None and v not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown {name}: {', '.join(unknown)}")
+    return values
+
+
+@tenant_route('/bundle', methods=['GET'])
+def get_bundle(tenant):
+    """
+    Gym and diet days for several languages in one response, projected to
+    ?fields= (see projection.py). Query: lang=en,es  plans=gym,diet
+    days=monday,tuesday (default: every day)  fields=blocks.exercises.name,...
+    Body: {"days": {lang: {plan: {day: data}}}, "versions": {lang: {plan: {day: version}}}}
+    """
     try:
-        # Determine target language and paths
-        target_lang = 'en' if lang == 'es' else 'es'
-        
-        if target_lang == 'es':
-            target_main_filepath = DATA_DIR / 'diet-plan-es' / 'diet-plan.json'
-            target_day_filepath = DATA_DIR / 'diet-plan-es' / f'{day}.json'
-        else:
-            target_main_filepath = DATA_DIR / 'diet-plan.json'
-            target_day_filepath = DATA_DIR / 'diet-plan' / f'{day}.json'
-            
-        # Translate Data
-        print(f"Syncing diet translation to {target_lang}...")
-        translated_data = translator.translate_structure(data, target_lang)
-        
-        # Save Translated Individual File
-        save_json(target_day_filepath, translated_data)
-        
-        # Save Translated Main File
-        target_main_data = load_json(target_main_filepath)
-        if 'weekly_diet' not in target_main_data:
-            target_main_data['weekly_diet'] = {}
-        target_main_data['weekly_diet'][day] = translated_data
-        save_json(target_main_filepath, target_main_data)
-        
-        print(f"Successfully synced diet translation for {day} ({target_lang})")
-        
-    except Exception as e:
-        print(f"Error syncing diet translation: {e}")
-    
-    return jsonify({"success": True, "message": f"{day.capitalize()} diet saved and synced successfully"})
+        langs = list_param('lang', ('en',), LANGS)
+        plans = list_param('plans', PLANS, PLANS)
+        days = list_param('days', (), DAYS)
+        spec = projection.normalize(request.args.get('fields', ''))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    projectors = projection.compile_spec(spec)
+
+    store = tenant.store
+    docs = {(plan, lang): store.read_plan(plan, lang) for lang in langs for plan in plans}
+
+    def build():
+        bundle = {"days": {}, "versions": {}}
+        for lang in langs:
+            bundle["days"][lang], bundle["versions"][lang] = {}, {}
+            for plan in plans:
+                week = (docs[(plan, lang)].data or {}).get(PLANS[plan]['collection']) or {}
+                selected = [day for day in (days or week) if week.get(day) is not None]
+                day_versions = store.versions(plan, lang)["days"]
+                bundle["days"][lang][plan] = {day: projectors[plan](week[day]) for day in selected}
+                bundle["versions"][lang][plan] = {day: version for day, version in sorted(day_versions.items())
+                                                  if not days or day in days}
+        return bundle
+
+    # One cached body per query, rebuilt only when one of its documents changes
+    mtimes = [doc.last_modified for doc in docs.values() if doc.last_modified is not None]
+    cached = response_cache.get(('bundle', langs, plans, days, spec, tenant.athlete, store.name),
+                                tuple(doc.tag for doc in docs.values()), build,
+                                max(mtimes) if mtimes else None)
+    return http_cache.make_response(request, cached)
+
+
+# ===== API Routes - Background Jobs =====
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status of a background translation sync job."""
+    job = sync_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+
+# ===== Workout History =====
+
+@tenant_route('/history', methods=['GET'])
+def get_history(tenant):
+    """Every logged exercise with its personal best, 1RM estimate and last set."""
+    return jsonify({"success": True, "exercises": tenant.history.exercises()})
+
+
+@tenant_route('/history/volume', methods=['GET'])
+def get_history_volume(tenant):
+    """Weekly volume per muscle group for the last ?weeks=N weeks."""
+    weeks = min(max(request.args.get('weeks', 4, type=int), 1), 520)
+    return jsonify({"success": True, "weeks": tenant.history.weekly_volume(weeks)})
+
+
+@tenant_route('/history/<key>', methods=['GET'])
+def get_exercise_history(tenant, key):
+    """An exercise's logged sets (?since=<unix time>) and its summary."""
+    history = tenant.history.history(key, request.args.get('since', 0.0, type=float))
+    if history is None:
+        return jsonify({"success": False, "message": f"No history for {key}"}), 404
+    return jsonify({"success": True, **history})
+
+
+@tenant_route('/history/<key>/trend', methods=['GET'])
+def get_exercise_trend(tenant, key):
+    """Per-week volume, top weight and 1RM estimate for the last ?weeks=N weeks."""
+    weeks = min(max(request.args.get('weeks', 8, type=int), 1), 520)
+    trend = tenant.history.trend(key, weeks)
+    if trend is None:
+        return jsonify({"success": False, "message": f"No history for {key}"}), 404
+    return jsonify({"success": True, "key": key, "weeks": trend})
+
+
+# ===== Snapshot History =====
+
+@tenant_route('/gym/<day>/versions', methods=['GET'])
+def get_gym_day_versions(tenant, day):
+    return get_day_versions(tenant, 'gym', day)
+
+
+@tenant_route('/gym/<day>/versions/diff', methods=['GET'])
+def diff_gym_day_versions(tenant, day):
+    return diff_day_versions(tenant, 'gym', day)
+
+
+@tenant_route('/gym/<day>/versions/<int:snapshot_id>', methods=['GET'])
+def get_gym_day_version(tenant, day, snapshot_id):
+    return get_day_version(tenant, 'gym', day, snapshot_id)
+
+
+@tenant_route('/gym/<day>/versions/<int:snapshot_id>/restore', methods=['POST'])
+def restore_gym_day_version(tenant, day, snapshot_id):
+    return restore_day_version(tenant, 'gym', day, snapshot_id, 'routine')
+
+
+@tenant_route('/diet/<day>/versions', methods=['GET'])
+def get_diet_day_versions(tenant, day):
+    return get_day_versions(tenant, 'diet', day)
+
+
+@tenant_route('/diet/<day>/versions/diff', methods=['GET'])
+def diff_diet_day_versions(tenant, day):
+    return diff_day_versions(tenant, 'diet', day)
+
+
+@tenant_route('/diet/<day>/versions/<int:snapshot_id>', methods=['GET'])
+def get_diet_day_version(tenant, day, snapshot_id):
+    return get_day_version(tenant, 'diet', day, snapshot_id)
+
+
+@tenant_route('/diet/<day>/versions/<int:snapshot_id>/restore', methods=['POST'])
+def restore_diet_day_version(tenant, day, snapshot_id):
+    return restore_day_version(tenant, 'diet', day, snapshot_id, 'diet')
+
+
+# ===== Change Feed =====
+
+def change_feed_params():
+    """Parse ?since=&plan=&lang=&epoch= (shared by the poll and stream routes)."""
+    since = request.args.get('since', request.headers.get('Last-Event-ID', '0'))
+    try:
+        since = int(since)
+    except ValueError:
+        since = -1
+    if since < 0:
+        return None, (jsonify({"success": False, "message": "'since' must be a non-negative integer"}), 400)
+    plan = request.args.get('plan')
+    if plan is not None and plan not in PLANS:
+        return None, (jsonify({"success": False, "message": f"Unknown plan: {plan}"}), 400)
+    return {"seq": since, "plan": plan, "lang": request.args.get('lang'),
+            "epoch": request.args.get('epoch')}, None
+
+
+@tenant_route('/changes', methods=['GET'])
+def get_changes(tenant):
+    """Changes saved after ?since=<seq> (only the days and values that changed)."""
+    params, error = change_feed_params()
+    if error:
+        return error
+    limit = request.args.get('limit', 500, type=int)
+    result = tenant.changes.since(limit=max(limit, 1), athlete=tenant.athlete, **params)
+    return jsonify({"success": True, **result})
+
+
+@tenant_route('/changes/stream', methods=['GET'])
+def stream_changes(tenant):
+    """Server-Sent Events push of the change feed, resumable via Last-Event-ID."""
+    params, error = change_feed_params()
+    if error:
+        return error
+
+    def events():
+        cursor = params["seq"]
+        epoch = params["epoch"]
+        while True:
+            result = tenant.changes.since(cursor, params["plan"], params["lang"], epoch=epoch,
+                                      athlete=tenant.athlete)
+            if result["reset"]:
+                yield f"event: reset\ndata: {json.dumps({'seq': result['seq'], 'epoch': result['epoch']})}\n\n"
+            for entry in result["changes"]:
+                yield f"id: {entry['seq']}\nevent: change\ndata: {json.dumps(entry, ensure_ascii=False)}\n\n"
+            cursor, epoch = result["seq"], result["epoch"]
+            if not tenant.changes.wait(cursor, timeout=CHANGE_STREAM_HEARTBEAT):
+                yield ": keep-alive\n\n"
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# ===== Metrics =====
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics: request latency, spans, caches and translation counters."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 
 # ===== Main =====
 
 if __name__ == '__main__':
+    recovered = tenants.recover(DATA_DIR)
+    if recovered:
+        print(f"Recovered {recovered} file(s) from an interrupted save")
+
     print("\n" + "="*50)
     print("  🏋️ Fitness App Admin Server")
     print("="*50)
     print(f"\n  📂 Data directory: {DATA_DIR}")
+    print(f"  🗄️  Storage: {store.name}")
+    print(f"  📦 Static bundles: {'rebuilt on save' if BUILD_STATIC else 'off'}")
     print(f"  🌐 Admin URL: http://localhost:5000")
+    print("  ⚠️  Development server; use serve.py for production")
     print("\n  Press Ctrl+C to stop the server\n")
     print("="*50 + "\n")
     
@@ -0,0 +1,323 @@
+"""
+Snapshot History
+Every saved version of every day, kept as content-addressed chunks so a day
+can be listed, compared and rolled back (data/.snapshots/):
+
+    objects/3f/a2c1...json     one chunk: a block, or a day's other fields
+    <plan>-<lang>/<day>.jsonl  the day's versions, one line each:
+        {"id": 7, "version": 12, "time": ..., "fields": "<hash>", "blocks": ["<hash>", ...]}
+
+Chunks are named by the SHA-256 of their bytes and written once. A save
+costs one new chunk per block that changed (a weight edit: one block), a new
+fields chunk if the day's own fields changed, and one log line; every
+version shares the chunks it has in common with the others. Days are
+recorded as stored (templates unresolved, see templates.py); a deleted day
+is a line with "deleted": true. Saves that leave a day's content unchanged
+(e.g. a dependent day getting a new version) add nothing.
+
+- versions() lists a day's versions, newest first. Logs are read backwards
+  from their end, so listing recent versions or rolling back to one costs
+  the same however long the history is.
+- diff() compares two versions, reading only the chunks whose hashes differ.
+- load() rebuilds a version, for rollback.
+- prune() thins old versions (all of the last KEEP_ALL_DAYS, then the last
+  of each day up to KEEP_DAILY_DAYS, and always the last KEEP_LATEST) and
+  deletes chunks no version uses. The server runs it in the background at
+  most every PRUNE_INTERVAL seconds.
+"""
+
+import hashlib
+import json
+import os
+import time
+from difflib import SequenceMatcher
+from itertools import islice
+from pathlib import Path
+
+import storage
+from plan_store import PLANS
+
+DAY_SECONDS = 24 * 3600
+
+KEEP_ALL_DAYS = 7
+KEEP_DAILY_DAYS = 90
+KEEP_LATEST = 20
+
+PRUNE_INTERVAL = 3600
+
+# Unused chunks younger than this are left for the next prune
+PRUNE_GRACE = 3600
+
+# Bytes read at a time when reading a log backwards
+_CHUNK_BYTES = 8192
+
+
+def encode_chunk(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def chunk_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class UnknownSnapshot(LookupError):
+    """No version with this id is recorded for the day."""
+
+
+class SnapshotStore:
+    """The chunk store and version logs of one data directory."""
+
+    def __init__(self, directory, keep_all_days=KEEP_ALL_DAYS, keep_daily_days=KEEP_DAILY_DAYS,
+                 keep_latest=KEEP_LATEST):
+        self.directory = Path(directory)
+        self.keep_all_days = keep_all_days
+        self.keep_daily_days = keep_daily_days
+        self.keep_latest = keep_latest
+        self._last_prune_check = 0.0
+
+    # ----- Paths -----
+
+    def object_path(self, digest):
+        return self.directory / 'objects' / digest[:2] / f'{digest[2:]}.json'
+
+    def log_path(self, plan, lang, day):
+        return self.directory / f'{plan}-{lang}' / f'{day}.jsonl'
+
+    def _file_lock(self):
+        """Excludes other processes recording, and pruning, in the same store."""
+        return storage.document_lock('snapshots', lock_dir=self.directory)
+
+    # ----- Chunks -----
+
+    def _split(self, plan, data, staged):
+        """A version entry's content fields for a day; new chunks are added to `staged`."""
+        if not isinstance(data, dict):
+            return {"deleted": True}
+
+        def put(value):
+            body = encode_chunk(value)
+            digest = chunk_hash(body)
+            if digest not in staged and not self.object_path(digest).exists():
+                staged[digest] = body
+            return digest
+
+        blocks_key = PLANS[plan]['blocks']
+        blocks = data.get(blocks_key)
+        if not isinstance(blocks, list):
+            return {"fields": put(data), "blocks": None}
+        # The blocks' place in the key order is kept with a null
+        return {"fields": put({**data, blocks_key: None}), "blocks": [put(block) for block in blocks]}
+
+    def _chunk(self, digest):
+        with open(self.object_path(digest), 'rb') as f:
+            return json.loads(f.read())
+
+    def _assemble(self, plan, entry):
+        if entry.get("deleted"):
+            return None
+        data = self._chunk(entry["fields"])
+        if entry.get("blocks") is not None:
+            data[PLANS[plan]['blocks']] = [self._chunk(digest) for digest in entry["blocks"]]
+        return data
+
+    # ----- Logs -----
+
+    @staticmethod
+    def _parse(raw: bytes):
+        # A torn trailing line (interrupted append) has no newline yet
+        lines = raw.split(b'\n')[:-1]
+        return [json.loads(line) for line in lines if line.strip()]
+
+    @staticmethod
+    def _newest_first(path):
+        """A log's complete entries, newest first, read backwards from its end in chunks."""
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            position = f.seek(0, os.SEEK_END)
+            buffer, torn = b'', True
+            while position > 0:
+                size = min(_CHUNK_BYTES, position)
+                position -= size
+                f.seek(position)
+                buffer = f.read(size) + buffer
+                if torn:
+                    # Skip a torn trailing line (interrupted append)
+                    cut = buffer.rfind(b'\n')
+                    if cut < 0:
+                        continue
+                    buffer, torn = buffer[:cut], False
+                lines = buffer.split(b'\n')
+                # The first line may continue in the chunk before
+                buffer = lines.pop(0) if position > 0 else b''
+                for line in reversed(lines):
+                    if line.strip():
+                        yield json.loads(line)
+
+    def _last(self, path):
+        """Last complete entry of a log."""
+        return next(self._newest_first(path), None)
+
+    # ----- Recording -----
+
+    def record(self, plan, lang, days, versions, timestamp=None):
+        """
+        Record saved days ({day: data as stored, or None if deleted}) at
+        their new versions ({"days": {day: n}}). Returns how many versions
+        were added.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._file_lock():
+            staged, lines = {}, []
+            for day, data in days.items():
+                content = self._split(plan, data, staged)
+                path = self.log_path(plan, lang, day)
+                last = self._last(path)
+                if last is not None and all(last.get(k) == v for k, v in content.items()):
+                    continue
+                if last is None and content.get("deleted"):
+                    continue
+                entry = {"id": (last["id"] + 1) if last else 1,
+                         "version": versions["days"].get(day), "time": timestamp, **content}
+                lines.append((path, entry))
+
+            # Chunks first, so a version never refers to a missing chunk
+            tx = storage.Transaction(self.directory)
+            for digest, body in staged.items():
+                tx.write(self.object_path(digest), body)
+            tx.commit()
+            for path, entry in lines:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, 'a+b') as f:
+                    size = f.seek(0, os.SEEK_END)
+                    f.seek(max(size - _CHUNK_BYTES, 0))
+                    tail = f.read()
+                    if tail and not tail.endswith(b'\n'):
+                        # Cut a torn line left by an interrupted append
+                        f.truncate(size - len(tail) + tail.rfind(b'\n') + 1)
+                    f.write(json.dumps(entry).encode('utf-8') + b'\n')
+                    if storage.FSYNC:
+                        f.flush()
+                        os.fsync(f.fileno())
+        return len(lines)
+
+    # ----- Queries -----
+
+    def versions(self, plan, lang, day, limit=50):
+        """A day's versions, newest first: {"id", "version", "time", "deleted", "blocks"}."""
+        entries = islice(self._newest_first(self.log_path(plan, lang, day)), limit)
+        return [{"id": e["id"], "version": e.get("version"), "time": e["time"],
+                 "deleted": bool(e.get("deleted")), "blocks": len(e.get("blocks") or [])}
+                for e in entries]
+
+    def _find(self, plan, lang, day, snapshot_id=None):
+        # Ids increase through a log, so recent versions are found after reading little of it
+        for entry in self._newest_first(self.log_path(plan, lang, day)):
+            if snapshot_id is None or entry["id"] == snapshot_id:
+                return entry
+            if entry["id"] < snapshot_id:
+                break
+        raise UnknownSnapshot(f"No version {snapshot_id} of {plan} {day} ({lang})")
+
+    def load(self, plan, lang, day, snapshot_id):
+        """A version's content (None for a deletion); raises UnknownSnapshot."""
+        return self._assemble(plan, self._find(plan, lang, day, snapshot_id))
+
+    def diff(self, plan, lang, day, from_id, to_id=None):
+        """
+        What changed from one version to another (default: the latest):
+        {"fields": {key: {"from", "to"}}, "blocks": [{"op", "from_index",
+        "to_index", "from", "to"}]}. Blocks are matched by hash, so only
+        the chunks that differ are read.
+        """
+        old = self._find(plan, lang, day, from_id)
+        new = self._find(plan, lang, day, to_id)
+        result = {"from": old["id"], "to": new["id"], "fields": {}, "blocks": []}
+        if old.get("deleted") or new.get("deleted"):
+            result["deleted"] = {"from": bool(old.get("deleted")), "to": bool(new.get("deleted"))}
+            return result
+
+        if old["fields"] != new["fields"]:
+            before, after = self._chunk(old["fields"]), self._chunk(new["fields"])
+            for key in list(before) + [k for k in after if k not in before]:
+                if before.get(key) != after.get(key):
+                    result["fields"][key] = {"from": before.get(key), "to": after.get(key)}
+
+        old_blocks, new_blocks = old.get("blocks") or [], new.get("blocks") or []
+        matcher = SequenceMatcher(None, old_blocks, new_blocks, autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == 'equal':
+                continue
+            for k in range(max(i2 - i1, j2 - j1)):
+                i, j = i1 + k, j1 + k
+                result["blocks"].append({
+                    "op": op if op != 'replace' or (i < i2 and j < j2) else ('delete' if i < i2 else 'insert'),
+                    "from_index": i if i < i2 else None,
+                    "to_index": j if j < j2 else None,
+                    "from": self._chunk(old_blocks[i]) if i < i2 else None,
+                    "to": self._chunk(new_blocks[j]) if j < j2 else None,
+                })
+        return result
+
+    # ----- Pruning -----
+
+    def retained(self, entries, now):
+        """The entries of one log kept by the retention policy."""
+        keep = set(range(max(len(entries) - self.keep_latest, 0), len(entries)))
+        last_of_day = {}
+        for i, entry in enumerate(entries):
+            age = now - entry["time"]
+            if age <= self.keep_all_days * DAY_SECONDS:
+                keep.add(i)
+            elif age <= self.keep_daily_days * DAY_SECONDS:
+                last_of_day[int(entry["time"] // DAY_SECONDS)] = i
+        keep.update(last_of_day.values())
+        return [entry for i, entry in enumerate(entries) if i in keep]
+
+    def prune_due(self) -> bool:
+        """True at most once per PRUNE_INTERVAL (across processes, by the marker file)."""
+        now = time.time()
+        if now - self._last_prune_check < PRUNE_INTERVAL:
+            return False
+        self._last_prune_check = now
+        try:
+            return now - os.stat(self.directory / '.pruned').st_mtime >= PRUNE_INTERVAL
+        except FileNotFoundError:
+            return self.directory.exists()
+
+    def prune(self, now=None):
+        """Drop versions past retention and the chunks no version uses; returns (versions, chunks) removed."""
+        now = time.time() if now is None else now
+        dropped_versions = dropped_chunks = 0
+        with self._file_lock():
+            used = set()
+            tx = storage.Transaction(self.directory)
+            for path in sorted(self.directory.glob('*-*/*.jsonl')):
+                with open(path, 'rb') as f:
+                    entries = self._parse(f.read())
+                kept = self.retained(entries, now)
+                if len(kept) < len(entries):
+                    dropped_versions += len(entries) - len(kept)
+                    tx.write(path, b''.join(json.dumps(e).encode('utf-8') + b'\n' for e in kept))
+                for entry in kept:
+                    if not entry.get("deleted"):
+                        used.add(entry["fields"])
+                        used.update(entry.get("blocks") or ())
+            tx.commit()
+
+            for path in self.directory.glob('objects/*/*.json'):
+                digest = path.parent.name + path.stem
+                if digest in used:
+                    continue
+                try:
+                    if now - path.stat().st_mtime >= PRUNE_GRACE:
+                        path.unlink()
+                        dropped_chunks += 1
+                except FileNotFoundError:
+                    pass
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / '.pruned').touch()
+        return dropped_versions, dropped_chunks
@@ -4,6 +4,8 @@ let currentLang = 'en';
 let currentDay = null;
 let gymData = {};
 let dietData = {};
+// Per-day versions from the server, sent back as If-Match on save
+let dayVersions = { gym: {}, diet: {} };
 
 // ===== DOM Elements =====
 const $ = (sel) => document.querySelector(sel);
@@ -60,12 +62,13 @@ function initButtons() {
 // ===== Data Loading =====
 async function loadData() {
     try {
-        const [gymRes, dietRes] = await Promise.all([
-            fetch(`/api/gym?lang=${currentLang}`),
-            fetch(`/api/diet?lang=${currentLang}`)
-        ]);
-        gymData = await gymRes.json();
-        dietData = await dietRes.json();
+        // Both plans in one request
+        const res = await fetch(`/api/bundle?lang=${currentLang}`);
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const bundle = await res.json();
+        gymData = { weekly_routine: bundle.days[currentLang].gym };
+        dietData = { weekly_diet: bundle.days[currentLang].diet };
+        dayVersions = bundle.versions[currentLang];
         showToast('Data loaded successfully', false);
         renderEditor();
     } catch (err) {
@@ -193,6 +196,7 @@ function createExerciseItem(exercise, blockIdx, exIdx) {
         <div class="exercise-header" onclick="toggleExerciseDetails(${blockIdx}, ${exIdx})">
             ${iconDisplay}
             <input type="text" value="${name}" placeholder="Exercise name" onclick="event.stopPropagation()"
+                   list="exercise-options" oninput="suggestExercises(this.value)"
                    onchange="updateExercise(${blockIdx}, ${exIdx}, 'name', this.value)">
             <input type="text" value="${sets}" placeholder="Sets" onclick="event.stopPropagation()"
                    onchange="updateExercise(${blockIdx}, ${exIdx}, 'sets', this.value)">
@@ -349,6 +353,21 @@ function updateExercise(blockIdx, exIdx, field, value) {
     exercises[exIdx][field] = value;
 }
 
+// Fill the name datalist from the exercise catalog (debounced)
+let suggestTimer = null;
+function suggestExercises(query) {
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(async () => {
+        try {
+            const res = await fetch(`/api/exercises?q=${encodeURIComponent(query)}&lang=${currentLang}`);
+            const { exercises } = await res.json();
+            $('#exercise-options').innerHTML = exercises.map(ex => `<option value="${ex.name}">`).join('');
+        } catch (e) {
+            console.error('Exercise suggestions failed:', e);
+        }
+    }, 150);
+}
+
 // ===== Meal Operations =====
 function toggleMealContent(header) {
     header.nextElementSibling.classList.toggle('open');
@@ -391,6 +410,23 @@ function updateFood(mealIdx, foodIdx, field, value) {
 }
 
 // ===== Save =====
+async function saveDay(section, dayData) {
+    const version = dayVersions[section][currentDay] || 0;
+    const res = await fetch(`/api/${section}/${currentDay}?lang=${currentLang}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'If-Match': `"v${version}"` },
+        body: JSON.stringify(dayData)
+    });
+    const result = await res.json();
+    if (res.status === 412) {
+        throw new Error('This day was changed elsewhere. Reload to get the latest version.');
+    }
+    if (!res.ok) {
+        throw new Error(result.message || 'Error saving changes');
+    }
+    dayVersions[section][currentDay] = result.day_version;
+}
+
 async function saveCurrentDay() {
     if (!currentDay) {
         showToast('Please select a day first', true);
@@ -400,11 +436,7 @@ async function saveCurrentDay() {
     try {
         if (currentSection === 'gym') {
             gymData.weekly_routine[currentDay].focus = $('#gymFocus').value;
-            await fetch(`/api/gym/${currentDay}?lang=${currentLang}`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(gymData.weekly_routine[currentDay])
-            });
+            await saveDay('gym', gymData.weekly_routine[currentDay]);
         } else {
             const dayData = dietData.weekly_diet[currentDay];
             dayData.focus = $('#dietFocus').value;
@@ -414,15 +446,11 @@ async function saveCurrentDay() {
                 carbs: $('#macroCarbs').value,
                 fats: $('#macroFats').value
             };
-            await fetch(`/api/diet/${currentDay}?lang=${currentLang}`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(dayData)
-            });
+            await saveDay('diet', dayData);
         }
         showToast('Changes saved successfully!', false);
     } catch (err) {
-        showToast('Error saving changes', true);
+        showToast(err.message || 'Error saving changes', true);
         console.error(err);
     }
 }
@@ -0,0 +1,283 @@
+"""
+Atomic Storage Writer
+
+Writes JSON documents so that readers and crashes never see a truncated or
+half-written file:
+
+- Every file is written to a temp file in the same directory and renamed
+  over the target (os.replace is atomic on POSIX and Windows).
+- A multi-file save is one Transaction: all temp files are written, then
+  fsynced together with their directories, recorded in a commit journal
+  and only then renamed into place (files deleted by the transaction are removed in the
+  same step). If the process dies mid-rename, recover() rolls the journal
+  forward on the next start, so the group lands as one unit.
+- Each logical document has its own re-entrant lock (document_lock) for
+  read-modify-write sequences; transactions lock the files they touch.
+  Given a lock directory, document locks also take an flock() on a lock
+  file, so several worker processes can safely share the data directory.
+
+Set FITNESS_FSYNC=0 to skip the durability syncs (e.g. in development).
+"""
+
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+FSYNC = os.environ.get('FITNESS_FSYNC', '1') != '0'
+
+JOURNAL_PATTERN = '.commit-journal.*.json'
+
+# Staged in place of the data of a file a transaction deletes
+_DELETED = object()
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key, factory=threading.RLock):
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = factory()
+        return lock
+
+
+class DocumentLock:
+    """
+    Re-entrant lock that is held across threads of this process and, when it
+    has a lock file, across processes too (flock is taken on first entry).
+    """
+
+    def __init__(self, lock_path=None):
+        self.lock_path = Path(lock_path) if lock_path else None
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        self._depth += 1
+        if self._depth == 1 and self.lock_path is not None and fcntl is not None:
+            try:
+                self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.lock_path, 'a')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._depth -= 1
+                self._thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+        return False
+
+
+def document_lock(*key, lock_dir=None):
+    """
+    Lock for one logical document, e.g. document_lock('gym', 'en').
+    With `lock_dir`, the lock also excludes other processes.
+    """
+    lock_path = Path(lock_dir) / f"{'-'.join(key)}.lock" if lock_dir else None
+    return _lock_for(('doc', str(lock_path)) + key, lambda: DocumentLock(lock_path))
+
+
+def file_lock(path):
+    """Re-entrant lock for one file path."""
+    return _lock_for(('file', str(Path(path).resolve())))
+
+
+def encode_document(data) -> bytes:
+    """Serialize a document the way every data file is stored (pretty, UTF-8)."""
+    return json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
+
+
+def _fsync_dir(directory):
+    # Directories cannot be opened for fsync on Windows
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Transaction:
+    """
+    A group of file writes committed as one unit.
+
+        with Transaction(journal_dir) as tx:
+            tx.write(path_a, data_a)
+            tx.write(path_b, data_b)
+        # committed here (or nothing is, if the block raised)
+    """
+
+    def __init__(self, journal_dir, on_commit=None):
+        self.journal_dir = Path(journal_dir)
+        # Called as on_commit(path, data) for each file while its lock is still held
+        self.on_commit = on_commit
+        self._writes = {}
+
+    def write(self, path, data):
+        """Stage a document (or already-serialized bytes); the last write to a path wins."""
+        self._writes[Path(path)] = data
+
+    def delete(self, path):
+        """Stage the removal of a file (nothing happens if it does not exist)."""
+        self._writes[Path(path)] = _DELETED
+
+    @property
+    def paths(self):
+        return list(self._writes)
+
+    def commit(self):
+        if not self._writes:
+            return
+        targets = sorted(self._writes, key=str)
+        locks = [file_lock(path) for path in targets]
+        for lock in locks:
+            lock.acquire()
+        try:
+            with metrics.span('save_json'):
+                self._commit(targets)
+            if self.on_commit is not None:
+                for target in targets:
+                    data = self._writes[target]
+                    self.on_commit(target, None if data is _DELETED else data)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _commit(self, targets):
+        staged = []
+        try:
+            # 1. Write every temp file (deletions have none), kept open
+            # until all are written
+            files = []
+            try:
+                for target in targets:
+                    if self._writes[target] is _DELETED:
+                        staged.append((None, target))
+                        continue
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = target.with_name(f'.{target.name}.{uuid.uuid4().hex}.tmp')
+                    data = self._writes[target]
+                    body = data if isinstance(data, bytes) else encode_document(data)
+                    staged.append((tmp, target))
+                    f = open(tmp, 'wb')
+                    files.append(f)
+                    f.write(body)
+
+                # 2. Then make them durable together, before the journal
+                # names them: the files, and each directory once
+                if FSYNC:
+                    for f in files:
+                        f.flush()
+                        os.fsync(f.fileno())
+            finally:
+                for f in files:
+                    f.close()
+            if FSYNC:
+                for directory in {tmp.parent for tmp, _ in staged if tmp is not None}:
+                    _fsync_dir(directory)
+
+            # 3. Record intent, then rename everything into place
+            journal = None
+            if len(staged) > 1:
+                journal = self.journal_dir / f'.commit-journal.{uuid.uuid4().hex}.json'
+                _write_journal(journal, staged)
+            for tmp, target in staged:
+                _move(tmp, target)
+            if FSYNC:
+                for directory in {target.parent for _, target in staged if target.parent.is_dir()}:
+                    _fsync_dir(directory)
+            if journal is not None:
+                os.remove(journal)
+        except BaseException:
+            for tmp, _ in staged:
+                if tmp is not None and tmp.exists():
+                    try:
+                        os.remove(tmp)
+                    except OSError:
+                        pass
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+
+def _move(tmp, target):
+    """Rename a temp file into place, or remove the target of a deletion (tmp None)."""
+    if tmp is not None:
+        os.replace(tmp, target)
+        return
+    try:
+        os.remove(target)
+    except FileNotFoundError:
+        pass
+
+
+def _write_journal(journal, staged):
+    entries = [[str(tmp) if tmp is not None else None, str(target)] for tmp, target in staged]
+    tmp = journal.with_name(f'{journal.name}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+        if FSYNC:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, journal)
+    if FSYNC:
+        _fsync_dir(journal.parent)
+
+
+def write_atomic(path, data, journal_dir=None):
+    """Atomically write a single document."""
+    path = Path(path)
+    tx = Transaction(journal_dir or path.parent)
+    tx.write(path, data)
+    tx.commit()
+
+
+def recover(journal_dir):
+    """
+    Finish transactions interrupted mid-rename (roll their journals forward).
+    Returns the number of files moved into place.
+    """
+    moved = 0
+    for journal in sorted(Path(journal_dir).glob(JOURNAL_PATTERN)):
+        try:
+            with open(journal, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            entries = []
+        for tmp, target in entries:
+            if tmp is None:
+                _move(None, target)
+            elif os.path.exists(tmp):
+                os.replace(tmp, target)
+                moved += 1
+        os.remove(journal)
+    return moved
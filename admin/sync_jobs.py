@@ -0,0 +1,173 @@
+"""
+Background Translation Sync Queue
+
+Per-day saves hand their translation sync to a small worker pool so the POST
+returns as soon as the primary language is written.
+
+- The queue is bounded; when it is full the job runs inline in the caller
+  (backpressure instead of dropping work).
+- Jobs are coalesced per key (plan, day, target language): if Monday is saved
+  three times before a worker picks it up, only the last version is
+  translated and the earlier jobs are reported as superseded.
+- Jobs for the same key never run concurrently, so the newest save always
+  lands last.
+- A job may carry a `baseline` (the state its target is known to reflect).
+  When jobs are coalesced the oldest baseline is kept, since the superseded
+  jobs never ran.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_JOB_HISTORY = 1000
+
+
+class SyncJob:
+    """A unit of background work plus the status reported by /api/jobs/<id>."""
+
+    def __init__(self, key, fn, description='', baseline=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.fn = fn
+        self.description = description
+        self.baseline = baseline
+        # True once this job has replaced queued jobs it must also cover
+        self.coalesced = False
+        self.status = 'queued'
+        self.stage = None
+        self.progress = 0.0
+        self.error = None
+        self.superseded_by = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def report(self, stage, progress):
+        """Called by the job function to publish its progress (0.0 - 1.0)."""
+        self.stage = stage
+        self.progress = progress
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "superseded_by": self.superseded_by,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class SyncQueue:
+    """Bounded, coalescing job queue served by a pool of daemon threads."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE_SIZE,
+                 history=DEFAULT_JOB_HISTORY):
+        self.workers = workers
+        self.history = history
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._pending = {}          # key -> newest queued job
+        self._key_locks = {}        # key -> [lock serializing runs of that key, jobs using it]
+        self._jobs = OrderedDict()  # id -> job, bounded by `history`
+        self._threads = []
+
+    def submit(self, key, fn, description='', baseline=None):
+        """
+        Queue `fn(job)` for background execution and return its SyncJob.
+        A still-queued job with the same key is superseded by this one.
+        """
+        job = SyncJob(key, fn, description, baseline)
+        with self._lock:
+            self._remember(job)
+            previous = self._pending.get(key)
+            if previous is not None:
+                job.baseline = previous.baseline
+                job.coalesced = True
+                previous.status = 'superseded'
+                previous.superseded_by = job.id
+                previous.finished_at = time.time()
+                self._pending[key] = job
+                return job
+            try:
+                self._queue.put_nowait(key)
+            except queue.Full:
+                inline = True
+            else:
+                self._pending[key] = job
+                inline = False
+            self._start_workers()
+
+        if inline:
+            print(f"[Sync Queue] Queue full, running '{description}' inline")
+            self._run(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def join(self):
+        """Block until every queued job has been processed."""
+        self._queue.join()
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.history:
+            self._jobs.popitem(last=False)
+
+    def _start_workers(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'sync-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            key = self._queue.get()
+            try:
+                with self._lock:
+                    job = self._pending.pop(key, None)
+                if job is not None:
+                    self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job):
+        with self._lock:
+            entry = self._key_locks.setdefault(job.key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                self._execute(job)
+        finally:
+            with self._lock:
+                # Dropped once no job of the key is running or waiting on it
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[job.key]
+
+    def _execute(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.fn(job)
+            job.status = 'done'
+            job.progress = 1.0
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            print(f"[Sync Queue] Job '{job.description}' failed: {e}")
+        finally:
+            job.finished_at = time.time()
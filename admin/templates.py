@@ -0,0 +1,206 @@
+"""
+Templated Days
+A day can be written in terms of shared pieces instead of repeating them:
+
+    "friday": {"base": "tuesday", "focus": "Upper body (B)"}
+
+    "blocks": [{"shared": "mobility-warmup"},
+               {"shared": "upper-strength", "order": 2}, ...]
+
+- "base": the day starts as another day of the same plan and language
+  (itself resolved); its own fields replace the base day's.
+- "shared": a block of the plan's library (the "shared_blocks" field of the
+  plan document, {id: block}); the reference's other fields replace the
+  library block's.
+
+Stores keep days as written and resolve them when read (memoized per day
+version, see plan_store.py). Changing a shared block or a base day saves
+and translates that one piece; the days that depend on it only get new
+versions (and, in the JSON layout, re-rendered day files for the public
+site). Clients that save a templated day in its resolved form keep its
+references (rebase); sending "base": null detaches a day from its base.
+
+Every function takes the plan layout (plan_store.PLANS[plan]), the plan's
+days as stored ({day: data}) and its library.
+"""
+
+import re
+
+BASE = 'base'
+SHARED = 'shared'
+LIBRARY = 'shared_blocks'
+
+BLOCK_ID = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+# Longest chain of base days
+MAX_DEPTH = 8
+
+
+class TemplateError(ValueError):
+    """A reference names a missing day or block, or base days form a cycle."""
+
+
+def references(layout, day):
+    """
+    (base day or None, ids of the shared blocks in the day's own blocks).
+    Raises TemplateError if a reference is not a string.
+    """
+    if not isinstance(day, dict):
+        return None, set()
+    base = day.get(BASE)
+    if base is not None and not isinstance(base, str):
+        raise TemplateError(f"{BASE!r} must name a day, not {base!r}")
+    blocks = day.get(layout['blocks'])
+    if isinstance(blocks, list):
+        for block in blocks:
+            if isinstance(block, dict) and SHARED in block and not isinstance(block[SHARED], str):
+                raise TemplateError(f"{SHARED!r} must name a shared block, not {block[SHARED]!r}")
+        shared = {block[SHARED] for block in blocks if isinstance(block, dict) and SHARED in block}
+    else:
+        shared = set()
+    return base, shared
+
+
+def is_templated(layout, day) -> bool:
+    base, shared = references(layout, day)
+    return base is not None or bool(shared)
+
+
+def _resolve_block(library, block):
+    if not isinstance(block, dict) or SHARED not in block:
+        return block
+    shared = library.get(block[SHARED]) if isinstance(block[SHARED], str) else None
+    if not isinstance(shared, dict):
+        raise TemplateError(f"Unknown shared block: {block[SHARED]!r}")
+    return {**shared, **{key: value for key, value in block.items() if key != SHARED}}
+
+
+def resolve_day(layout, days, library, day, memo=None, _chain=()):
+    """The day with its references replaced by what they stand for (None if it is missing)."""
+    if memo is not None and day in memo:
+        return memo[day]
+    data = days.get(day)
+    if not is_templated(layout, data):
+        return data
+    if day in _chain or len(_chain) >= MAX_DEPTH:
+        raise TemplateError(f"Base days form a cycle: {' -> '.join(_chain + (day,))}")
+
+    base = data.get(BASE)
+    if base is not None:
+        inherited = resolve_day(layout, days, library, base, memo, _chain + (day,)) if isinstance(base, str) else None
+        if not isinstance(inherited, dict):
+            raise TemplateError(f"{day} is based on a missing day: {base!r}")
+        resolved = dict(inherited)
+    else:
+        resolved = {}
+    blocks_key = layout['blocks']
+    for key, value in data.items():
+        if key == BASE:
+            continue
+        if key == blocks_key and isinstance(value, list):
+            value = [_resolve_block(library, block) for block in value]
+        resolved[key] = value
+
+    if memo is not None:
+        memo[day] = resolved
+    return resolved
+
+
+def resolve_days(layout, days, library):
+    """{day: resolved day}; the same dict if no day is templated."""
+    if not any(is_templated(layout, data) for data in days.values()):
+        return days
+    memo = {}
+    return {day: resolve_day(layout, days, library, day, memo) for day in days}
+
+
+def dependents(layout, days, days_changed=(), blocks_changed=()):
+    """Days (other than `days_changed`) whose resolved content depends on the given days or blocks."""
+    users = {}
+    for name, data in days.items():
+        base, shared = references(layout, data)
+        if base is not None:
+            users.setdefault(('day', base), set()).add(name)
+        for block_id in shared:
+            users.setdefault(('block', block_id), set()).add(name)
+
+    pending = [('day', day) for day in days_changed] + [('block', block_id) for block_id in blocks_changed]
+    found = set()
+    while pending:
+        for user in users.get(pending.pop(), ()):
+            if user not in found:
+                found.add(user)
+                pending.append(('day', user))
+    return found - set(days_changed)
+
+
+def usage(layout, days):
+    """{shared block id: sorted days using it, directly or through a base day}."""
+    used = {}
+    for name, data in days.items():
+        for block_id in references(layout, data)[1]:
+            used.setdefault(block_id, set()).add(name)
+    return {block_id: sorted(names | dependents(layout, days, names))
+            for block_id, names in sorted(used.items())}
+
+
+# ===== Rebase =====
+
+def _source_blocks(layout, days, day):
+    """The stored block list a day's resolved blocks come from (its own or a base day's)."""
+    data, seen = days.get(day), set()
+    while isinstance(data, dict) and layout['blocks'] not in data and isinstance(data.get(BASE), str):
+        if data[BASE] in seen:
+            return []
+        seen.add(data[BASE])
+        data = days.get(data[BASE])
+    blocks = data.get(layout['blocks']) if isinstance(data, dict) else None
+    return blocks if isinstance(blocks, list) else []
+
+
+def _reshare(library, source, block):
+    """`block` as a reference to the shared block at its position, if it still has all of its fields."""
+    if not isinstance(source, dict) or SHARED not in source or not isinstance(block, dict):
+        return block
+    shared = library.get(source[SHARED])
+    if not isinstance(shared, dict) or any(key not in block for key in shared):
+        return block
+    return {SHARED: source[SHARED], **{key: value for key, value in block.items()
+                                       if key not in shared or shared[key] != value}}
+
+
+def rebase(layout, days, library, day, incoming):
+    """
+    What to store when a client saves `incoming` for a templated day.
+    A resolved day (no references) keeps the stored day's base and the
+    shared blocks at the same positions, storing only the fields that
+    differ. Days with references, days that were not templated, and
+    changes a template cannot express (a field of the base day removed)
+    are stored as sent.
+    """
+    if not isinstance(incoming, dict):
+        return incoming
+    if BASE in incoming and incoming[BASE] is None:
+        return {key: value for key, value in incoming.items() if key != BASE}
+    stored = days.get(day)
+    if is_templated(layout, incoming) or not is_templated(layout, stored):
+        return incoming
+
+    raw = dict(incoming)
+    blocks_key = layout['blocks']
+    if isinstance(raw.get(blocks_key), list):
+        sources = _source_blocks(layout, days, day)
+        raw[blocks_key] = [_reshare(library, sources[i] if i < len(sources) else None, block)
+                           for i, block in enumerate(raw[blocks_key])]
+
+    base = stored.get(BASE)
+    if base is None:
+        return raw
+    try:
+        inherited = resolve_day(layout, days, library, base)
+    except TemplateError:
+        return raw
+    if not isinstance(inherited, dict) or any(key not in incoming for key in inherited):
+        return raw
+    return {BASE: base, **{key: value for key, value in raw.items()
+                           if key not in inherited or inherited[key] != incoming[key]}}
@@ -0,0 +1,231 @@
+"""
+Athletes (Tenants)
+
+One admin server manages plans for many athletes. The original data/ layout
+is the default namespace (it is also what the public site serves); every
+other athlete gets the same layout in a directory of its own, fanned out by
+a hash of the athlete id so no directory holds more than a few hundred
+entries, however many athletes there are:
+
+    data/athletes/3f/a2/<athlete>/gym-routine.json, gym-routine/<day>.json ...
+
+- AthleteIndex: a SQLite index of athletes and, per plan and language, the
+  current version and last-modified time. Lookups and updates go through
+  primary keys; listing is keyset-paginated.
+- Tenants: an LRU of open athletes. Each has its own store, document cache,
+  change log, workout history and snapshot history; evicting an athlete drops them.
+  Locks are keyed by path (see storage.py), so a reopened athlete shares
+  them with jobs still holding the evicted instance. An evicted athlete's
+  database connections are closed.
+- recover() finishes the saves interrupted in any namespace, at startup.
+
+Resolving a path, an index row or an open athlete costs the same with 10
+athletes or 100,000.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import plan_store
+import storage
+from change_log import DEFAULT_MAX_ENTRIES, ChangeLog
+from doc_cache import DocumentCache
+from snapshots import SnapshotStore
+from workout_history import WorkoutHistory
+
+DEFAULT_MAX_TENANTS = 128
+DEFAULT_CACHE_ENTRIES = 16
+
+ATHLETE_ID = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS athletes (
+    id         TEXT PRIMARY KEY,
+    name       TEXT NOT NULL,
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS plan_versions (
+    athlete    TEXT NOT NULL,
+    plan       TEXT NOT NULL,
+    lang       TEXT NOT NULL,
+    version    INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (athlete, plan, lang)
+) WITHOUT ROWID;
+"""
+
+
+class UnknownAthlete(LookupError):
+    """No athlete with this id is registered."""
+
+
+def athlete_dir(root, athlete: str) -> Path:
+    """data/athletes/<h[:2]>/<h[2:4]>/<athlete> for a validated athlete id."""
+    digest = hashlib.sha1(athlete.encode('utf-8')).hexdigest()
+    return Path(root) / digest[:2] / digest[2:4] / athlete
+
+
+def namespaces(data_dir):
+    """The default data directory plus every athlete's (data/athletes/<xx>/<xx>/<id>)."""
+    athletes = Path(data_dir) / 'athletes'
+    return [Path(data_dir)] + sorted(path for path in athletes.glob('*/*/*') if path.is_dir())
+
+
+def recover(data_dir):
+    """
+    storage.recover() for every namespace: each journals its transactions in
+    its own directory, and its snapshot history in .snapshots. Returns the
+    number of files moved into place.
+    """
+    return sum(storage.recover(directory) + storage.recover(directory / '.snapshots')
+               for directory in namespaces(data_dir))
+
+
+class AthleteIndex:
+    """Athletes and their plan versions, in SQLite (safe across processes)."""
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def create(self, athlete, name):
+        """Register an athlete; returns False if the id is taken."""
+        try:
+            self._connect().execute("INSERT INTO athletes (id, name, created_at) VALUES (?, ?, ?)",
+                                    (athlete, name, time.time()))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def exists(self, athlete):
+        row = self._connect().execute("SELECT 1 FROM athletes WHERE id = ?", (athlete,)).fetchone()
+        return row is not None
+
+    def get(self, athlete):
+        """{"id", "name", "created_at", "plans": {plan: {lang: {"version", "updated_at"}}}} or None."""
+        conn = self._connect()
+        row = conn.execute("SELECT id, name, created_at FROM athletes WHERE id = ?", (athlete,)).fetchone()
+        if row is None:
+            return None
+        plans = {}
+        for plan, lang, version, updated_at in conn.execute(
+                "SELECT plan, lang, version, updated_at FROM plan_versions WHERE athlete = ?", (athlete,)):
+            plans.setdefault(plan, {})[lang] = {"version": version, "updated_at": updated_at}
+        return {"id": row[0], "name": row[1], "created_at": row[2], "plans": plans}
+
+    def list(self, after='', limit=100):
+        """Athletes with ids after `after`, in id order (keyset pagination)."""
+        rows = self._connect().execute(
+            "SELECT a.id, a.name, a.created_at, MAX(v.updated_at) FROM athletes a "
+            "LEFT JOIN plan_versions v ON v.athlete = a.id "
+            "WHERE a.id > ? GROUP BY a.id ORDER BY a.id LIMIT ?", (after or '', limit)).fetchall()
+        return [{"id": id_, "name": name, "created_at": created_at, "updated_at": updated_at}
+                for id_, name, created_at, updated_at in rows]
+
+    def touch(self, athlete, plan, lang, version, updated_at=None):
+        """Record a plan's new version after a save."""
+        self._connect().execute(
+            "INSERT INTO plan_versions (athlete, plan, lang, version, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (athlete, plan, lang) DO UPDATE SET version = excluded.version, "
+            "updated_at = excluded.updated_at",
+            (athlete, plan, lang, version, updated_at or time.time()))
+
+
+class Tenant:
+    """Everything the server keeps open for one athlete (None: the default namespace)."""
+
+    def __init__(self, athlete, data_dir, cache, store, json_files, history, snapshots, changes):
+        self.athlete = athlete
+        self.data_dir = Path(data_dir)
+        self.cache = cache
+        self.store = store
+        self.json_files = json_files
+        self.history = history
+        self.snapshots = snapshots
+        self.changes = changes
+
+
+def open_tenant(athlete, data_dir, storage_kind, cache_entries=DEFAULT_CACHE_ENTRIES, db_path=None,
+                change_log_entries=DEFAULT_MAX_ENTRIES):
+    data_dir = Path(data_dir)
+    cache = DocumentCache(max_entries=cache_entries)
+    store = plan_store.open_store(storage_kind, data_dir, cache,
+                                  db_path=db_path or data_dir / 'plans.sqlite3')
+    return Tenant(athlete, data_dir, cache, store, plan_store.JsonPlanStore(data_dir, cache),
+                  WorkoutHistory(data_dir / '.history'), SnapshotStore(data_dir / '.snapshots'),
+                  ChangeLog(data_dir / '.changes' / 'changes.jsonl', max_entries=change_log_entries))
+
+
+class Tenants:
+    """The default tenant plus an LRU of open athletes."""
+
+    def __init__(self, default, root, storage_kind, max_tenants=DEFAULT_MAX_TENANTS,
+                 cache_entries=DEFAULT_CACHE_ENTRIES, change_log_entries=DEFAULT_MAX_ENTRIES):
+        self.default = default
+        self.root = Path(root)
+        self.storage_kind = storage_kind
+        self.max_tenants = max_tenants
+        self.cache_entries = cache_entries
+        self.change_log_entries = change_log_entries
+        self.index = AthleteIndex(self.root / 'index.sqlite3')
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, athlete=None) -> Tenant:
+        """The tenant for an athlete id (None for the default); raises UnknownAthlete."""
+        if athlete is None:
+            return self.default
+        with self._lock:
+            tenant = self._open.get(athlete)
+            if tenant is not None:
+                self._open.move_to_end(athlete)
+                return tenant
+        if not ATHLETE_ID.match(athlete) or not self.index.exists(athlete):
+            raise UnknownAthlete(f"Unknown athlete: {athlete}")
+
+        opened = open_tenant(athlete, athlete_dir(self.root, athlete), self.storage_kind,
+                             self.cache_entries, change_log_entries=self.change_log_entries)
+        with self._lock:
+            # Another request may have opened it meanwhile; keep one instance
+            tenant = self._open.setdefault(athlete, opened)
+            self._open.move_to_end(athlete)
+            evicted = [opened] if tenant is not opened else []
+            while len(self._open) > self.max_tenants:
+                evicted.append(self._open.popitem(last=False)[1])
+                self.evictions += 1
+        for old in evicted:
+            # Jobs still holding it reconnect if they use it again
+            old.store.close()
+        return tenant
+
+    def create(self, athlete, name):
+        """Register an athlete and create its directory; returns False if the id is taken."""
+        if not isinstance(athlete, str) or not ATHLETE_ID.match(athlete):
+            raise ValueError("Athlete id must be 1-64 lowercase letters, digits, '-' or '_'")
+        if not isinstance(name, str):
+            raise ValueError("Athlete name must be a string")
+        if not self.index.create(athlete, name):
+            return False
+        athlete_dir(self.root, athlete).mkdir(parents=True, exist_ok=True)
+        return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._open)
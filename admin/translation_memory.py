@@ -0,0 +1,89 @@
+"""
+Persistent Translation Memory
+
+A small SQLite store of translations produced by the LLM fallback, keyed by
+(source text, language pair, dictionary version). It is checked before the
+fallback, so an unknown exercise name is only ever sent to the backend once,
+even across server restarts.
+
+The dictionary version is part of the key: editing EN_TO_ES / ES_TO_EN
+changes it, and stale fallback results are ignored from then on.
+"""
+
+import sqlite3
+import threading
+import time
+
+# SQLite's default limit on bound parameters is 999
+_CHUNK_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    source       TEXT NOT NULL,
+    source_lang  TEXT NOT NULL,
+    target_lang  TEXT NOT NULL,
+    dict_version TEXT NOT NULL,
+    translation  TEXT NOT NULL,
+    created_at   REAL NOT NULL,
+    PRIMARY KEY (source, source_lang, target_lang, dict_version)
+) WITHOUT ROWID
+"""
+
+
+class TranslationMemory:
+    """Thread-safe SQLite-backed translation memory."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            if self.path != ':memory:':
+                conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(_SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, texts, source_lang, target_lang, dict_version):
+        """Return {source: translation} for the texts already in memory."""
+        texts = list(texts)
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(texts), _CHUNK_SIZE):
+                chunk = texts[i:i + _CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f"SELECT source, translation FROM translations "
+                    f"WHERE source_lang = ? AND target_lang = ? AND dict_version = ? "
+                    f"AND source IN ({placeholders})",
+                    [source_lang, target_lang, dict_version, *chunk],
+                )
+                found.update(rows)
+        return found
+
+    def put_many(self, translations, source_lang, target_lang, dict_version):
+        """Store {source: translation} pairs in one transaction."""
+        if not translations:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations "
+                    "(source, source_lang, target_lang, dict_version, translation, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(source, source_lang, target_lang, dict_version, translation, now)
+                     for source, translation in translations.items()],
+                )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
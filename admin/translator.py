@@ -3,11 +3,19 @@ Translator Module for Fitness App
 
 Implements a hybrid translation approach:
 1. Dictionary Lookup (Fast, Free, Local)
-2. LLM Fallback (For unknown terms) - Currently Mocked
+2. Translation Memory (SQLite, remembers fallback results across restarts)
+3. LLM Fallback (For unknown terms, batched) - Currently Mocked
 """
 
+import hashlib
 import json
 import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import metrics
+from translation_memory import TranslationMemory
 
 # ===== DICTIONARIES =====
 
@@ -161,80 +169,394 @@ ES_TO_EN.update({
 })
 
 
+# Size of the memo cache for translate_text results
+TRANSLATION_CACHE_SIZE = 4096
+
+# Translation memory location; set FITNESS_TM_PATH to '' to disable it
+TRANSLATION_MEMORY_PATH = os.environ.get(
+    'FITNESS_TM_PATH', str(Path(__file__).parent / 'translation_memory.sqlite3'))
+
+# Keys that we want to translate
+TEXT_KEYS = frozenset([
+    'name', 'category', 'focus', 'description',
+    'meal', 'food', 'notes', 'exercise'
+])
+
+
+# ===== FALLBACK BACKENDS =====
+
+class PassthroughBackend:
+    """
+    Mock LLM backend: returns the text unchanged.
+    Replace this with actual OpenAI/Gemini/Anthropic API call.
+    """
+    name = 'passthrough'
+
+    def translate_many(self, texts, target_lang):
+        # For now, we return the text unchanged, so the user knows it needs
+        # translation or that the dictionary missed it.
+        print(f"[LLM Fallback Triggered] translating {len(texts)} string(s) to {target_lang}: {texts}")
+
+        # TODO: Implement actual LLM call here (one request for the whole batch)
+        # Example:
+        # return openai.ChatCompletion.create(...)
+        return list(texts)
+
+
+class DeterministicBackend:
+    """Local stand-in for tests: tags each string with the target language."""
+    name = 'deterministic'
+
+    def __init__(self):
+        self.calls = []
+
+    def translate_many(self, texts, target_lang):
+        self.calls.append((target_lang, list(texts)))
+        return [f"[{target_lang}] {text}" for text in texts]
+
+
+# ===== COUNTERS (exported at /metrics) =====
+
+memo_hits = metrics.registry.counter(
+    'fitness_translation_memo_hits_total', 'Strings served from the in-process memo')
+dictionary_hits = metrics.registry.counter(
+    'fitness_translation_dictionary_hits_total', 'Strings found in the dictionary')
+dictionary_misses = metrics.registry.counter(
+    'fitness_translation_dictionary_misses_total', 'Strings missing from the dictionary')
+memory_hits = metrics.registry.counter(
+    'fitness_translation_memory_hits_total', 'Dictionary misses served from the translation memory')
+fallback_calls = metrics.registry.counter(
+    'fitness_translation_fallback_calls_total', 'Batched calls to the fallback backend')
+fallback_strings = metrics.registry.counter(
+    'fitness_translation_fallback_strings_total', 'Strings sent to the fallback backend')
+
+
+_backend = PassthroughBackend()
+_memory = TranslationMemory(TRANSLATION_MEMORY_PATH) if TRANSLATION_MEMORY_PATH else None
+
+
+def set_backend(backend):
+    """Plug in the fallback backend (anything with name and translate_many(texts, target_lang))."""
+    global _backend
+    _backend = backend
+    _memo_clear()
+
+
+def set_translation_memory(memory):
+    """Replace the translation memory (a TranslationMemory, or None to disable it)."""
+    global _memory
+    _memory = memory
+    _memo_clear()
+
+
+# ===== LOOKUP INDEXES AND MEMO =====
+
+def _build_folded_index(dictionary):
+    """Casefolded key -> translation; the first entry wins, like the old linear scan."""
+    index = {}
+    for k, v in dictionary.items():
+        index.setdefault(k.casefold(), v)
+    return index
+
+
+_INDEXES = {}
+DICTIONARY_VERSION = None
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _memo_get(original, target_lang):
+    with _memo_lock:
+        translated = _memo.get((original, target_lang))
+        if translated is not None:
+            _memo.move_to_end((original, target_lang))
+        return translated
+
+
+def _memo_put(original, target_lang, translated):
+    with _memo_lock:
+        _memo[(original, target_lang)] = translated
+        while len(_memo) > TRANSLATION_CACHE_SIZE:
+            _memo.popitem(last=False)
+
+
+def _memo_clear():
+    with _memo_lock:
+        _memo.clear()
+
+
+def rebuild_indexes():
+    """
+    Rebuild the lookup indexes from EN_TO_ES / ES_TO_EN.
+    Call this after changing the dictionaries at runtime.
+    """
+    global DICTIONARY_VERSION
+    _INDEXES['es'] = (EN_TO_ES, _build_folded_index(EN_TO_ES))
+    _INDEXES['en'] = (ES_TO_EN, _build_folded_index(ES_TO_EN))
+    encoded = json.dumps([EN_TO_ES, ES_TO_EN], sort_keys=True, ensure_ascii=False)
+    DICTIONARY_VERSION = hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+    _memo_clear()
+
+
+def cache_version():
+    """
+    Identifies what translations currently depend on (the dictionaries and
+    the fallback backend); stored results are only valid for this version.
+    """
+    return f"{DICTIONARY_VERSION}/{_backend.name}"
+
+
+def lookup(text, target_lang='es'):
+    """Dictionary-only lookup (exact, then case-insensitive). Returns None on a miss."""
+    indexes = _INDEXES.get(target_lang)
+    if indexes is None:
+        return None
+    exact, folded = indexes
+    if text in exact:
+        return exact[text]
+    return folded.get(text.casefold())
+
+
+def _resolve(originals, target_lang):
+    """
+    Translate stripped strings that missed the memo:
+    dictionary -> translation memory -> one batched fallback call.
+    """
+    resolved = {}
+    misses = []
+
+    # 1. DICTIONARY LOOKUP
+    for original in originals:
+        translated = lookup(original, target_lang)
+        if translated is not None:
+            resolved[original] = translated
+        else:
+            misses.append(original)
+    dictionary_hits.inc(len(resolved))
+    dictionary_misses.inc(len(misses))
+
+    if misses:
+        source_lang = 'en' if target_lang == 'es' else 'es'
+        memory_version = cache_version()
+
+        # 2. TRANSLATION MEMORY
+        remembered = {}
+        if _memory is not None:
+            remembered = _memory.get_many(misses, source_lang, target_lang, memory_version)
+        memory_hits.inc(len(remembered))
+        resolved.update(remembered)
+
+        # 3. LLM FALLBACK (all remaining misses in one call)
+        unknown = [original for original in misses if original not in remembered]
+        if unknown:
+            fresh = dict(zip(unknown, call_llm_batch(unknown, target_lang)))
+            if _memory is not None:
+                _memory.put_many(fresh, source_lang, target_lang, memory_version)
+            resolved.update(fresh)
+
+    for original, translated in resolved.items():
+        _memo_put(original, target_lang, translated)
+    return resolved
+
+
 def translate_text(text, target_lang='es'):
     """
-    Translate a single string using Dictionary -> LLM Fallback.
+    Translate a single string using Dictionary -> Translation Memory -> LLM Fallback.
+    Results are memoized, so repeated strings cost a single cache hit.
     """
     if not text or not isinstance(text, str):
         return text
         
     original = text.strip()
-    
-    # 1. DICTIONARY LOOKUP
-    if target_lang == 'es':
-        if original in EN_TO_ES:
-            return EN_TO_ES[original]
-        # Case insensitive check
-        for k, v in EN_TO_ES.items():
-            if k.lower() == original.lower():
-                return v
-                
-    elif target_lang == 'en':
-        if original in ES_TO_EN:
-            return ES_TO_EN[original]
-        # Case insensitive check
-        for k, v in ES_TO_EN.items():
-            if k.lower() == original.lower():
-                return v
-
-    # 2. LLM FALLBACK (Placeholder)
-    # If the word is not in the dictionary, we would call an API here.
-    return call_llm(original, target_lang)
+    translated = _memo_get(original, target_lang)
+    if translated is not None:
+        return translated
+    return _resolve([original], target_lang)[original]
+
+
+def call_llm_batch(texts, target_lang):
+    """Send a batch of unknown strings to the fallback backend, in order."""
+    with metrics.span('fallback'):
+        translated = _backend.translate_many(list(texts), target_lang)
+    fallback_calls.inc()
+    fallback_strings.inc(len(texts))
+    if len(translated) != len(texts):
+        raise ValueError(f"Fallback backend returned {len(translated)} results for {len(texts)} strings")
+    return translated
 
 
 def call_llm(text, target_lang):
+    """Translate a single string with the fallback backend."""
+    return call_llm_batch([text], target_lang)[0]
+
+
+def collect_texts(data, texts=None):
+    """Collect the unique translatable strings in a JSON structure."""
+    if texts is None:
+        texts = set()
+    if isinstance(data, list):
+        for item in data:
+            collect_texts(item, texts)
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            if key in TEXT_KEYS and isinstance(value, str):
+                if value:
+                    texts.add(value)
+            elif isinstance(value, (dict, list)):
+                collect_texts(value, texts)
+    return texts
+
+
+def translate_batch(texts, target_lang='es'):
     """
-    Mock LLM function. 
-    Replace this with actual OpenAI/Gemini/Anthropic API call.
+    Translate an iterable of strings, each distinct string once. Returns {text: translation}.
+    Everything the dictionary and translation memory miss goes to the fallback in one call.
     """
-    # For now, we return the text marked, so the user knows it needs translation
-    # or that the dictionary missed it.
-    print(f"[LLM Fallback Triggered] translating '{text}' to {target_lang}")
-    
-    # TODO: Implement actual LLM call here
-    # Example:
-    # return openai.ChatCompletion.create(...)
-    
-    # Return original text for now (passthrough)
-    return text
+    result = {}
+    pending = {}
+    for text in set(texts):
+        if not text or not isinstance(text, str):
+            result[text] = text
+            continue
+        original = text.strip()
+        translated = _memo_get(original, target_lang)
+        if translated is not None:
+            memo_hits.inc()
+            result[text] = translated
+        else:
+            pending.setdefault(original, []).append(text)
 
+    if pending:
+        resolved = _resolve(list(pending), target_lang)
+        for original, sources in pending.items():
+            for text in sources:
+                result[text] = resolved[original]
+    return result
 
-def translate_structure(data, target_lang='es'):
+
+def apply_translations(data, translations):
+    """Rebuild a JSON structure with its text fields replaced from a translation map."""
+    if isinstance(data, list):
+        return [apply_translations(item, translations) for item in data]
+
+    elif isinstance(data, dict):
+        new_data = data.copy()
+        for key, value in new_data.items():
+            if key in TEXT_KEYS and isinstance(value, str):
+                new_data[key] = translations.get(value, value)
+            elif isinstance(value, (dict, list)):
+                new_data[key] = apply_translations(value, translations)
+        return new_data
+
+    return data
+
+
+def _reuse_unchanged(data, previous, previous_translated, pending):
     """
-    Recursively translate a JSON structure (list or dict).
-    Only translates specific fields known to contain text.
+    Copy `data`, taking text fields that did not change since `previous`
+    from `previous_translated`. Changed text fields are recorded in `pending`
+    as (container, key, text) to be translated afterwards.
     """
     if isinstance(data, list):
-        return [translate_structure(item, target_lang) for item in data]
-    
+        old = previous if isinstance(previous, list) else []
+        old_translated = previous_translated if isinstance(previous_translated, list) else []
+        if len(old) != len(old_translated):
+            old = old_translated = []
+        return [
+            _reuse_unchanged(item,
+                             old[i] if i < len(old) else None,
+                             old_translated[i] if i < len(old_translated) else None,
+                             pending)
+            for i, item in enumerate(data)
+        ]
+
     elif isinstance(data, dict):
+        old = previous if isinstance(previous, dict) else {}
+        old_translated = previous_translated if isinstance(previous_translated, dict) else {}
         new_data = data.copy()
-        
-        # Keys that we want to translate
-        text_keys = [
-            'name', 'category', 'focus', 'description', 
-            'meal', 'food', 'notes', 'exercise'
-        ]
-        
-        # Keys that might contain numeric strings we usually don't want to touch, 
-        # but 'time' might need format change? For now, keep time as is.
-        
-        for key, value in new_data.items():
-            if key in text_keys and isinstance(value, str):
-                new_data[key] = translate_text(value, target_lang)
+        for key, value in data.items():
+            if key in TEXT_KEYS and isinstance(value, str):
+                if not value:
+                    continue
+                if old.get(key) == value and isinstance(old_translated.get(key), str):
+                    new_data[key] = old_translated[key]
+                else:
+                    pending.append((new_data, key, value))
             elif isinstance(value, (dict, list)):
-                new_data[key] = translate_structure(value, target_lang)
-                
+                new_data[key] = _reuse_unchanged(value, old.get(key), old_translated.get(key), pending)
         return new_data
-        
+
     return data
+
+
+def translate_changes(data, previous, previous_translated, target_lang='es'):
+    """
+    Incrementally translate `data`, given that `previous_translated` is the
+    translation of `previous`. Only text fields that changed are translated;
+    everything else (including numeric edits) is copied over, so a
+    weight-only edit never reaches the translator.
+
+    Returns (translated_data, number_of_fields_translated).
+    """
+    with metrics.span('translate_changes'):
+        pending = []
+        result = _reuse_unchanged(data, previous, previous_translated, pending)
+        if pending:
+            translations = translate_batch({text for _, _, text in pending}, target_lang)
+            for container, key, text in pending:
+                container[key] = translations[text]
+        return result, len(pending)
+
+
+def _patch_target_key(path):
+    """Last reference token of a JSON pointer (the member an operation writes)."""
+    return path.rsplit('/', 1)[-1].replace('~1', '/').replace('~0', '~')
+
+
+def translate_patch(ops, target_lang='es'):
+    """
+    Mirror JSON Patch operations into the other language: values written to
+    text fields (and text inside added subtrees) are translated in one batch,
+    paths are kept, and "test" operations are dropped.
+    """
+    mirrored = [dict(op) for op in ops if op.get('op') != 'test']
+    texts = set()
+    for op in mirrored:
+        if 'value' not in op:
+            continue
+        value = op['value']
+        if isinstance(value, str) and _patch_target_key(op['path']) in TEXT_KEYS:
+            if value:
+                texts.add(value)
+        elif isinstance(value, (dict, list)):
+            collect_texts(value, texts)
+
+    translations = translate_batch(texts, target_lang) if texts else {}
+    for op in mirrored:
+        if 'value' not in op:
+            continue
+        value = op['value']
+        if isinstance(value, str) and _patch_target_key(op['path']) in TEXT_KEYS:
+            op['value'] = translations.get(value, value)
+        elif isinstance(value, (dict, list)):
+            op['value'] = apply_translations(value, translations)
+    return mirrored
+
+
+def translate_structure(data, target_lang='es'):
+    """
+    Recursively translate a JSON structure (list or dict).
+    Only translates specific fields known to contain text (TEXT_KEYS).
+
+    Unique strings are gathered first and translated once each, so the cost
+    scales with the number of distinct strings rather than field count.
+    """
+    # Keys that might contain numeric strings we usually don't want to touch, 
+    # but 'time' might need format change? For now, keep time as is.
+    with metrics.span('translate_structure'):
+        translations = translate_batch(collect_texts(data), target_lang)
+        return apply_translations(data, translations)
+
+
+rebuild_indexes()
@@ -0,0 +1,357 @@
+"""
+Workout History
+Keeps the progression that saving a gym day would otherwise overwrite.
+
+Each time a save changes an exercise's weight, the new set (weight, reps,
+sets) is appended to that exercise's time series. Series are column arrays
+in memory and fixed-size binary records on disk (data/.history/<key>.bin),
+so years of daily logs stay small and load quickly.
+
+Aggregates are updated on every append instead of rescanning history:
+- Personal bests (heaviest weight, best estimated 1RM): O(1)
+- Volume between two dates (prefix sums over the series): O(log n)
+- Weekly totals per exercise and per muscle group: O(1) per week
+
+The 1RM estimate uses the Epley formula: weight * (1 + reps / 30).
+Volume is weight * reps * sets; reps or sets that are not numbers
+(e.g. "Technical failure") count as 1. Weeks start on Monday (UTC).
+
+Several server processes can share one directory (see serve.py): appends
+take a file lock, and queries first read any records other processes
+appended (one stat() per series file checked).
+"""
+
+import json
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+import storage
+
+# One record: timestamp, weight, reps, sets
+RECORD = struct.Struct('<dfHH')
+
+WEEK_SECONDS = 7 * 24 * 3600
+# 1970-01-05 was the first Monday after the epoch
+WEEK_ORIGIN = 4 * 24 * 3600
+
+# Name keywords used to pick an exercise's muscle group among the groups in
+# the day's focus (e.g. "Back + Biceps"); the first focus group is the default
+MUSCLE_KEYWORDS = {
+    'Chest': ('bench', 'chest', 'fly', 'push-up', 'pec'),
+    'Back': ('row', 'pull', 'lat ', 'deadlift', 'chin'),
+    'Shoulders': ('shoulder', 'lateral', 'overhead', 'military', 'face pull', 'arnold'),
+    'Biceps': ('curl',),
+    'Triceps': ('tricep', 'extension', 'pushdown', 'dip', 'skull'),
+    'Legs': ('squat', 'lunge', 'leg', 'calf', 'rdl', 'deadlift', 'hip thrust'),
+    'Abs': ('crunch', 'plank', 'ab ', 'raise', 'sit-up'),
+}
+
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def exercise_key(name: str) -> str:
+    """Stable, filename-safe key for an exercise name."""
+    return re.sub(r'[^a-z0-9]+', '-', name.casefold()).strip('-')[:80] or 'exercise'
+
+
+def parse_number(value):
+    """First number in a field like "55", 7.5 or "8-10 reps"; None if there is none."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER.search(value)
+        if match:
+            return float(match.group().replace(',', '.'))
+    return None
+
+
+def estimate_1rm(weight: float, reps: int) -> float:
+    return weight * (1 + reps / 30) if reps > 1 else weight
+
+
+def week_of(timestamp: float) -> int:
+    return int((timestamp - WEEK_ORIGIN) // WEEK_SECONDS)
+
+
+def week_start(week: int) -> str:
+    return time.strftime('%Y-%m-%d', time.gmtime(WEEK_ORIGIN + week * WEEK_SECONDS))
+
+
+def focus_groups(focus) -> list:
+    """Muscle groups named by a day focus: "Legs (Compound) + Abs" -> ["Legs", "Abs"]."""
+    if not isinstance(focus, str):
+        return []
+    groups = [re.sub(r'\(.*?\)', '', part).strip() for part in focus.split('+')]
+    return [group for group in groups if group]
+
+
+def muscle_group(exercise: dict, focus) -> str:
+    if exercise.get('muscle_group'):
+        return exercise['muscle_group']
+    groups = focus_groups(focus)
+    name = f"{exercise.get('name', '').casefold()} "
+    for group in groups:
+        if any(keyword in name for keyword in MUSCLE_KEYWORDS.get(group, ())):
+            return group
+    return groups[0] if groups else 'Other'
+
+
+def logged_sets(day) -> dict:
+    """{exercise name: (exercise, weight)} for exercises of a day with a numeric weight."""
+    found = {}
+    if not isinstance(day, dict):
+        return found
+    for block in day.get('blocks') or []:
+        if not isinstance(block, dict):
+            continue
+        for exercise in block.get('exercises') or []:
+            if isinstance(exercise, dict) and isinstance(exercise.get('name'), str) and exercise['name']:
+                weight = parse_number(exercise.get('weight'))
+                if weight:
+                    found[exercise['name']] = (exercise, weight)
+    return found
+
+
+class ExerciseSeries:
+    """One exercise's logged sets plus its running aggregates."""
+
+    def __init__(self, key, name, group):
+        self.key = key
+        self.name = name
+        self.group = group
+        self.times = array('d')
+        self.weights = array('f')
+        self.reps = array('H')
+        self.sets = array('H')
+        # volume_prefix[i] = total volume of the first i records
+        self.volume_prefix = array('d', [0.0])
+        self.best_weight = None
+        self.best_1rm = None
+        # week -> [volume, top weight, best 1RM]
+        self.weeks = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, timestamp, weight, reps, sets):
+        """Add a record and update the aggregates; returns its volume."""
+        # Converted first: a value a column cannot hold raises before any column changes
+        row = (array('d', [timestamp]), array('f', [weight]), array('H', [reps]), array('H', [sets]))
+        weight = row[1][0]
+        volume = weight * max(reps, 1) * max(sets, 1)
+        e1rm = estimate_1rm(weight, reps)
+        for column, value in zip((self.times, self.weights, self.reps, self.sets), row):
+            column.extend(value)
+        self.volume_prefix.append(self.volume_prefix[-1] + volume)
+
+        if self.best_weight is None or weight > self.best_weight[0]:
+            self.best_weight = (weight, timestamp)
+        if self.best_1rm is None or e1rm > self.best_1rm[0]:
+            self.best_1rm = (e1rm, timestamp)
+
+        totals = self.weeks.setdefault(week_of(timestamp), [0.0, 0.0, 0.0])
+        totals[0] += volume
+        totals[1] = max(totals[1], weight)
+        totals[2] = max(totals[2], e1rm)
+        return volume
+
+    def volume_between(self, start, end):
+        """Total volume logged in [start, end)."""
+        lo = bisect_left(self.times, start)
+        hi = bisect_left(self.times, end)
+        return self.volume_prefix[hi] - self.volume_prefix[lo]
+
+    def records(self, since=0.0):
+        start = bisect_left(self.times, since)
+        return [
+            {"time": self.times[i], "weight": round(self.weights[i], 2),
+             "reps": self.reps[i], "sets": self.sets[i]}
+            for i in range(start, len(self.times))
+        ]
+
+    def summary(self):
+        last = len(self.times) - 1
+        return {
+            "key": self.key,
+            "name": self.name,
+            "muscle_group": self.group,
+            "entries": len(self.times),
+            "last": {"time": self.times[last], "weight": round(self.weights[last], 2),
+                     "reps": self.reps[last], "sets": self.sets[last]} if last >= 0 else None,
+            "personal_best": {"weight": round(self.best_weight[0], 2),
+                              "time": self.best_weight[1]} if self.best_weight else None,
+            "estimated_1rm": {"weight": round(self.best_1rm[0], 2),
+                              "time": self.best_1rm[1]} if self.best_1rm else None,
+        }
+
+
+class WorkoutHistory:
+    """Per-exercise series persisted under `directory`."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._series = {}
+        # (muscle group, week) -> volume
+        self._group_weeks = {}
+        self._groups = set()
+        self._index_signature = None
+        self._lock = threading.RLock()
+        self._refresh()
+
+    # ----- Persistence -----
+
+    @property
+    def index_path(self):
+        return self.directory / 'index.json'
+
+    def _file_lock(self):
+        """Excludes other processes appending to the same history."""
+        return storage.document_lock('history', lock_dir=self.directory)
+
+    def _refresh(self, keys=None):
+        """Load series and records added since the last read (all series, or `keys`)."""
+        with self._lock:
+            try:
+                st = os.stat(self.index_path)
+            except FileNotFoundError:
+                return
+            signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+            if signature != self._index_signature:
+                try:
+                    with open(self.index_path, 'r', encoding='utf-8') as f:
+                        index = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    return
+                self._index_signature = signature
+                for key, meta in index.items():
+                    if key not in self._series:
+                        self._series[key] = ExerciseSeries(key, meta['name'], meta['group'])
+            for key in (self._series if keys is None else keys):
+                series = self._series.get(key)
+                if series is not None:
+                    self._read_records(series)
+
+    def _read_records(self, series):
+        loaded = len(series) * RECORD.size
+        path = self.directory / f'{series.key}.bin'
+        try:
+            if os.stat(path).st_size <= loaded:
+                return
+            with open(path, 'rb') as f:
+                f.seek(loaded)
+                raw = f.read()
+        except OSError:
+            return
+        # Ignore a torn trailing record from an interrupted append
+        raw = raw[:len(raw) - len(raw) % RECORD.size]
+        for timestamp, weight, reps, sets in RECORD.iter_unpack(raw):
+            self._add(series, timestamp, weight, reps, sets)
+
+    def _write_index(self):
+        index = {key: {"name": s.name, "group": s.group} for key, s in self._series.items()}
+        storage.write_atomic(self.index_path, index)
+
+    # ----- Recording -----
+
+    def _add(self, series, timestamp, weight, reps, sets):
+        volume = series.append(timestamp, weight, reps, sets)
+        self._groups.add(series.group)
+        group_week = (series.group, week_of(timestamp))
+        self._group_weeks[group_week] = self._group_weeks.get(group_week, 0.0) + volume
+
+    def record(self, name, weight, reps=0, sets=0, group='Other', timestamp=None):
+        """Append one logged set to an exercise's series."""
+        key = exercise_key(name)
+        reps = max(0, min(int(reps or 0), 0xFFFF))
+        sets = max(0, min(int(sets or 0), 0xFFFF))
+        with self._lock, self._file_lock():
+            self._refresh([key])
+            series = self._series.get(key)
+            if timestamp is None:
+                timestamp = time.time()
+            # Series are kept in time order
+            if series is not None and len(series) and timestamp < series.times[-1]:
+                timestamp = series.times[-1]
+            # Packed first: a value the file cannot hold raises before anything changes
+            record = RECORD.pack(timestamp, weight, reps, sets)
+            if series is None:
+                series = self._series[key] = ExerciseSeries(key, name, group)
+                self._write_index()
+            self._add(series, timestamp, weight, reps, sets)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / f'{key}.bin', 'ab') as f:
+                # Cut a torn record first, so this one stays aligned
+                f.truncate((len(series) - 1) * RECORD.size)
+                f.write(record)
+        return series
+
+    def record_day(self, previous, current, timestamp=None):
+        """Log every exercise of a gym day whose weight changed; returns how many."""
+        before = logged_sets(previous)
+        logged = 0
+        for name, (exercise, weight) in logged_sets(current).items():
+            if name in before and before[name][1] == weight:
+                continue
+            reps = parse_number(exercise.get('reps')) or 0
+            sets = parse_number(exercise.get('sets')) or 0
+            self.record(name, weight, int(reps), int(sets),
+                        muscle_group(exercise, current.get('focus')), timestamp)
+            logged += 1
+        return logged
+
+    # ----- Queries -----
+    # A series' columns grow one at a time while a record is added, so
+    # they are only read under the lock
+
+    def get(self, key):
+        """The series of an exercise (or None); read it under self._lock."""
+        with self._lock:
+            self._refresh([key])
+            return self._series.get(key)
+
+    def history(self, key, since=0.0):
+        """An exercise's summary and its records since `since`, or None."""
+        with self._lock:
+            series = self.get(key)
+            if series is None:
+                return None
+            return {**series.summary(), "records": series.records(since)}
+
+    def exercises(self):
+        with self._lock:
+            self._refresh()
+            return [series.summary() for series in self._series.values()]
+
+    def trend(self, key, weeks=8, now=None):
+        """Per-week volume, top weight and best 1RM of an exercise for the last `weeks` weeks."""
+        current = week_of(now or time.time())
+        with self._lock:
+            series = self.get(key)
+            if series is None:
+                return None
+            result = []
+            for week in range(current - weeks + 1, current + 1):
+                volume, top, e1rm = series.weeks.get(week, (0.0, 0.0, 0.0))
+                result.append({"week": week_start(week), "volume": round(volume, 2),
+                               "top_weight": round(top, 2), "estimated_1rm": round(e1rm, 2)})
+            return result
+
+    def weekly_volume(self, weeks=4, now=None):
+        """{week start: {muscle group: volume}} for the last `weeks` weeks."""
+        current = week_of(now or time.time())
+        with self._lock:
+            self._refresh()
+            groups = sorted(self._groups)
+            return {
+                week_start(week): {
+                    group: round(self._group_weeks[(group, week)], 2)
+                    for group in groups if (group, week) in self._group_weeks
+                }
+                for week in range(current - weeks + 1, current + 1)
+            }
@@ -179,7 +179,34 @@ function updateUILanguage() {
 }
 
 // ===== Load JSON Data =====
+// Built bundles (admin/build_static.py): the manifest is revalidated on every
+// load, the hashed files it points to never change and are cached for good.
+const DIST_DIR = 'data/dist';
+
+async function loadBundle() {
+    const manifestRes = await fetch(`${DIST_DIR}/manifest.json`, { cache: 'no-cache' });
+    if (!manifestRes.ok) return false;
+    const manifest = await manifestRes.json();
+    const entry = manifest.langs && manifest.langs[currentLang];
+    if (!entry) return false;
+
+    const weekRes = await fetch(`${DIST_DIR}/${entry.week}`);
+    if (!weekRes.ok) return false;
+    const week = await weekRes.json();
+
+    gymData = { weekly_routine: week.gym || {} };
+    dietData = { weekly_diet: week.diet || {} };
+    return true;
+}
+
 async function loadData() {
+    try {
+        // One request for the whole week when the site has been built
+        if (await loadBundle()) return;
+    } catch (error) {
+        console.warn('Data bundle unavailable, loading day files:', error);
+    }
+
     try {
         // Determine folder suffix based on language
         const gymFolder = currentLang === 'es' ? 'gym-routine-es' : 'gym-routine';
@@ -371,10 +398,12 @@ function renderGymContent(day) {
 // ===== Render Exercises =====
 function renderExercises(exercises) {
     return exercises.map(ex => {
-        if (typeof ex === 'string') {
+        // Plain names, or catalog-linked exercises without sets and reps
+        if (typeof ex === 'string' || (!ex.sets && !ex.reps)) {
+            const name = typeof ex === 'string' ? ex : ex.name;
             return `
                 <div class="exercise-item simple">
-                    <span class="exercise-name">${ex}</span>
+                    <span class="exercise-name">${name}</span>
                 </div>
             `;
         }